@@ -1,4 +1,4 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response
 from flask_migrate import Migrate
 from flask_cors import CORS
 from config import Config
@@ -6,12 +6,24 @@ from models import db
 from routes.auth import auth_bp
 from routes.doctor import doctor_bp
 from routes.patient import patient_bp
+from routes.monitoring import monitoring_bp
+from routes.jobs import jobs_bp
 from services.prediction_service import prediction_service
-import logging
+from services.model_registry import model_registry
+from services.warmup import start_warmup
+from services.prediction_writer import prediction_writer
+from services.http_cache import response_compressor
+from services.metrics import metrics
+from services.tracing import tracer
+from services.profiling import request_profiler
+from services.structured_logging import logging_setup
 import os
 from flask_jwt_extended import JWTManager
 
 def create_app():
+    # Before anything logs, so Flask does not attach its own stderr handler
+    logging_setup.configure()
+
     app = Flask(__name__)
     app.config.from_object(Config)
 
@@ -26,6 +38,10 @@ def create_app():
     db.init_app(app)
     migrate = Migrate(app, db)
     jwt = JWTManager(app)
+    prediction_writer.init_app(app)
+    tracer.init_app(app)
+    request_profiler.init_app(app)
+    response_compressor.init_app(app)
 
     # CORS configuration - Enable credentials for session support
     # Always allow both localhost:3000 and localhost:3001 for development
@@ -41,13 +57,19 @@ def create_app():
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
     app.logger.info(f"CORS enabled for origins: {allowed_origins}")
 
-    # Configure logging
-    logging.basicConfig(level=logging.INFO)
-
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(doctor_bp, url_prefix='/api/doctor')
     app.register_blueprint(patient_bp, url_prefix='/api/patients')
+    app.register_blueprint(monitoring_bp, url_prefix='/api/monitoring')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+
+    # Load the serving model in the background (also under gunicorn, which never runs
+    # __main__)
+    model_registry.start(fallback_path=app.config.get('MODEL_PATH'))
+
+    # Run synthetic predictions through every path before reporting ready
+    warmup_state = start_warmup(app)
 
     # XAI Explanation endpoint
     @app.route('/api/explain', methods=['GET'])
@@ -66,9 +88,29 @@ def create_app():
         return jsonify({
             'status': 'healthy',
             'service': 'anemia_prediction_api',
-            'message': 'Anemia prediction API with XAI is running'
+            'message': 'Anemia prediction API with XAI is running',
+            'ready': warmup_state.ready.is_set(),
+            'warmup': warmup_state.to_dict()
         })
 
+    # Readiness probe for load balancers: 503 until warm-up has finished
+    @app.route('/api/health/ready', methods=['GET'])
+    def readiness_check():
+        """Readiness check endpoint"""
+        ready = warmup_state.ready.is_set()
+        body = {'ready': ready, 'warmup': warmup_state.to_dict()}
+        return jsonify(body), 200 if ready else 503
+
+    # Prometheus scrape endpoint: per-stage latency histograms merged across workers
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Prometheus text-format metrics"""
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return jsonify({'error': 'Invalid metrics token'}), 401
+        return Response(metrics.render_prometheus(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
     # Root endpoint
     @app.route('/', methods=['GET'])
     def root():
@@ -79,7 +121,10 @@ def create_app():
                 'auth': '/api/auth',
                 'patients': '/api/patients',
                 'doctors': '/api/doctor',
-                'health': '/api/health'
+                'monitoring': '/api/monitoring',
+                'jobs': '/api/jobs',
+                'health': '/api/health',
+                'metrics': '/metrics'
             }
         })
 
@@ -95,18 +140,9 @@ def create_app():
     return app
 
 if __name__ == '__main__':
+    # create_app() starts loading the ML model through the model registry
     app = create_app()
 
-    with app.app_context():
-        # Load ML model
-        model_path = app.config.get('MODEL_PATH', 'anemia_dl_model.h5')
-        try:
-            prediction_service.load_model(model_path)
-            print("✓ ML model loaded successfully")
-        except Exception as e:
-            print(f"⚠ Warning: Could not load ML model: {e}")
-            print("✓ Using enhanced rule-based prediction with XAI")
-
     print("🚀 Starting Flask server...")
     print("📊 Anemia Prediction API with XAI explanations")
     print("🌐 Frontend URL: http://localhost:3000")
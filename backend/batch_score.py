@@ -0,0 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from services.job_queue import score_chunk
+from services.rule_sets import FEATURE_COLUMNS
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import pandas as pd
+
+# Parquet input is optional
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pq = None
+    PARQUET_AVAILABLE = False
+
+OUTPUT_FIELDS = ['row', 'id', 'predicted_label', 'predicted_proba', 'rule_set_version',
+                 'error']
+
+def iter_input_chunks(path, chunk_size, id_column=None):
+    """Yield lists of feature records from a CSV or Parquet file, chunk by chunk"""
+    columns = FEATURE_COLUMNS + ([id_column] if id_column else [])
+
+    if path.lower().endswith('.parquet'):
+        if not PARQUET_AVAILABLE:
+            raise SystemExit("Reading Parquet requires pyarrow (pip install pyarrow)")
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas().to_dict('records')
+    else:
+        for frame in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+            yield frame.to_dict('records')
+
+def _score_records(records, start_row, explain, id_column):
+    """Worker-side scoring of one chunk (runs in a pool process)"""
+    rows = []
+    for offset, record in enumerate(records):
+        row = {'row': start_row + offset,
+               'features': {name: record[name] for name in FEATURE_COLUMNS}}
+        if id_column:
+            row['patient_id'] = record[id_column]
+        rows.append(row)
+    return score_chunk(rows, explain)
+
+class ResultWriter:
+    """Append results to a CSV or JSONL file as chunks complete"""
+
+    def __init__(self, path, explain):
+        self.jsonl = path.lower().endswith('.jsonl')
+        self.file = open(path, 'w', newline='')
+        if not self.jsonl:
+            fields = OUTPUT_FIELDS + (['explanations'] if explain else [])
+            self.writer = csv.DictWriter(self.file, fieldnames=fields,
+                                         extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, results):
+        for result in results:
+            result['id'] = result.pop('patient_id', None)
+            if self.jsonl:
+                self.file.write(json.dumps(result) + '\n')
+            else:
+                if 'explanations' in result:
+                    result['explanations'] = json.dumps(result['explanations'])
+                self.writer.writerow(result)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def score_file(input_path, output_path, chunk_size=10000, workers=None, explain=False,
+               id_column=None, progress=None):
+    """Score a lab-results file with a process pool, keeping at most 2 chunks per
+    worker in flight"""
+    workers = workers or os.cpu_count() or 1
+    writer = ResultWriter(output_path, explain)
+    pending = deque()
+    rows_done = 0
+    errors = 0
+    started = time.monotonic()
+
+    def drain_one():
+        nonlocal rows_done, errors
+        results = pending.popleft().result()
+        writer.write(results)
+        rows_done += len(results)
+        errors += sum(1 for r in results if r.get('error'))
+        if progress:
+            progress(rows_done, time.monotonic() - started)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            start_row = 0
+            for records in iter_input_chunks(input_path, chunk_size, id_column):
+                # Bounded in-flight work keeps memory flat; results are written in
+                # input order
+                while len(pending) >= workers * 2:
+                    drain_one()
+                pending.append(pool.submit(_score_records, records, start_row, explain,
+                                           id_column))
+                start_row += len(records)
+            while pending:
+                drain_one()
+    finally:
+        writer.close()
+
+    return {'rows': rows_done, 'errors': errors, 'seconds': time.monotonic() - started}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Score a large lab-results file offline (CSV or Parquet)')
+    parser.add_argument('input',
+                        help='Input .csv or .parquet with Gender, Hemoglobin, MCH, '
+                             'MCHC, MCV columns')
+    parser.add_argument('output', help='Output .csv or .jsonl file')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per chunk')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Scoring processes (default: CPU count)')
+    parser.add_argument('--explain', action='store_true',
+                        help='Include full explanations (much slower)')
+    parser.add_argument('--id-column', default=None,
+                        help='Input column copied to the output as id')
+    args = parser.parse_args()
+
+    def report(rows, elapsed):
+        rate = rows / elapsed if elapsed else 0.0
+        print(f"\rScored {rows:,} rows ({rate:,.0f} rows/s)", end='', file=sys.stderr,
+              flush=True)
+
+    summary = score_file(args.input, args.output, chunk_size=args.chunk_size,
+                         workers=args.workers, explain=args.explain,
+                         id_column=args.id_column, progress=report)
+    print(file=sys.stderr)
+    print(f"Scored {summary['rows']:,} rows ({summary['errors']:,} errors) "
+          f"in {summary['seconds']:.1f}s -> {args.output}")
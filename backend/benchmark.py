@@ -0,0 +1,276 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, '..', 'sample_data', 'sample_input.csv')
+
+def load_samples(path):
+    from services.rule_sets import FEATURE_COLUMNS
+    with open(path, newline='') as f:
+        return [{name: float(record[name]) for name in FEATURE_COLUMNS}
+                for record in csv.DictReader(f)]
+
+# Config paths that default to LOCAL_DATA_DIR but may be overridden one by one
+STATE_PATHS = {
+    'WORKER_STATE_DIR': 'worker_state',
+    'SHADOW_DB_PATH': 'shadow_results.db',
+    'MODEL_REGISTRY_DIR': 'model_registry',
+    'JOB_QUEUE_PATH': 'jobs.db',
+    'JOB_RESULTS_DIR': 'job_results',
+    'EVENT_RELAY_PATH': 'events.db',
+    'TRACE_DIR': 'traces',
+    'PROFILE_DIR': 'profiles'
+}
+
+def isolate_environment(workdir, database_url=None):
+    """Point the database and local state at a scratch directory.
+
+    Exported settings are overridden, not kept, so a shell with a production
+    DATABASE_URL cannot send benchmark writes there; ``database_url`` is the
+    only way to use another database. Must run before the app modules are
+    imported, since Config reads the environment at import.
+    """
+    default_url = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ['DATABASE_URL'] = database_url or default_url
+    os.environ['LOCAL_DATA_DIR'] = workdir
+    for name, path in STATE_PATHS.items():
+        os.environ[name] = os.path.join(workdir, path)
+    os.environ['WARMUP_ENABLED'] = 'false'
+    os.environ['TRACING_ENABLED'] = 'false'
+
+def measure(func, iterations, warmup, items=1):
+    """Time ``iterations`` calls of func (after ``warmup`` untimed calls)"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    pct = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000.0
+    mean = statistics.fmean(samples)
+    return {
+        'iterations': iterations,
+        'items_per_call': items,
+        'mean_ms': mean * 1000.0,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'min_ms': samples[0] * 1000.0,
+        'items_per_s': items / mean if mean else 0.0
+    }
+
+def service_benchmarks(samples, batch_size):
+    """(name, callable, items per call) for PredictionService, batch scoring and
+    serialization"""
+    from services.prediction_service import prediction_service, PLOTTING_AVAILABLE
+    from services.rule_sets import rule_set_registry
+    from services.job_queue import score_chunk
+    from services.render_pool import render_pool
+    from models import Prediction
+
+    rule_set = rule_set_registry.active()
+    sample = samples[0]
+    contributions, probability, _ = rule_set.evaluate(sample)
+    risk_factors = [{'feature': name, 'value': sample[name],
+                     'contribution': contribution}
+                    for name, contribution in zip(rule_set.factor_names, contributions)]
+    batch = [samples[i % len(samples)] for i in range(batch_size)]
+    chunk = [{'row': i, 'features': features} for i, features in enumerate(samples)]
+
+    result = prediction_service.predict(dict(sample), track=False)
+    record = Prediction(id=1, user_id=1, predicted_label=result['predicted_label'],
+                        predicted_proba=result['predicted_proba'],
+                        rule_set_version=result['rule_set_version'],
+                        model_version=result['model_version'],
+                        created_at=datetime.utcnow())
+    record.set_input_features(sample)
+    record.set_explanation(result['explanations'])
+
+    cycle = iter(range(sys.maxsize))
+    next_sample = lambda: dict(samples[next(cycle) % len(samples)])
+
+    service = prediction_service
+    benchmarks = [
+        ('predict', lambda: service.predict(next_sample(), track=False), 1),
+        ('predict.no_render',
+         lambda: service.predict(next_sample(), track=False, render=False), 1),
+        ('predict.tracked', lambda: service.predict(next_sample()), 1),
+        ('score_batch', lambda: service.score_batch(batch), batch_size),
+        ('score_chunk.explain', lambda: score_chunk(chunk, True), len(chunk)),
+        ('rules.evaluate', lambda: rule_set.evaluate(sample), 1),
+        ('explain.shap',
+         lambda: service._generate_fallback_shap(risk_factors, probability), 1),
+        ('explain.clinical',
+         lambda: service._get_clinical_interpretation(sample, probability), 1),
+        ('render.html', lambda: service._create_html_chart(risk_factors), 1),
+        ('render.text', lambda: service._create_text_visualization(risk_factors), 1),
+        ('serialize.prediction_to_dict', record.to_dict, 1),
+        ('serialize.prediction_json', lambda: json.dumps(record.to_dict()), 1),
+    ]
+    if PLOTTING_AVAILABLE:
+        names = [f['feature'] for f in risk_factors]
+        values = [f['contribution'] for f in risk_factors]
+        render_png = lambda: render_pool.render_feature_importance(names, values)
+        benchmarks.append(('render.png', render_png, 1))
+    return benchmarks
+
+def api_benchmarks(app, samples, history):
+    """(name, callable, 1) for the main endpoints, called through the Flask test
+    client"""
+    from models import db, User
+
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        if User.query.filter_by(email='doctor@benchmark.local').first() is not None:
+            raise SystemExit('Benchmark database is not empty; '
+                             'use a fresh DATABASE_URL')
+
+    doctor = client.post('/api/auth/register-doctor', json={
+        'name': 'Benchmark Doctor', 'email': 'doctor@benchmark.local',
+        'password': 'benchmark123', 'hospital': 'Benchmark Hospital'}).json
+    doctor_headers = {'Authorization': f"Bearer {doctor['access_token']}"}
+    patient = client.post('/api/doctor/register-patient', json={
+        'patient_name': 'Benchmark Patient', 'patient_email': 'patient@benchmark.local',
+        'gender': 1}, headers=doctor_headers).json
+    login = client.post('/api/auth/login', json={
+        'email': 'patient@benchmark.local',
+        'password': patient['temporary_password']}).json
+    patient_headers = {'Authorization': f"Bearer {login['access_token']}"}
+
+    # Give the history endpoints something to read
+    for i in range(history):
+        client.post('/api/patients/predict', json=samples[i % len(samples)],
+                    headers=patient_headers)
+
+    cycle = iter(range(sys.maxsize))
+
+    def call(method, path, headers, body=None, expected=200):
+        def run():
+            response = client.open(path, method=method, headers=headers,
+                                   json=body() if callable(body) else body)
+            if response.status_code != expected:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        return run
+
+    patient_id = patient['patient']['id']
+    return [
+        ('api.predict', call('POST', '/api/patients/predict', patient_headers,
+                             lambda: samples[next(cycle) % len(samples)]), 1),
+        ('api.patient_predictions',
+         call('GET', '/api/patients/predictions', patient_headers), 1),
+        ('api.patient_dashboard',
+         call('GET', '/api/patients/dashboard', patient_headers), 1),
+        ('api.doctor_patients', call('GET', '/api/doctor/patients', doctor_headers), 1),
+        ('api.doctor_patient_predictions',
+         call('GET', f'/api/doctor/patients/{patient_id}/predictions',
+              doctor_headers), 1),
+    ]
+
+def compare(current, baseline, threshold):
+    """Benchmarks whose median got slower than baseline by more than ``threshold``
+    (a fraction)"""
+    rows, regressions = [], []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None or not before['p50_ms']:
+            continue
+        change = result['p50_ms'] / before['p50_ms'] - 1.0
+        rows.append((name, before['p50_ms'], result['p50_ms'], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark scoring, explanations, rendering, serialization and '
+                    'endpoints')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES,
+                        help='CSV of lab values to use as inputs')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='Timed calls per benchmark')
+    parser.add_argument('--warmup', type=int, default=20,
+                        help='Untimed calls before each benchmark')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='Rows per score_batch call')
+    parser.add_argument('--history', type=int, default=50,
+                        help='Predictions stored before the endpoint benchmarks')
+    parser.add_argument('--database',
+                        help='Database URL to benchmark against (default: SQLite in a '
+                             'scratch directory; an exported DATABASE_URL is ignored)')
+    parser.add_argument('--only', nargs='+',
+                        help='Run benchmarks whose name starts with one of these '
+                             'prefixes')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Flag benchmarks whose median is this much slower than '
+                             'the baseline (0.15 = 15%%)')
+    args = parser.parse_args()
+
+    isolate_environment(tempfile.mkdtemp(prefix='taps_bench_'), args.database)
+    sys.path.insert(0, BACKEND_DIR)
+    import logging
+    # Per-prediction log lines would dominate the fast paths
+    logging.disable(logging.INFO)
+    from app import create_app
+
+    samples = load_samples(args.samples)
+    app = create_app()
+    benchmarks = (service_benchmarks(samples, args.batch_size)
+                  + api_benchmarks(app, samples, args.history))
+    if args.only:
+        benchmarks = [b for b in benchmarks if b[0].startswith(tuple(args.only))]
+
+    results = {}
+    for name, func, items in benchmarks:
+        # Keep handler output off the results table
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results[name] = measure(func, args.iterations, args.warmup, items)
+        r = results[name]
+        print(f"{name:<32} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms  "
+              f"{r['items_per_s']:12.1f} items/s")
+
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': vars(args)
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        rows, regressions = compare(results, baseline, args.threshold)
+        print(f"\nvs {args.compare} (median, regression above +{args.threshold:.0%}):")
+        for name, before, after, change in rows:
+            flag = '  REGRESSION' if name in regressions else ''
+            print(f"{name:<32} {before:9.3f} -> {after:9.3f} ms  {change:+7.1%}{flag}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,48 @@
+from flask import Flask
+from models import db, User
+from config import Config
+from services.patient_onboarding import read_patient_csv, onboard_patients
+import argparse
+import csv
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Register patients in bulk from a CSV file')
+    parser.add_argument('input',
+                        help='CSV with patient_name, patient_email[, dob, gender, '
+                             'password] columns')
+    parser.add_argument('--doctor-email', required=True,
+                        help='Doctor the patients are assigned to')
+    parser.add_argument('--report', default='onboarding_report.csv',
+                        help='Per-row result report (CSV)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Password hashing processes')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        doctor = User.query.filter_by(email=args.doctor_email.lower(),
+                                      role='doctor').first()
+        if not doctor:
+            raise SystemExit(f"No doctor with email {args.doctor_email}")
+
+        with open(args.input, 'rb') as f:
+            records = read_patient_csv(f)
+        result = onboard_patients(records, doctor_id=doctor.id, workers=args.workers,
+                                  processes=True)
+
+    with open(args.report, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['row', 'email', 'status', 'patient_id',
+                                               'temporary_password', 'errors'])
+        writer.writeheader()
+        for entry in result['results']:
+            writer.writerow({**entry, 'errors': '; '.join(entry['errors'])})
+
+    print(f"Created {result['created']} of {result['total']} patients; "
+          f"report written to {args.report}")
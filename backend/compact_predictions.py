@@ -0,0 +1,51 @@
+from flask import Flask
+from models import db
+from config import Config
+from services.compaction import compact_explanations, reclaim_space
+import argparse
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Strip rendered charts from old prediction explanations')
+    parser.add_argument('--older-than-days', type=int,
+                        default=Config.RETENTION_VISUALIZATION_DAYS,
+                        help='Compact predictions created more than this many days ago')
+    parser.add_argument('--batch-size', type=int, default=Config.COMPACTION_BATCH_SIZE,
+                        help='Rows updated per transaction')
+    parser.add_argument('--pause', type=float, default=Config.COMPACTION_PAUSE,
+                        help='Seconds to sleep between batches')
+    parser.add_argument('--skip-reclaim', action='store_true',
+                        help='Do not run ANALYZE/VACUUM afterwards')
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help='Rewrite the database file (SQLite VACUUM / Postgres '
+                             'VACUUM FULL); locks it while running')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    def report(scanned, compacted, bytes_freed, elapsed):
+        print(f"Scanned {scanned} rows, compacted {compacted}, "
+              f"{bytes_freed / 1e6:.1f} MB of explanations freed "
+              f"({scanned / elapsed if elapsed else 0.0:,.0f} rows/s)")
+
+    with app.app_context():
+        summary = compact_explanations(args.older_than_days, batch_size=args.batch_size,
+                                       pause=args.pause, progress=report)
+        print(f"Compacted {summary['compacted']} predictions older than "
+              f"{summary['cutoff']}, freeing {summary['bytes_freed']:,} bytes of "
+              f"explanation JSON in {summary['seconds']:.1f}s")
+
+        if not args.skip_reclaim:
+            reclaimed = reclaim_space(full_vacuum=args.full_vacuum)
+            size = reclaimed['size_after']
+            free = (f", {size['free_bytes']:,} bytes free for reuse"
+                    if 'free_bytes' in size else '')
+            print(f"Ran {', '.join(reclaimed['actions']) or 'nothing'}: "
+                  f"{reclaimed['bytes_reclaimed']:,} bytes returned to the filesystem"
+                  + free)
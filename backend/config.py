@@ -1,17 +1,31 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'dev-jwt-secret'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///../instance/anemia_app.db'
+    SQLALCHEMY_DATABASE_URI = (os.environ.get('DATABASE_URL')
+                               or 'sqlite:///../instance/anemia_app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Threaded workers share one engine per process: wait on SQLite write locks,
+    # check pooled connections elsewhere
+    SQLALCHEMY_ENGINE_OPTIONS = (
+        {'connect_args': {'timeout': 30}}
+        if SQLALCHEMY_DATABASE_URI.startswith('sqlite')
+        else {'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)), 'max_overflow': 10,
+              'pool_pre_ping': True}
+    )
     JWT_ACCESS_TOKEN_EXPIRES = False  # Tokens don't expire for demo
     MODEL_PATH = os.environ.get('MODEL_PATH') or './anemia_dl_model.h5'
-    # CORS_ORIGINS: Comma-separated list of allowed origins for CORS (e.g. 'http://localhost:3000,http://localhost:3001')
-    # If not set, defaults to http://localhost:3000 for development. See app.py for fallback logic.
+    # CORS_ORIGINS: Comma-separated list of allowed origins for CORS
+    # (e.g. 'http://localhost:3000,http://localhost:3001')
+    # If not set, defaults to http://localhost:3000 for development. See app.py for
+    # fallback logic.
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
     # Feature preprocessing parameters (derived from typical anemia datasets)
@@ -28,3 +42,216 @@ class Config:
         'MCHC': 2.0,
         'MCV': 8.0
     }
+
+    # Shared directory where each worker publishes monitoring snapshots
+    WORKER_STATE_DIR = (os.environ.get('WORKER_STATE_DIR')
+                        or os.path.join(tempfile.gettempdir(), 'taps_worker_state'))
+
+    # Feature drift monitoring
+    DRIFT_HISTOGRAM_BINS = int(os.environ.get('DRIFT_HISTOGRAM_BINS', 40))
+    DRIFT_FLUSH_INTERVAL = float(os.environ.get('DRIFT_FLUSH_INTERVAL', 5.0))  # seconds
+    DRIFT_MIN_SAMPLES = int(os.environ.get('DRIFT_MIN_SAMPLES', 100))
+    # Worker snapshots not rewritten for this long (stopped workers, earlier
+    # deployments) are pruned
+    DRIFT_STATE_TTL = float(os.environ.get('DRIFT_STATE_TTL', 86400.0))  # seconds
+    MONITORING_ROLES = [r.strip() for r in
+                        os.environ.get('MONITORING_ROLES', 'doctor,admin').split(',')
+                        if r.strip()]
+    # Roles allowed to change monitoring state (e.g. reset the drift window)
+    MONITORING_ADMIN_ROLES = [
+        r.strip() for r in os.environ.get('MONITORING_ADMIN_ROLES', 'admin').split(',')
+        if r.strip()]
+
+    # Versioned rule sets for the rule-based scorer (one JSON file per version)
+    RULE_SETS_DIR = (os.environ.get('RULE_SETS_DIR')
+                     or os.path.join(BASE_DIR, 'rule_sets'))
+    ACTIVE_RULE_SET = os.environ.get('ACTIVE_RULE_SET', 'v1')
+
+    # Local directory for small service-owned SQLite files (shadow results, job
+    # queue, ...)
+    LOCAL_DATA_DIR = (os.environ.get('LOCAL_DATA_DIR')
+                      or os.path.join(BASE_DIR, 'instance'))
+
+    # Shadow scoring of the Keras model alongside the rule engine
+    SHADOW_MODE = os.environ.get('SHADOW_MODE', 'false').lower() == 'true'
+    SHADOW_DB_PATH = (os.environ.get('SHADOW_DB_PATH')
+                      or os.path.join(LOCAL_DATA_DIR, 'shadow_results.db'))
+    SHADOW_QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE', 1000))
+    SHADOW_BATCH_SIZE = int(os.environ.get('SHADOW_BATCH_SIZE', 64))
+    SHADOW_BATCH_WAIT = float(os.environ.get('SHADOW_BATCH_WAIT', 0.05))  # seconds
+    # Newest outcomes kept for the summary
+    SHADOW_MAX_ROWS = int(os.environ.get('SHADOW_MAX_ROWS', 100000))
+
+    # Model registry: versioned model files plus manifest.json, watched by every
+    # worker
+    MODEL_REGISTRY_DIR = (os.environ.get('MODEL_REGISTRY_DIR')
+                          or os.path.join(LOCAL_DATA_DIR, 'model_registry'))
+    MODEL_REGISTRY_POLL_INTERVAL = float(
+        os.environ.get('MODEL_REGISTRY_POLL_INTERVAL', 10.0))  # seconds
+    # 'rules' scores with the active rule set; 'model' uses the registry's Keras
+    # model when one is loaded
+    PRIMARY_SCORER = os.environ.get('PRIMARY_SCORER', 'rules')
+
+    # Warm-up: synthetic predictions run after start-up before the worker reports
+    # ready
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+    WARMUP_SAMPLE_PATH = (os.environ.get('WARMUP_SAMPLE_PATH')
+                          or os.path.join(BASE_DIR, '..', 'sample_data',
+                                          'sample_input.csv'))
+    WARMUP_MODEL_TIMEOUT = float(
+        os.environ.get('WARMUP_MODEL_TIMEOUT', 120.0))  # seconds
+
+    # Prediction persistence: 'sync', 'group' (buffered group commit) or 'relaxed'
+    # (see services/prediction_writer.py)
+    PREDICTION_WRITE_MODE = os.environ.get('PREDICTION_WRITE_MODE', 'sync')
+    PREDICTION_FLUSH_INTERVAL_MS = float(
+        os.environ.get('PREDICTION_FLUSH_INTERVAL_MS', 5.0))
+    PREDICTION_FLUSH_BATCH_SIZE = int(
+        os.environ.get('PREDICTION_FLUSH_BATCH_SIZE', 200))
+    PREDICTION_WRITE_BUFFER_SIZE = int(
+        os.environ.get('PREDICTION_WRITE_BUFFER_SIZE', 5000))
+    # Longest a request waits for the group commit before writing its row itself
+    PREDICTION_WRITE_TIMEOUT = float(
+        os.environ.get('PREDICTION_WRITE_TIMEOUT', 5.0))  # seconds
+
+    # Durable bulk prediction jobs (SQLite queue + JSONL results, processed by
+    # job_worker.py)
+    JOB_QUEUE_PATH = (os.environ.get('JOB_QUEUE_PATH')
+                      or os.path.join(LOCAL_DATA_DIR, 'jobs.db'))
+    JOB_RESULTS_DIR = (os.environ.get('JOB_RESULTS_DIR')
+                       or os.path.join(LOCAL_DATA_DIR, 'job_results'))
+    JOB_CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE', 500))
+    JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 300.0))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))  # seconds
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 2))
+    JOB_MAX_ROWS = int(os.environ.get('JOB_MAX_ROWS', 1000000))
+
+    # Bulk patient onboarding
+    BULK_ONBOARDING_BATCH_SIZE = int(os.environ.get('BULK_ONBOARDING_BATCH_SIZE', 500))
+    # Rows before hashing in a pool
+    BULK_ONBOARDING_POOL_THRESHOLD = int(
+        os.environ.get('BULK_ONBOARDING_POOL_THRESHOLD', 32))
+    # Hashing threads per web worker, shared by its requests
+    BULK_ONBOARDING_HASH_THREADS = int(
+        os.environ.get('BULK_ONBOARDING_HASH_THREADS', 2))
+    # Largest upload accepted over HTTP; larger files go through the CLI
+    BULK_ONBOARDING_MAX_ROWS = int(os.environ.get('BULK_ONBOARDING_MAX_ROWS', 1000))
+
+    # Per-worker cache of user records used by the auth layer
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 30.0))  # seconds
+    USER_CACHE_MAXSIZE = int(os.environ.get('USER_CACHE_MAXSIZE', 10000))
+
+    # Patient dashboard cache (per worker; entries are revalidated against the
+    # database on every read)
+    DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 60.0))  # seconds
+    DASHBOARD_CACHE_MAXSIZE = int(os.environ.get('DASHBOARD_CACHE_MAXSIZE', 5000))
+
+    # gzip JSON responses at least this large (bytes)
+    GZIP_MIN_SIZE = int(os.environ.get('GZIP_MIN_SIZE', 1024))
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+
+    # Doctor event streams (SSE); EVENT_RELAY shares events between workers through a
+    # local SQLite log
+    EVENT_STREAM_QUEUE_SIZE = int(os.environ.get('EVENT_STREAM_QUEUE_SIZE', 100))
+    EVENT_STREAM_HEARTBEAT = float(
+        os.environ.get('EVENT_STREAM_HEARTBEAT', 15.0))  # seconds
+    # Seconds a stream token can be used to open a stream
+    EVENT_STREAM_TOKEN_TTL = int(os.environ.get('EVENT_STREAM_TOKEN_TTL', 60))
+    # Seconds before a stream is recycled
+    EVENT_STREAM_MAX_AGE = float(os.environ.get('EVENT_STREAM_MAX_AGE', 300.0))
+    # Each stream holds a gthread thread: keep this below GUNICORN_THREADS
+    EVENT_STREAM_MAX_PER_WORKER = int(os.environ.get('EVENT_STREAM_MAX_PER_WORKER', 4))
+    EVENT_RELAY = os.environ.get('EVENT_RELAY', 'false').lower() == 'true'
+    EVENT_RELAY_PATH = (os.environ.get('EVENT_RELAY_PATH')
+                        or os.path.join(LOCAL_DATA_DIR, 'events.db'))
+    EVENT_RELAY_POLL_INTERVAL = float(
+        os.environ.get('EVENT_RELAY_POLL_INTERVAL', 0.5))  # seconds
+    EVENT_RELAY_RETENTION = float(
+        os.environ.get('EVENT_RELAY_RETENTION', 300.0))  # seconds
+
+    # Per-stage latency metrics, merged across workers through WORKER_STATE_DIR and
+    # served at /metrics
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_FLUSH_INTERVAL = float(
+        os.environ.get('METRICS_FLUSH_INTERVAL', 5.0))  # seconds
+    # Snapshots of workers that have not flushed for this long are pruned
+    METRICS_STATE_TTL = float(os.environ.get('METRICS_STATE_TTL', 86400.0))  # seconds
+    # If set, scrapers must send "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Request tracing: every request collects spans; slow/failed ones are always
+    # kept, the rest sampled
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'true').lower() == 'true'
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+    TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', 500.0))
+    TRACE_DIR = os.environ.get('TRACE_DIR') or os.path.join(LOCAL_DATA_DIR, 'traces')
+    TRACE_FILE_MAX_BYTES = int(os.environ.get('TRACE_FILE_MAX_BYTES',
+                                              10 * 1024 * 1024))
+    TRACE_FILE_BACKUPS = int(os.environ.get('TRACE_FILE_BACKUPS', 5))
+    TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', 1000))
+    TRACE_SQL_MAX_LENGTH = int(os.environ.get('TRACE_SQL_MAX_LENGTH', 2000))
+
+    # Retention: charts are stripped from explanations older than this
+    # (compact_predictions.py); scores are kept
+    RETENTION_VISUALIZATION_DAYS = int(
+        os.environ.get('RETENTION_VISUALIZATION_DAYS', 90))
+    COMPACTION_BATCH_SIZE = int(os.environ.get('COMPACTION_BATCH_SIZE', 500))
+    # Seconds between batches
+    COMPACTION_PAUSE = float(os.environ.get('COMPACTION_PAUSE', 0.05))
+
+    # Lab trends: slope over the last TREND_WINDOW results, series downsampled to
+    # at most TREND_SERIES_POINTS buckets
+    TREND_WINDOW = int(os.environ.get('TREND_WINDOW', 5))
+    TREND_SERIES_POINTS = int(os.environ.get('TREND_SERIES_POINTS', 64))
+
+    # Logging: records go through a bounded queue to a background writer thread
+    # (dropped, never blocking, when full)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # 'text' or 'json' (one per line)
+    LOG_FILE = os.environ.get('LOG_FILE')  # default: stderr
+    LOG_FILE_MAX_BYTES = int(os.environ.get('LOG_FILE_MAX_BYTES', 50 * 1024 * 1024))
+    LOG_FILE_BACKUPS = int(os.environ.get('LOG_FILE_BACKUPS', 5))
+    # Chars per message, field or traceback
+    LOG_MAX_LENGTH = int(os.environ.get('LOG_MAX_LENGTH', 2000))
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # e.g. 'routes.patient=0.1' (below WARNING only)
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+
+    # On-demand profiling of single requests (X-Profile: 1) by users whose JWT role
+    # is listed here
+    PROFILING_ROLES = [r.strip() for r in
+                       os.environ.get('PROFILING_ROLES', 'admin').split(',')
+                       if r.strip()]
+    PROFILE_DIR = (os.environ.get('PROFILE_DIR')
+                   or os.path.join(LOCAL_DATA_DIR, 'profiles'))
+    # Stored reports beyond this count or older than PROFILE_MAX_AGE are deleted
+    PROFILE_MAX_REPORTS = int(os.environ.get('PROFILE_MAX_REPORTS', 200))
+    PROFILE_MAX_AGE = float(os.environ.get('PROFILE_MAX_AGE', 604800.0))  # seconds
+    # Profiled requests per worker per window
+    PROFILE_RATE_LIMIT = int(os.environ.get('PROFILE_RATE_LIMIT', 10))
+    PROFILE_RATE_WINDOW = float(os.environ.get('PROFILE_RATE_WINDOW', 600.0))  # seconds
+
+    # Chart rendering: >0 renders PNGs in a per-worker process pool (recommended
+    # with threaded workers)
+    RENDER_POOL_WORKERS = int(os.environ.get('RENDER_POOL_WORKERS', 0))
+    RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 10.0))  # seconds
+
+    # Admission control per worker: requests shed at a stage get scores and numeric
+    # explanations without charts
+    ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', 'true').lower() == 'true'
+    ADMISSION_STAGES = {
+        'predict': {
+            'limit': int(os.environ.get('ADMISSION_PREDICT_LIMIT', 16)),
+            'queue': int(os.environ.get('ADMISSION_PREDICT_QUEUE', 32)),
+            # seconds
+            'timeout': float(os.environ.get('ADMISSION_PREDICT_TIMEOUT', 0.5))
+        },
+        'render': {
+            'limit': int(os.environ.get('ADMISSION_RENDER_LIMIT', os.cpu_count() or 2)),
+            'queue': int(os.environ.get('ADMISSION_RENDER_QUEUE',
+                                        2 * (os.cpu_count() or 2))),
+            # seconds
+            'timeout': float(os.environ.get('ADMISSION_RENDER_TIMEOUT', 0.25))
+        }
+    }
@@ -0,0 +1,52 @@
+from flask import Flask
+from models import db, User
+from config import Config
+import argparse
+import getpass
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+def provision_admin(email, name, password):
+    """Create an admin account, or reset an existing admin's password.
+
+    Returns (user, created). Accounts with another role are never promoted, so a
+    typo cannot turn a patient or doctor into an admin.
+    """
+    email = email.lower()
+    user = User.query.filter_by(email=email).first()
+    if user is not None and user.role != 'admin':
+        raise ValueError(f"{email} already belongs to a {user.role} account")
+
+    created = user is None
+    if created:
+        user = User(name=name, email=email, role='admin')
+        db.session.add(user)
+    user.set_password(password)
+    db.session.commit()
+    return user, created
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Create an admin account (PROFILING_ROLES, MONITORING_ADMIN_ROLES)')
+    parser.add_argument('email', help='Login email of the admin')
+    parser.add_argument('--name', default='Administrator', help='Display name')
+    args = parser.parse_args()
+
+    password = getpass.getpass('Password: ')
+    if len(password) < 8:
+        raise SystemExit('Password must be at least 8 characters')
+    if getpass.getpass('Repeat password: ') != password:
+        raise SystemExit('Passwords do not match')
+
+    app = create_app()
+    with app.app_context():
+        try:
+            user, created = provision_admin(args.email, args.name, password)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"{'Created' if created else 'Reset the password of'} admin "
+              f"{user.email} (ID {user.id})")
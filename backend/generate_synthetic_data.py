@@ -0,0 +1,68 @@
+from flask import Flask
+from models import db
+from config import Config
+from services.synthetic_data import LabDistribution, generate_population
+import argparse
+import json
+import logging
+import os
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                               'sample_data', 'sample_input.csv')
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Fill the database with a synthetic clinic population')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients-per-doctor', type=int, default=200)
+    parser.add_argument('--predictions-per-patient', type=int, default=10)
+    parser.add_argument('--prescriptions-per-patient', type=int, default=2)
+    parser.add_argument('--anemia-rate', type=float, default=0.35,
+                        help='Share of patients drawn from anemic reference rows')
+    parser.add_argument('--days', type=int, default=365,
+                        help='Spread created_at over this many past days')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES,
+                        help='Reference CSV of lab values (with optional Result '
+                             'column)')
+    parser.add_argument('--password', default='synthetic123',
+                        help='Password of every generated user')
+    parser.add_argument('--numeric-only', action='store_true',
+                        help='Store scores without explanations (faster)')
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help='Patients per transaction and rows per INSERT')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--tag', default=None,
+                        help='Email tag of this population (default: a timestamp)')
+    parser.add_argument('--manifest', default='synthetic_manifest.json',
+                        help='Where to write the login manifest for load_test.py')
+    args = parser.parse_args()
+
+    # One log line per scored prediction would dominate the run
+    logging.basicConfig(level=logging.WARNING)
+
+    app = create_app()
+
+    def report(counts, elapsed):
+        print(f"{counts['patients']} patients, {counts['predictions']} predictions, "
+              f"{counts['prescriptions']} prescriptions "
+              f"({counts['predictions'] / elapsed:,.0f} predictions/s)")
+
+    with app.app_context():
+        db.create_all()
+        summary = generate_population(
+            args.doctors, args.patients_per_doctor, args.predictions_per_patient,
+            args.prescriptions_per_patient, LabDistribution.from_csv(args.samples),
+            password=args.password, anemia_rate=args.anemia_rate, days=args.days,
+            batch_size=args.batch_size, explanations=not args.numeric_only,
+            seed=args.seed, tag=args.tag, progress=report)
+
+    with open(args.manifest, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Generated {summary['counts']} in {summary['seconds']:.1f}s; "
+          f"manifest written to {args.manifest}")
@@ -0,0 +1,21 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Threaded workers (gthread, the default) keep serving other requests while one
+waits on a database commit, a chart render in the render pool or an SSE stream.
+GUNICORN_WORKER_CLASS=sync restores the previous one-request-per-worker mode.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# gunicorn silently switches sync workers to gthread when threads > 1
+threads = int(os.environ.get('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+def worker_exit(server, worker):
+    from services.render_pool import render_pool
+    from services.structured_logging import logging_setup
+    render_pool.shutdown()
+    logging_setup.stop()
@@ -0,0 +1,36 @@
+from config import Config
+from services.job_queue import run_worker
+import argparse
+import logging
+import multiprocessing
+import signal
+
+def _worker_main(stop_event):
+    # Let the parent handle Ctrl+C; workers finish their current chunk and exit
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    run_worker(stop_event=stop_event)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process queued bulk prediction jobs')
+    parser.add_argument('--workers', type=int, default=Config.JOB_WORKERS,
+                        help='Number of worker processes')
+    args = parser.parse_args()
+
+    stop_event = multiprocessing.Event()
+    processes = [multiprocessing.Process(target=_worker_main, args=(stop_event,),
+                                         name=f'job-worker-{i}')
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    print(f"Started {args.workers} job workers (queue: {Config.JOB_QUEUE_PATH})")
+
+    def shutdown(signum, frame):
+        print("Stopping job workers after their current chunk...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    for process in processes:
+        process.join()
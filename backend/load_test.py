@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+from serving_load_test import call, load_samples, DEFAULT_SAMPLES
+import argparse
+import json
+import random
+import time
+
+# Default share of each operation in the replayed workload (weights, not percentages)
+DEFAULT_MIX = {
+    'predict': 20,
+    'patient_predictions': 25,
+    'patient_dashboard': 25,
+    'patient_prescriptions': 5,
+    'doctor_patient_predictions': 15,
+    'doctor_prescriptions': 4,
+    'create_prescription': 4,
+    'doctor_patients': 2
+}
+
+def parse_mix(specs):
+    mix = dict(DEFAULT_MIX)
+    for spec in specs or ():
+        name, _, weight = spec.partition('=')
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown operation {name!r}; "
+                             f"choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+def login_sessions(base_url, manifest, users, rng):
+    """Log in a random sample of synthetic patients and their doctors"""
+    patients_total = manifest['counts']['patients']
+    per_doctor = manifest['patients_per_doctor']
+    sessions, doctor_tokens = [], {}
+    for n in rng.sample(range(patients_total), min(users, patients_total)):
+        status, patient = call(base_url, 'POST', '/auth/login', {
+            'email': f"patient-{manifest['tag']}-{n}@synthetic.local",
+            'password': manifest['password']})
+        if status != 200:
+            raise SystemExit(f"Login failed for synthetic patient {n} ({status}); "
+                             "is the server using the generated database?")
+        doctor_index = n // per_doctor
+        if doctor_index not in doctor_tokens:
+            _, doctor = call(base_url, 'POST', '/auth/login', {
+                'email': f"doctor-{manifest['tag']}-{doctor_index}@synthetic.local",
+                'password': manifest['password']})
+            doctor_tokens[doctor_index] = doctor['access_token']
+        sessions.append({'patient_id': patient['user']['id'],
+                         'patient_token': patient['access_token'],
+                         'doctor_token': doctor_tokens[doctor_index]})
+    return sessions
+
+def operation(name, session, samples, rng):
+    """(method, path, body, token) of one request of the given kind"""
+    patient_id = session['patient_id']
+    patient_token, doctor_token = session['patient_token'], session['doctor_token']
+    if name == 'predict':
+        return 'POST', '/patients/predict', rng.choice(samples), patient_token
+    if name == 'patient_predictions':
+        return 'GET', '/patients/predictions', None, patient_token
+    if name == 'patient_dashboard':
+        return 'GET', '/patients/dashboard', None, patient_token
+    if name == 'patient_prescriptions':
+        return 'GET', f'/patients/{patient_id}/prescriptions', None, patient_token
+    if name == 'doctor_patient_predictions':
+        return 'GET', f'/doctor/patients/{patient_id}/predictions', None, doctor_token
+    if name == 'doctor_prescriptions':
+        return 'GET', f'/doctor/patients/{patient_id}/prescriptions', None, doctor_token
+    if name == 'create_prescription':
+        return 'POST', f'/doctor/patients/{patient_id}/prescriptions', {
+            'title': 'Load test follow-up', 'notes': 'Recheck CBC in 4 weeks',
+            'medications': [{'name': 'Ferrous sulfate', 'dosage': '325 mg',
+                             'frequency': 'Once daily'}]
+        }, doctor_token
+    return 'GET', '/doctor/patients', None, doctor_token
+
+def run_workload(base_url, sessions, samples, mix, clients, duration, seed=None):
+    """Closed-loop mixed workload; returns per-operation latencies and error counts"""
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(None if seed is None else seed + index)
+        latencies, errors = {}, {}
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, body, token = operation(name, rng.choice(sessions), samples,
+                                                  rng)
+            started = time.perf_counter()
+            try:
+                status, _ = call(base_url, method, path, body, token)
+            except OSError:
+                status = None
+            latencies.setdefault(name, []).append(time.perf_counter() - started)
+            if status not in (200, 201):
+                errors[name] = errors.get(name, 0) + 1
+        return latencies, errors
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, range(clients)))
+    elapsed = time.monotonic() - started
+
+    latencies, errors = {}, {}
+    for client_latencies, client_errors in results:
+        for name, values in client_latencies.items():
+            latencies.setdefault(name, []).extend(values)
+        for name, count in client_errors.items():
+            errors[name] = errors.get(name, 0) + count
+    return latencies, errors, elapsed
+
+def summarize(latencies, errors, elapsed):
+    def stats(values, error_count):
+        values = sorted(values)
+        pct = lambda p: (values[min(len(values) - 1, int(p * len(values)))] * 1000.0
+                         if values else 0.0)
+        return {
+            'requests': len(values),
+            'errors': error_count,
+            'throughput_rps': len(values) / elapsed,
+            'p50_ms': pct(0.50),
+            'p95_ms': pct(0.95),
+            'p99_ms': pct(0.99)
+        }
+
+    summary = {name: stats(values, errors.get(name, 0))
+               for name, values in sorted(latencies.items())}
+    summary['total'] = stats([v for values in latencies.values() for v in values],
+                             sum(errors.values()))
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Replay a mixed read/write workload against a running server')
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api',
+                        help='API base URL')
+    parser.add_argument('--manifest', default='synthetic_manifest.json',
+                        help='Written by generate_synthetic_data.py')
+    parser.add_argument('--users', type=int, default=50,
+                        help='Synthetic patients to log in and act as')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+    parser.add_argument('--warmup', type=float, default=3.0,
+                        help='Seconds of unrecorded load first')
+    parser.add_argument('--mix', nargs='+',
+                        help='Override operation weights, e.g. predict=50 '
+                             'doctor_patients=0')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES,
+                        help='CSV of lab values to submit')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', dest='json_path',
+                        help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    mix = parse_mix(args.mix)
+    samples = load_samples(args.samples)
+    sessions = login_sessions(args.url, manifest, args.users, random.Random(args.seed))
+
+    if args.warmup:
+        run_workload(args.url, sessions, samples, mix, args.clients, args.warmup,
+                     args.seed)
+    summary = summarize(*run_workload(args.url, sessions, samples, mix, args.clients,
+                                      args.duration, args.seed))
+
+    for name, r in summary.items():
+        print(f"{name:>28}: {r['throughput_rps']:8.1f} req/s  "
+              f"p50 {r['p50_ms']:8.1f} ms  p95 {r['p95_ms']:8.1f} ms  "
+              f"p99 {r['p99_ms']:8.1f} ms  "
+              f"({r['requests']} requests, {r['errors']} errors)")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'config': vars(args), 'population': manifest['counts'],
+                       'results': summary}, f, indent=2)
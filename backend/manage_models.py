@@ -0,0 +1,37 @@
+from services.model_registry import model_registry
+import argparse
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Manage versioned models in the local model registry')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    register_parser = subparsers.add_parser('register',
+                                            help='Copy a model file into the registry')
+    register_parser.add_argument('path', help='Path to the .h5/.keras model file')
+    register_parser.add_argument('version', help='Version label, e.g. 2026-10-19')
+    register_parser.add_argument('--activate', action='store_true',
+                                 help='Switch workers to this version')
+
+    activate_parser = subparsers.add_parser('activate',
+                                            help='Switch all workers to a registered '
+                                                 'version')
+    activate_parser.add_argument('version')
+
+    subparsers.add_parser('list', help='List registered versions')
+
+    args = parser.parse_args()
+
+    if args.command == 'register':
+        entry = model_registry.register(args.path, args.version, activate=args.activate)
+        print(f"Registered {args.version} ({entry['sha256']})")
+    elif args.command == 'activate':
+        model_registry.activate(args.version)
+        print(f"Activated {args.version}; workers switch within "
+              f"{model_registry.poll_interval:.0f}s without dropping requests")
+    else:
+        manifest = model_registry.read_manifest()
+        for version, entry in sorted(manifest['versions'].items()):
+            marker = '*' if version == manifest['active'] else ' '
+            print(f"{marker} {version}  {entry['sha256'][:12]}  "
+                  f"{entry['registered_at']}")
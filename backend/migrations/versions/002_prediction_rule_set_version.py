@@ -0,0 +1,26 @@
+"""Add rule set version to predictions
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('predictions') as batch_op:
+        batch_op.add_column(sa.Column('rule_set_version', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('predictions') as batch_op:
+        batch_op.drop_column('rule_set_version')
@@ -0,0 +1,34 @@
+"""Add model version to predictions
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('predictions') as batch_op:
+        batch_op.add_column(sa.Column('model_version', sa.String(length=64), nullable=True))
+
+    # Every existing prediction was scored by the rule engine; rows predating rule
+    # set versions were scored with the original rules, published as v1
+    op.execute(
+        "UPDATE predictions "
+        "SET model_version = 'rules-' || COALESCE(rule_set_version, 'v1') "
+        "WHERE model_version IS NULL"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('predictions') as batch_op:
+        batch_op.drop_column('model_version')
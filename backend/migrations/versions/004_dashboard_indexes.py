@@ -0,0 +1,25 @@
+"""Add per-user indexes for dashboard and history queries
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_predictions_user_id_id', 'predictions', ['user_id', 'id'])
+    op.create_index('ix_prescriptions_patient_id_prescribed_at', 'prescriptions', ['patient_id', 'prescribed_at'])
+
+
+def downgrade():
+    op.drop_index('ix_prescriptions_patient_id_prescribed_at', table_name='prescriptions')
+    op.drop_index('ix_predictions_user_id_id', table_name='predictions')
@@ -0,0 +1,79 @@
+"""Add patient search: latest risk columns, filter indexes and a name/email text index
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+SQLITE_TEXT_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+    "name, email, content='users', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_ai AFTER INSERT ON users WHEN new.role = 'user' BEGIN "
+    "INSERT INTO patient_search(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_ad AFTER DELETE ON users WHEN old.role = 'user' BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_au AFTER UPDATE OF name, email, role ON users BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, name, email) "
+    "SELECT 'delete', old.id, old.name, old.email WHERE old.role = 'user'; "
+    "INSERT INTO patient_search(rowid, name, email) SELECT new.id, new.name, new.email WHERE new.role = 'user'; END",
+    "INSERT INTO patient_search(rowid, name, email) SELECT id, name, email FROM users WHERE role = 'user'"
+]
+
+POSTGRES_TEXT_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (lower(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)"
+]
+
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('latest_prediction_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('latest_risk_level', sa.String(length=16), nullable=True))
+    op.create_index('ix_users_role_doctor_id', 'users', ['role', 'doctor_id'])
+    op.create_index('ix_users_role_date_of_birth', 'users', ['role', 'date_of_birth'])
+    op.create_index('ix_users_role_latest_risk_level', 'users', ['role', 'latest_risk_level'])
+
+    # Backfill from each patient's newest prediction (thresholds as in prediction_service.risk_level)
+    op.execute(
+        "UPDATE users SET latest_prediction_id = "
+        "(SELECT MAX(p.id) FROM predictions p WHERE p.user_id = users.id) WHERE role = 'user'"
+    )
+    op.execute(
+        "UPDATE users SET latest_risk_level = "
+        "(SELECT CASE WHEN p.predicted_proba > 0.7 THEN 'high' "
+        "WHEN p.predicted_proba > 0.3 THEN 'moderate' ELSE 'low' END "
+        "FROM predictions p WHERE p.id = users.latest_prediction_id) WHERE role = 'user'"
+    )
+
+    dialect = op.get_bind().dialect.name
+    for statement in {'sqlite': SQLITE_TEXT_INDEX, 'postgresql': POSTGRES_TEXT_INDEX}.get(dialect, []):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('patient_search_ai', 'patient_search_ad', 'patient_search_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS patient_search")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_users_email_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_users_name_trgm")
+
+    op.drop_index('ix_users_role_latest_risk_level', table_name='users')
+    op.drop_index('ix_users_role_date_of_birth', table_name='users')
+    op.drop_index('ix_users_role_doctor_id', table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('latest_risk_level')
+        batch_op.drop_column('latest_prediction_id')
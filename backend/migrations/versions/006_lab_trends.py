@@ -0,0 +1,35 @@
+"""Add per-patient lab trends
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `python rebuild_lab_trends.py` for existing predictions, then kept up to date on insert
+    op.create_table('lab_trends',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('prediction_count', sa.Integer(), nullable=False),
+    sa.Column('high_risk_count', sa.Integer(), nullable=False),
+    sa.Column('last_prediction_id', sa.Integer(), nullable=True),
+    sa.Column('last_prediction_at', sa.DateTime(), nullable=True),
+    sa.Column('stats', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('lab_trends')
@@ -0,0 +1,27 @@
+"""Add updated_at to predictions for HTTP and dashboard validators
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('predictions') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE predictions SET updated_at = created_at")
+
+
+def downgrade():
+    with op.batch_alter_table('predictions') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -8,17 +8,27 @@ bcrypt = Bcrypt()
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_role_doctor_id', 'role', 'doctor_id'),
+        db.Index('ix_users_role_date_of_birth', 'role', 'date_of_birth'),
+        db.Index('ix_users_role_latest_risk_level', 'role', 'latest_risk_level'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # 'doctor' or 'user'
+    role = db.Column(db.String(20), nullable=False)  # 'doctor', 'user' or 'admin'
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     hospital = db.Column(db.String(200), nullable=True)  # For doctors
     date_of_birth = db.Column(db.Date, nullable=True)  # For patients
     gender = db.Column(db.Integer, nullable=True)  # For patients: 0=female, 1=male
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Kept up to date on prediction insert (services/patient_search.py) so search can
+    # filter on it
+    latest_prediction_id = db.Column(db.Integer, nullable=True)
+    # 'low', 'moderate' or 'high'
+    latest_risk_level = db.Column(db.String(16), nullable=True)
 
     # Relationships
     patients = db.relationship('User', backref=db.backref('doctor', remote_side=[id]))
@@ -49,6 +59,7 @@ class User(db.Model):
 
 class Prediction(db.Model):
     __tablename__ = 'predictions'
+    __table_args__ = (db.Index('ix_predictions_user_id_id', 'user_id', 'id'),)
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -56,7 +67,15 @@ class Prediction(db.Model):
     predicted_label = db.Column(db.Integer, nullable=False)  # 0 or 1
     predicted_proba = db.Column(db.Float, nullable=False)
     explanation = db.Column(db.Text, nullable=True)  # JSON string
+    # Rule set that produced the score
+    rule_set_version = db.Column(db.String(32), nullable=True)
+    # Scorer version (registry model or rules-<version>)
+    model_version = db.Column(db.String(64), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Moved forward whenever a stored prediction is rewritten (re-scoring,
+    # compaction); part of the HTTP validators
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
 
     def get_input_features(self):
         return json.loads(self.input_features)
@@ -78,11 +97,31 @@ class Prediction(db.Model):
             'predicted_label': self.predicted_label,
             'predicted_proba': self.predicted_proba,
             'explanation': self.get_explanation(),
+            'rule_set_version': self.rule_set_version,
+            'model_version': self.model_version,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class LabTrend(db.Model):
+    """Per-patient lab value history, folded in on each prediction
+    (services/lab_trends.py)"""
+    __tablename__ = 'lab_trends'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    prediction_count = db.Column(db.Integer, nullable=False, default=0)
+    high_risk_count = db.Column(db.Integer, nullable=False, default=0)
+    last_prediction_id = db.Column(db.Integer, nullable=True)
+    last_prediction_at = db.Column(db.DateTime, nullable=True)
+    stats = db.Column(db.Text, nullable=False)  # JSON: running state per lab value
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_stats(self):
+        return json.loads(self.stats)
+
 class Prescription(db.Model):
     __tablename__ = 'prescriptions'
+    __table_args__ = (db.Index('ix_prescriptions_patient_id_prescribed_at',
+                               'patient_id', 'prescribed_at'),)
 
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -108,7 +147,8 @@ class Prescription(db.Model):
             'title': self.title,
             'medications': self.get_medications(),
             'notes': self.notes,
-            'prescribed_at': self.prescribed_at.isoformat() if self.prescribed_at else None,
+            'prescribed_at': (self.prescribed_at.isoformat()
+                              if self.prescribed_at else None),
             'expires_at': self.expires_at.isoformat() if self.expires_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
@@ -0,0 +1,31 @@
+from flask import Flask
+from models import db
+from config import Config
+from services.lab_trends import rebuild_lab_trends
+import argparse
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Recompute patients' lab trends from stored predictions")
+    parser.add_argument('--patient', type=int, action='append', dest='patients',
+                        help='Only rebuild this patient (repeatable); default is '
+                             'every patient with predictions')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='Patients rebuilt per transaction')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    def report(done, rebuilt):
+        print(f"Processed {done} patients, {rebuilt} trend rows written")
+
+    with app.app_context():
+        summary = rebuild_lab_trends(args.patients, users_per_batch=args.batch_size,
+                                     progress=report)
+        print(f"Rebuilt lab trends for {summary['patients']} patients")
@@ -0,0 +1,32 @@
+from flask import Flask
+from models import db
+from config import Config
+from services.rescoring import rescore_predictions
+import argparse
+
+def create_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Re-score stored predictions under a rule set version')
+    parser.add_argument('version', help='Rule set version to apply (e.g. v1)')
+    parser.add_argument('--chunk-size', type=int, default=5000,
+                        help='Rows scored and committed per chunk')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    def report(scanned, updated, elapsed):
+        rate = scanned / elapsed if elapsed else 0.0
+        print(f"Scanned {scanned} rows, updated {updated} ({rate:,.0f} rows/s)")
+
+    with app.app_context():
+        summary = rescore_predictions(args.version, chunk_size=args.chunk_size,
+                                      progress=report)
+
+    print(f"Re-scored {summary['updated']} predictions with rule set "
+          f"{summary['version']} in {summary['seconds']:.1f}s")
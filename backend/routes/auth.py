@@ -1,13 +1,69 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, g
 from models import db, User
+from services.user_cache import user_cache
+from services.tracing import tracer
 import logging
 import secrets
 import string
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from functools import wraps
+from flask_jwt_extended import (create_access_token, get_jwt_identity, get_jwt,
+                                jwt_required, verify_jwt_in_request)
 
 auth_bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+_IDENTITY_KEYS = ('auth_user_id', 'auth_role', 'auth_user')
+
+@auth_bp.before_app_request
+def _reset_identity():
+    # g outlives a request when an app context is already pushed (CLI, tests)
+    for key in _IDENTITY_KEYS:
+        g.pop(key, None)
+
+def current_user_id():
+    """Authenticated user id for this request (JWT identity, then session), resolved
+    once"""
+    if 'auth_user_id' not in g:
+        user_id = get_jwt_identity() or session.get('user_id')
+        g.auth_user_id = int(user_id) if user_id is not None else None
+    return g.auth_user_id
+
+def current_role():
+    """Role from the JWT 'role' claim issued at login, falling back to the session or
+    user record"""
+    if 'auth_role' not in g:
+        role = get_jwt().get('role') if get_jwt_identity() else session.get('user_role')
+        if role is None and current_user_id() is not None:
+            user = current_user()
+            role = user['role'] if user else None
+        g.auth_role = role
+    return g.auth_role
+
+def current_user():
+    """Cached user dict for this request, or None"""
+    user = g.get('auth_user', _MISSING)
+    if user is _MISSING:
+        user_id = current_user_id()
+        with tracer.span('auth.load_user'):
+            user = user_cache.get(user_id) if user_id is not None else None
+        g.auth_user = user
+    return user
+
+def require_auth(f):
+    """Decorator to require authentication (JWT or session)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Same as @jwt_required(optional=True), timed as the request's auth span
+        with tracer.span('auth'):
+            verify_jwt_in_request(optional=True)
+            user_id = current_user_id()
+        if user_id is None:
+            logger.warning("Authentication failed - no user id from JWT or session")
+            return jsonify({'error': 'Authentication required'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
 def generate_password(length=8):
     """Generate a random password for patient accounts"""
     characters = string.ascii_letters + string.digits
@@ -18,7 +74,7 @@ def login():
     """Simple session-based login for both doctors and patients"""
     try:
         data = request.get_json()
-        logger.info(f"Login attempt for email: {data.get('email')}")
+        logger.info("Login attempt for email: %s", data.get('email'))
 
         if not data.get('email') or not data.get('password'):
             return jsonify({'error': 'Email and password are required'}), 400
@@ -27,7 +83,7 @@ def login():
         user = User.query.filter_by(email=data['email'].lower()).first()
 
         if not user or not user.check_password(data['password']):
-            logger.warning(f"Login failed for email: {data.get('email')}")
+            logger.warning("Login failed for email: %s", data.get('email'))
             return jsonify({'error': 'Invalid email or password'}), 401
 
         # Store user info in session (optional for backward compatibility)
@@ -36,7 +92,8 @@ def login():
         session.permanent = True
 
         # Issue JWT token
-        access_token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
+        access_token = create_access_token(identity=str(user.id),
+                                           additional_claims={'role': user.role})
 
         return jsonify({
             'message': 'Login successful',
@@ -54,22 +111,17 @@ def login():
 def get_profile():
     """Get current user profile from session"""
     try:
-        user_id = get_jwt_identity() or session.get('user_id')
-        user_role = session.get('user_role')
-
-        logger.info(f"Profile request - Session ID: {user_id}, Role: {user_role}")
-
-        if not user_id:
+        if current_user_id() is None:
             return jsonify({'error': 'Not authenticated'}), 401
 
-        # Get user from database
-        user = User.query.get(user_id)
+        # Get user from the identity cache
+        user = current_user()
         if not user:
             session.clear()
             return jsonify({'error': 'User not found'}), 401
 
         return jsonify({
-            'user': user.to_dict(),
+            'user': user,
             'authenticated': True
         }), 200
 
@@ -125,7 +177,8 @@ def register_doctor():
         session['user_role'] = doctor.role
         session.permanent = True
 
-        access_token = create_access_token(identity=str(doctor.id), additional_claims={'role': doctor.role})
+        access_token = create_access_token(identity=str(doctor.id),
+                                           additional_claims={'role': doctor.role})
 
         logger.info(f"New doctor registered: {doctor.email}")
 
@@ -147,11 +200,11 @@ def check_auth():
     try:
         user_id = session.get('user_id')
         if user_id:
-            user = User.query.get(user_id)
+            user = user_cache.get(user_id)
             if user:
                 return jsonify({
                     'authenticated': True,
-                    'user': user.to_dict()
+                    'user': user
                 }), 200
 
         return jsonify({'authenticated': False}), 200
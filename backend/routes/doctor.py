@@ -1,18 +1,35 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, User, Prediction, Prescription
-from routes.auth import generate_password
+from routes.auth import generate_password, current_user_id, current_role
+from services.patient_onboarding import read_patient_csv, onboard_patients
+from services.http_cache import (make_etag, not_modified, with_etag,
+                                 prediction_validator, prescription_validator,
+                                 patient_list_validator)
+from services.event_stream import event_broker, issue_stream_token, verify_stream_token
+from services.patient_search import search_patients, RISK_LEVELS, MAX_PER_PAGE
+from services.lab_trends import trend_summary
+from config import Config
 from datetime import datetime, date
 import csv
 import io
+import json
+import logging
+import time
 
 doctor_bp = Blueprint('doctor', __name__)
+logger = logging.getLogger(__name__)
 
 @doctor_bp.route('/patients', methods=['GET'])
 @jwt_required()
 def get_patients():
     """Get list of all patients (requires authentication)"""
     try:
+        etag = make_etag('patients', patient_list_validator())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
         patients = User.query.filter_by(role='user').all()
 
         patients_data = []
@@ -23,11 +40,55 @@ def get_patients():
             patient_dict['prediction_count'] = prediction_count
             patients_data.append(patient_dict)
 
-        print(f"Retrieved {len(patients_data)} patients")
-        return jsonify({'patients': patients_data}), 200
+        logger.debug("Retrieved %d patients", len(patients_data))
+        return with_etag(jsonify({'patients': patients_data}), etag), 200
+
+    except Exception as e:
+        logger.error("Error getting patients: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@doctor_bp.route('/patients/search', methods=['GET'])
+@jwt_required()
+def search_patients_route():
+    """Search patients by name or email with gender, age band and risk filters
+    (paginated)"""
+    if current_role() != 'doctor':
+        return jsonify({'error': 'Doctor access required'}), 403
+
+    try:
+        gender = request.args.get('gender', type=int)
+        age_min = request.args.get('age_min', type=int)
+        age_max = request.args.get('age_max', type=int)
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 25, type=int)
+        risk = [level for level in request.args.get('risk', '').split(',') if level]
+        scope = request.args.get('scope', 'all')
+
+        if gender not in (None, 0, 1):
+            return jsonify({'error': 'gender must be 0 or 1'}), 400
+        if any(level not in RISK_LEVELS for level in risk):
+            message = f"risk must be one or more of {', '.join(RISK_LEVELS)}"
+            return jsonify({'error': message}), 400
+        if scope not in ('all', 'mine'):
+            return jsonify({'error': 'scope must be all or mine'}), 400
+        if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+            message = f'page must be positive and per_page between 1 and {MAX_PER_PAGE}'
+            return jsonify({'error': message}), 400
+
+        results = search_patients(
+            query=request.args.get('q'),
+            gender=gender,
+            age_min=age_min,
+            age_max=age_max,
+            risk=risk,
+            doctor_id=current_user_id() if scope == 'mine' else None,
+            page=page,
+            per_page=per_page
+        )
+        return jsonify(results), 200
 
     except Exception as e:
-        print(f"Error getting patients: {str(e)}")
+        logger.error("Error searching patients: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @doctor_bp.route('/register-patient', methods=['POST'])
@@ -75,7 +136,7 @@ def register_patient():
         db.session.add(patient)
         db.session.commit()
 
-        print(f"Registered new patient: {patient.email}")
+        logger.info("Registered new patient %s", patient.id)
 
         return jsonify({
             'message': 'Patient registered successfully',
@@ -85,7 +146,41 @@ def register_patient():
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error registering patient: {str(e)}")
+        logger.error("Error registering patient: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@doctor_bp.route('/register-patients/bulk', methods=['POST'])
+@jwt_required()
+def register_patients_bulk():
+    """Register many patients from a CSV upload (doctors only)"""
+    if current_role() != 'doctor':
+        return jsonify({'error': 'Doctor access required'}), 403
+
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+
+        file = request.files['file']
+        if not file.filename.lower().endswith('.csv'):
+            return jsonify({'error': 'File must be a CSV'}), 400
+
+        records = read_patient_csv(file.stream)
+        if not records:
+            return jsonify({'error': 'CSV contains no patients'}), 400
+        if len(records) > Config.BULK_ONBOARDING_MAX_ROWS:
+            message = (f'Uploads are limited to {Config.BULK_ONBOARDING_MAX_ROWS} '
+                       'patients; use bulk_register_patients.py for larger files')
+            return jsonify({'error': message}), 400
+
+        report = onboard_patients(records, doctor_id=int(get_jwt_identity()))
+        logger.info("Bulk registered %d of %d patients", report['created'],
+                    report['total'])
+
+        return jsonify(report), 201 if report['created'] else 400
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error in bulk patient registration: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @doctor_bp.route('/patients/<int:patient_id>/predictions', methods=['GET'])
@@ -98,21 +193,51 @@ def get_patient_predictions(patient_id):
         if not patient:
             return jsonify({'error': 'Patient not found'}), 404
 
+        patient_data = patient.to_dict()
+        etag = make_etag('patient-predictions', patient_data,
+                         prediction_validator(patient_id))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
         predictions = Prediction.query.filter_by(user_id=patient_id).order_by(
             Prediction.created_at.desc()
         ).all()
 
         predictions_data = [pred.to_dict() for pred in predictions]
 
-        print(f"Retrieved {len(predictions_data)} predictions for patient {patient_id}")
+        logger.debug("Retrieved %d predictions for patient %s", len(predictions_data),
+                     patient_id)
 
-        return jsonify({
-            'patient': patient.to_dict(),
+        return with_etag(jsonify({
+            'patient': patient_data,
             'predictions': predictions_data
-        }), 200
+        }), etag), 200
 
     except Exception as e:
-        print(f"Error getting patient predictions: {str(e)}")
+        logger.error("Error getting patient predictions: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@doctor_bp.route('/patients/<int:patient_id>/trends', methods=['GET'])
+@jwt_required()
+def get_patient_trends(patient_id):
+    """Lab value trends for a patient: last value, min/max, slope and a downsampled
+    series per lab value"""
+    if current_role() != 'doctor':
+        return jsonify({'error': 'Doctor access required'}), 403
+
+    try:
+        points = request.args.get('points', type=int)
+        if points is not None and points < 1:
+            return jsonify({'error': 'points must be positive'}), 400
+
+        if not User.query.filter_by(id=patient_id, role='user').first():
+            return jsonify({'error': 'Patient not found'}), 404
+
+        return jsonify(trend_summary(patient_id, points)), 200
+
+    except Exception as e:
+        logger.error("Error getting trends for patient %s: %s", patient_id, e)
         return jsonify({'error': str(e)}), 500
 
 @doctor_bp.route('/patients/<int:patient_id>/predictions/export', methods=['GET'])
@@ -142,7 +267,8 @@ def export_patient_predictions(patient_id):
         # Write data
         for pred in predictions:
             features = pred.get_input_features()
-            risk_level = 'High' if pred.predicted_proba > 0.7 else 'Moderate' if pred.predicted_proba > 0.3 else 'Low'
+            risk_level = ('High' if pred.predicted_proba > 0.7
+                          else 'Moderate' if pred.predicted_proba > 0.3 else 'Low')
 
             writer.writerow([
                 pred.created_at.strftime('%Y-%m-%d %H:%M:%S'),
@@ -159,7 +285,8 @@ def export_patient_predictions(patient_id):
         # Create response
         response = make_response(output.getvalue())
         response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = f'attachment; filename=patient_{patient_id}_predictions.csv'
+        response.headers['Content-Disposition'] = \
+            f'attachment; filename=patient_{patient_id}_predictions.csv'
 
         return response
 
@@ -189,7 +316,8 @@ def manage_prescriptions(patient_id):
                 try:
                     expires_at = datetime.strptime(data['expires_at'], '%Y-%m-%d')
                 except ValueError:
-                    return jsonify({'error': 'Invalid expiry date format. Use YYYY-MM-DD'}), 400
+                    return jsonify({'error': 'Invalid expiry date format. '
+                                             'Use YYYY-MM-DD'}), 400
 
             prescription = Prescription(
                 patient_id=patient_id,
@@ -212,18 +340,77 @@ def manage_prescriptions(patient_id):
 
         else:
             # Get prescriptions
+            patient_data = patient.to_dict()
+            etag = make_etag('patient-prescriptions', patient_data,
+                             prescription_validator(patient_id))
+            cached = not_modified(etag)
+            if cached:
+                return cached
+
             prescriptions = Prescription.query.filter_by(
                 patient_id=patient_id
             ).order_by(Prescription.created_at.desc()).all()
 
             prescriptions_data = [presc.to_dict() for presc in prescriptions]
 
-            return jsonify({
-                'patient': patient.to_dict(),
+            return with_etag(jsonify({
+                'patient': patient_data,
                 'prescriptions': prescriptions_data
-            }), 200
+            }), etag), 200
 
     except Exception as e:
         if request.method == 'POST':
             db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+@doctor_bp.route('/events/token', methods=['POST'])
+@jwt_required()
+def create_event_stream_token():
+    """Short-lived token for opening the event stream (EventSource cannot send
+    headers)"""
+    if current_role() != 'doctor':
+        return jsonify({'error': 'Doctor access required'}), 403
+    return jsonify({'token': issue_stream_token(current_user_id()),
+                    'expires_in': Config.EVENT_STREAM_TOKEN_TTL}), 200
+
+@doctor_bp.route('/events', methods=['GET'])
+def stream_events():
+    """Server-sent events for new predictions and prescriptions of this doctor's
+    patients.
+
+    Opened with ?token=<stream token> from POST /events/token, so the access
+    token never ends up in URLs and logs. Streams end after EVENT_STREAM_MAX_AGE
+    and the browser reconnects; a worker serving EVENT_STREAM_MAX_PER_WORKER
+    streams answers 503.
+    """
+    doctor_id = verify_stream_token(request.args.get('token', ''))
+    if doctor_id is None:
+        return jsonify({'error': 'Invalid or expired stream token'}), 401
+
+    subscription = event_broker.subscribe(doctor_id)
+    if subscription is None:
+        response = jsonify({'error': 'Too many open event streams, retry later'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    heartbeat = Config.EVENT_STREAM_HEARTBEAT
+    deadline = time.monotonic() + Config.EVENT_STREAM_MAX_AGE
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < deadline:
+                item = subscription.get(timeout=heartbeat)
+                if item is None:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                event_id, event_type, payload = item
+                yield (f"id: {event_id}\nevent: {event_type}\n"
+                       f"data: {json.dumps(payload)}\n\n")
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,128 @@
+from flask import Blueprint, request, jsonify, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select, func
+from models import db, User, Prediction
+from routes.auth import current_user_id, current_role
+from services.job_queue import job_queue
+from services.feature_input import FEATURE_TYPES, iter_csv_rows
+from config import Config
+import json
+import logging
+
+jobs_bp = Blueprint('jobs', __name__)
+logger = logging.getLogger(__name__)
+
+def _rows_from_csv(file):
+    """Stream a CSV upload into job rows, recording per-row parse errors"""
+    return list(iter_csv_rows(file.stream, max_rows=Config.JOB_MAX_ROWS))
+
+def _rows_from_patients(patient_ids):
+    """Build job rows from each patient's most recent lab values"""
+    latest_ids = select(func.max(Prediction.id)) \
+        .where(Prediction.user_id.in_(patient_ids)).group_by(Prediction.user_id)
+    latest = dict(db.session.execute(
+        select(Prediction.user_id, Prediction.input_features)
+        .where(Prediction.id.in_(latest_ids))
+    ).all())
+
+    rows = []
+    for index, patient_id in enumerate(patient_ids):
+        row = {'row': index, 'patient_id': patient_id}
+        if patient_id in latest:
+            stored = json.loads(latest[patient_id])
+            row['features'] = {name: stored[name] for name in FEATURE_TYPES}
+        else:
+            row['error'] = 'No lab results on record for patient'
+        rows.append(row)
+    return rows
+
+@jobs_bp.route('', methods=['POST'])
+@jwt_required()
+def submit_job():
+    """Submit a bulk prediction job from a CSV upload or a list of patient IDs"""
+    try:
+        if 'file' in request.files:
+            file = request.files['file']
+            if not file.filename.lower().endswith('.csv'):
+                return jsonify({'error': 'File must be a CSV'}), 400
+            rows = _rows_from_csv(file)
+            source = f'csv:{file.filename}'
+            explain = request.form.get('explain', 'false')
+            include_explanations = explain.lower() == 'true'
+        elif request.is_json:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': 'JSON body must be an object'}), 400
+            patient_ids = data.get('patient_ids')
+            if not isinstance(patient_ids, list) or \
+                    not all(isinstance(p, int) for p in patient_ids):
+                return jsonify({'error': 'patient_ids must be a list of integers'}), 400
+            if len(patient_ids) > Config.JOB_MAX_ROWS:
+                message = f'Jobs are limited to {Config.JOB_MAX_ROWS} rows'
+                return jsonify({'error': message}), 400
+            # Scoring stored labs discloses them: only for the requesting doctor's own
+            # patients
+            if current_role() != 'doctor':
+                return jsonify({'error': 'Doctor access required'}), 403
+            own = set(db.session.execute(
+                select(User.id).where(User.id.in_(patient_ids), User.role == 'user',
+                                      User.doctor_id == current_user_id())
+            ).scalars())
+            if own != set(patient_ids):
+                return jsonify({'error': 'Patients not assigned to you: '
+                                         f'{sorted(set(patient_ids) - own)}'}), 403
+            rows = _rows_from_patients(patient_ids)
+            source = 'patient_ids'
+            include_explanations = bool(data.get('explain', False))
+        else:
+            return jsonify({'error': 'Provide a CSV file or a JSON body with '
+                                     'patient_ids'}), 400
+
+        job_id = job_queue.submit(rows, source, submitted_by=get_jwt_identity(),
+                                  include_explanations=include_explanations)
+        return jsonify({'job_id': job_id, 'job': job_queue.get(job_id)}), 202
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error submitting job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def _get_owned_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job['submitted_by'] != get_jwt_identity():
+        return None
+    return job
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Poll job status and progress"""
+    try:
+        job = _get_owned_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'job': job}), 200
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<job_id>/results', methods=['GET'])
+@jwt_required()
+def get_job_results(job_id):
+    """Stream results of finished chunks as newline-delimited JSON"""
+    try:
+        job = _get_owned_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        def generate():
+            for result in job_queue.iter_results(job_id):
+                yield json.dumps(result) + '\n'
+
+        response = Response(generate(), mimetype='application/x-ndjson')
+        response.headers['X-Job-Status'] = job['status']
+        return response
+    except Exception as e:
+        logger.error(f"Error getting results for job {job_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
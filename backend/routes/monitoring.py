@@ -0,0 +1,80 @@
+from flask import Blueprint, jsonify
+from config import Config
+from flask_jwt_extended import jwt_required
+from services.drift_monitor import drift_monitor
+from services.shadow_scoring import shadow_scorer
+from services.admission import admission
+from services.profiling import request_profiler
+from routes.auth import current_role
+import logging
+
+monitoring_bp = Blueprint('monitoring', __name__)
+logger = logging.getLogger(__name__)
+
+@monitoring_bp.route('/drift', methods=['GET'])
+@jwt_required()
+def get_drift_report():
+    """Report live feature drift against the configured baseline distribution"""
+    if current_role() not in Config.MONITORING_ROLES:
+        return jsonify({'error': 'Monitoring access required'}), 403
+    try:
+        return jsonify(drift_monitor.report()), 200
+    except Exception as e:
+        logger.error(f"Error building drift report: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@monitoring_bp.route('/drift/reset', methods=['POST'])
+@jwt_required()
+def reset_drift():
+    """Start a new drift window on every worker (monitoring admin roles only)"""
+    if current_role() not in Config.MONITORING_ADMIN_ROLES:
+        return jsonify({'error': 'Monitoring admin access required'}), 403
+    drift_monitor.reset()
+    return jsonify({'message': 'Drift state reset'}), 200
+
+@monitoring_bp.route('/shadow', methods=['GET'])
+@jwt_required()
+def get_shadow_summary():
+    """Summarize agreement and latency between the primary and shadow scorers"""
+    if current_role() not in Config.MONITORING_ROLES:
+        return jsonify({'error': 'Monitoring access required'}), 403
+    try:
+        return jsonify(shadow_scorer.summary()), 200
+    except Exception as e:
+        logger.error(f"Error building shadow summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@monitoring_bp.route('/admission', methods=['GET'])
+@jwt_required()
+def get_admission_stats():
+    """Per-stage in-flight, queue depth and shed counts for this worker"""
+    if current_role() not in Config.MONITORING_ROLES:
+        return jsonify({'error': 'Monitoring access required'}), 403
+    try:
+        return jsonify(admission.stats()), 200
+    except Exception as e:
+        logger.error(f"Error reading admission stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@monitoring_bp.route('/profiles', methods=['GET'])
+@jwt_required()
+def list_profiles():
+    """Latest request profiles stored by this host (profiling roles only)"""
+    if current_role() not in request_profiler.roles:
+        return jsonify({'error': 'Profiling access required'}), 403
+    try:
+        return jsonify({'profiles': request_profiler.list_reports()}), 200
+    except Exception as e:
+        logger.error(f"Error listing profiles: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@monitoring_bp.route('/profiles/<profile_id>', methods=['GET'])
+@jwt_required()
+def get_profile(profile_id):
+    """Call-graph report of one profiled request"""
+    if current_role() not in request_profiler.roles:
+        return jsonify({'error': 'Profiling access required'}), 403
+    report = request_profiler.get_report(profile_id)
+    if report is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(report), 200
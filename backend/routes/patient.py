@@ -1,49 +1,36 @@
-from flask import Blueprint, request, jsonify, session
-from models import db, User, Prediction, Prescription
+from flask import Blueprint, request, jsonify
+from models import db, Prediction, Prescription
 from services.prediction_service import prediction_service
-import pandas as pd
-import io
+from services.prediction_writer import prediction_writer
+from services.admission import admission
+from services.metrics import metrics
+from services.feature_input import coerce_features, read_single_csv_row
+from services.lab_trends import trend_summary
+import csv
 import logging
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from functools import wraps
+from routes.auth import require_auth, current_user_id, current_role, current_user
+from services.user_cache import user_cache
+from services.dashboard_cache import dashboard_cache
+from services.http_cache import (make_etag, not_modified, with_etag,
+                                 prediction_validator, prescription_validator)
 
 patient_bp = Blueprint('patient', __name__)
 logger = logging.getLogger(__name__)
 
-def require_auth(f):
-    """Decorator to require authentication (JWT or session) with better debugging"""
-    @wraps(f)
-    @jwt_required(optional=True)
-    def decorated_function(*args, **kwargs):
-        jwt_id = get_jwt_identity()
-        session_id = session.get('user_id')
-        user_id = jwt_id or session_id
-        user_role = session.get('user_role')
-
-        logger.info(f"Auth check - JWT ID: {jwt_id}, Session ID: {session_id}, Using: {user_id}, Role: {user_role}")
-        logger.info(f"Session keys: {list(session.keys())}")
-
-        if not user_id:
-            logger.warning("Authentication failed - no user id from JWT or session")
-            return jsonify({'error': 'Authentication required'}), 401
-        # Stash for handlers (no g import to keep minimal change)
-        return f(*args, **kwargs)
-    return decorated_function
-
 @patient_bp.route('/predict', methods=['POST'])
 @require_auth
+@metrics.timed('request')
 def make_prediction():
     """Make anemia prediction with XAI explanations"""
     try:
-        logger.info("Making prediction request with XAI")
-
         # Handle both JSON and file upload
         features = None
 
         if request.is_json:
-            # JSON input
-            features = request.get_json()
-            logger.info(f"Received JSON input: {features}")
+            # JSON input, coerced to the typed feature schema
+            features, error = coerce_features(request.get_json(silent=True))
+            if error:
+                return jsonify({'error': error}), 400
         elif 'file' in request.files:
             # CSV file upload
             file = request.files['file']
@@ -54,25 +41,18 @@ def make_prediction():
                 return jsonify({'error': 'File must be a CSV'}), 400
 
             try:
-                # Read CSV
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_data = pd.read_csv(stream)
-
-                if len(csv_data) != 1:
-                    return jsonify({'error': 'CSV must contain exactly one row of data'}), 400
-
-                features = csv_data.iloc[0].to_dict()
-                logger.info(f"Received CSV input: {features}")
-
-            except Exception as e:
+                features = read_single_csv_row(file.stream)
+            except (ValueError, UnicodeDecodeError, csv.Error) as e:
                 return jsonify({'error': f'Error reading CSV file: {str(e)}'}), 400
         else:
             return jsonify({'error': 'No input data provided'}), 400
 
         # Make prediction with XAI explanations
         try:
-            result = prediction_service.predict(features)
-            logger.info(f"Prediction result with explanations: {result}")
+            # Over the in-flight limit, still answer: score and numeric explanation, no
+            # charts
+            with admission.stage('predict') as admitted:
+                result = prediction_service.predict(features, render=admitted)
 
         except ValueError as e:
             return jsonify({'error': str(e)}), 400
@@ -80,28 +60,23 @@ def make_prediction():
             logger.error(f"Prediction error: {str(e)}")
             return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
 
-        # Save prediction to database
-        user_id = get_jwt_identity() or session.get('user_id')
+        # Save prediction to database (directly or through the write-behind buffer)
+        user_id = current_user_id()
         if user_id:
             try:
-                prediction_record = Prediction(
-                    user_id=user_id,
-                    predicted_label=result['predicted_label'],
-                    predicted_proba=result['predicted_proba']
-                )
-                prediction_record.set_input_features(features)
-                prediction_record.set_explanation(result['explanations'])
-
-                db.session.add(prediction_record)
-                db.session.commit()
+                with metrics.timer('db_write'):
+                    prediction_id = prediction_writer.save(user_id, features, result)
 
                 # Add saved prediction ID to result
-                result['saved_prediction_id'] = prediction_record.id
-                logger.info(f"Prediction with XAI explanations saved with ID: {prediction_record.id}")
+                if prediction_id is not None:
+                    result['saved_prediction_id'] = prediction_id
+                logger.info("Prediction %s saved for user %s", prediction_id, user_id)
             except Exception as e:
-                logger.warning(f"Could not save prediction to database: {str(e)}")
+                logger.warning("Could not save prediction to database: %s", e)
 
-        return jsonify(result), 200
+        with metrics.timer('json_encode'):
+            response = jsonify(result)
+        return response, 200
 
     except Exception as e:
         db.session.rollback()
@@ -113,56 +88,70 @@ def make_prediction():
 def get_my_predictions():
     """Get all predictions for the current user"""
     try:
-        user_id = get_jwt_identity() or session.get('user_id')
-        predictions = Prediction.query.filter_by(user_id=user_id).order_by(Prediction.created_at.desc()).all()
+        user_id = current_user_id()
+        etag = make_etag('predictions', user_id, prediction_validator(user_id))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        predictions = Prediction.query.filter_by(user_id=user_id) \
+                                      .order_by(Prediction.created_at.desc()).all()
         predictions_data = [pred.to_dict() for pred in predictions]
 
-        logger.info(f"Retrieved {len(predictions_data)} predictions for user {user_id}")
+        logger.debug("Retrieved %d predictions for user %s", len(predictions_data),
+                     user_id)
 
-        return jsonify({'predictions': predictions_data}), 200
+        return with_etag(jsonify({'predictions': predictions_data}), etag), 200
 
     except Exception as e:
         logger.error(f"Error getting predictions: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@patient_bp.route('/trends', methods=['GET'])
+@require_auth
+def get_my_trends():
+    """Lab value trends for the current user"""
+    try:
+        points = request.args.get('points', type=int)
+        if points is not None and points < 1:
+            return jsonify({'error': 'points must be positive'}), 400
+
+        return jsonify(trend_summary(current_user_id(), points)), 200
+
+    except Exception as e:
+        logger.error("Error getting trends: %s", e)
+        return jsonify({'error': str(e)}), 500
+
 @patient_bp.route('/dashboard', methods=['GET'])
 @require_auth
 def get_patient_dashboard():
     """Get patient dashboard data"""
     try:
-        user_id = get_jwt_identity() or session.get('user_id')
-        user = User.query.get(user_id)
+        user_id = current_user_id()
+        user = current_user()
 
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
-        # Get recent predictions
-        recent_predictions = Prediction.query.filter_by(user_id=user_id)\
-                                           .order_by(Prediction.created_at.desc())\
-                                           .limit(5).all()
-
-        # Get active prescriptions
-        active_prescriptions = Prescription.query.filter_by(patient_id=user_id)\
-                                                .order_by(Prescription.prescribed_at.desc())\
-                                                .limit(5).all()
-
-        # Get total count
-        total_predictions = Prediction.query.filter_by(user_id=user_id).count()
-
         # Get doctor info if assigned
         doctor = None
-        if user.doctor_id:
-            doctor = User.query.get(user.doctor_id)
+        if user['doctor_id']:
+            doctor = user_cache.get(user['doctor_id'])
+
+        # Recent predictions, prescriptions and total (cached per patient)
+        data, data_etag = dashboard_cache.lookup(user_id)
+        etag = make_etag('dashboard', data_etag, user, doctor)
+        cached = not_modified(etag)
+        if cached:
+            return cached
 
         dashboard_data = {
-            'user': user.to_dict(),
-            'recent_predictions': [pred.to_dict() for pred in recent_predictions],
-            'active_prescriptions': [pres.to_dict() for pres in active_prescriptions],
-            'total_predictions': total_predictions,
-            'doctor': doctor.to_dict() if doctor else None
+            'user': user,
+            **data,
+            'doctor': doctor
         }
 
-        return jsonify(dashboard_data), 200
+        return with_etag(jsonify(dashboard_data), etag), 200
 
     except Exception as e:
         logger.error(f"Error getting dashboard data: {str(e)}")
@@ -173,21 +162,29 @@ def get_patient_dashboard():
 def get_prescriptions(patient_id):
     """Get prescriptions for a patient"""
     try:
-        user_id = get_jwt_identity() or session.get('user_id')
-        user_id = int(user_id) if user_id is not None else None
+        user_id = current_user_id()
+        role = current_role()
         patient_id = int(patient_id)
-        # Check if user is accessing their own prescriptions or is a doctor
-        user = User.query.get(user_id)
-        if user.role != 'doctor' and user_id != patient_id:
-            logger.warning(f"Unauthorized access: user_id={user_id}, role={user.role}, tried to access patient_id={patient_id}")
-            return jsonify({'error': f'Unauthorized access: user_id={user_id}, role={user.role}, tried to access patient_id={patient_id}'}), 403
-
-        prescriptions = Prescription.query.filter_by(patient_id=patient_id)\
-                                         .order_by(Prescription.prescribed_at.desc()).all()
-
-        return jsonify({
+        # Check if user is accessing their own prescriptions or is a doctor (role from
+        # the JWT claim)
+        if role != 'doctor' and user_id != patient_id:
+            message = (f'Unauthorized access: user_id={user_id}, role={role}, '
+                       f'tried to access patient_id={patient_id}')
+            logger.warning(message)
+            return jsonify({'error': message}), 403
+
+        etag = make_etag('prescriptions', patient_id,
+                         prescription_validator(patient_id))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        prescriptions = Prescription.query.filter_by(patient_id=patient_id) \
+            .order_by(Prescription.prescribed_at.desc()).all()
+
+        return with_etag(jsonify({
             'prescriptions': [pres.to_dict() for pres in prescriptions]
-        }), 200
+        }), etag), 200
 
     except Exception as e:
         logger.error(f"Error getting prescriptions: {str(e)}")
@@ -202,7 +199,8 @@ def get_latest_explanation():
         if result['success']:
             return jsonify(result['explanation']), 200
         else:
-            return jsonify({'error': result.get('error', 'No recent prediction found')}), 404
+            error = result.get('error', 'No recent prediction found')
+            return jsonify({'error': error}), 404
     except Exception as e:
         logger.error(f"Error getting explanation: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from services.metrics import metrics
+
+class StageLimiter:
+    """Concurrency limit for one expensive stage, with a bounded wait queue.
+
+    A caller is admitted straight away while fewer than ``limit`` calls are in
+    flight. Otherwise it waits up to ``timeout`` seconds, but only if fewer than
+    ``queue_size`` callers are already waiting. A caller that is not admitted is
+    shed and should take its degraded path.
+    """
+
+    def __init__(self, name, limit, queue_size, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue_size:
+                self.shed += 1
+                return False
+
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self):
+        """Yield True if admitted (and hold the slot for the block), False if shed"""
+        admitted = self.acquire()
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'queue_depth': self.waiting,
+                'peak_queue_depth': self.peak_waiting,
+                'admitted': self.admitted,
+                'shed': self.shed
+            }
+
+class AdmissionController:
+    """Per-worker limiters for the expensive prediction stages.
+
+    ``predict`` caps full predictions (scoring plus explanations) in flight and
+    ``render`` caps chart rendering. A request shed at either stage is still
+    scored and gets the numeric explanation, just without rendered charts.
+    """
+
+    def __init__(self, enabled=None, stages=None):
+        self.enabled = Config.ADMISSION_CONTROL if enabled is None else enabled
+        stages = stages or Config.ADMISSION_STAGES
+        self.stages = {
+            name: StageLimiter(name, settings['limit'], settings['queue'],
+                               settings['timeout'])
+            for name, settings in stages.items()
+        }
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield True
+            return
+        with self.stages[name].admit() as admitted:
+            yield admitted
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'pid': os.getpid(),
+            'stages': {name: limiter.stats() for name, limiter in self.stages.items()}
+        }
+
+    def metric_samples(self):
+        """Admission totals and queue depths for the /metrics endpoint"""
+        counters, gauges = [], []
+        for name, limiter in self.stages.items():
+            stats = limiter.stats()
+            labels = {'stage': name}
+            counters.append(('taps_admission_admitted_total', labels,
+                             stats['admitted']))
+            counters.append(('taps_admission_shed_total', labels, stats['shed']))
+            gauges.append(('taps_admission_queue_depth', labels, stats['queue_depth']))
+            gauges.append(('taps_admission_in_flight', labels, stats['in_flight']))
+        return {'counters': counters, 'gauges': gauges}
+
+# Global instance
+admission = AdmissionController()
+metrics.add_collector(admission.metric_samples)
@@ -0,0 +1,148 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, text
+from config import Config
+from models import db, Prediction
+
+logger = logging.getLogger(__name__)
+
+# json.dumps of an explanation whose charts were skipped or already stripped
+EMPTY_VISUALIZATIONS = '"visualizations": {}'
+
+def database_size():
+    """Bytes used by the predictions data: the whole file on SQLite, the table
+    (with TOAST and indexes) on Postgres"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        page_size = db.session.execute(text('PRAGMA page_size')).scalar()
+        page_count = db.session.execute(text('PRAGMA page_count')).scalar()
+        freelist = db.session.execute(text('PRAGMA freelist_count')).scalar()
+        return {'total_bytes': page_size * page_count,
+                'free_bytes': page_size * freelist}
+    if dialect == 'postgresql':
+        query = text("SELECT pg_total_relation_size('predictions')")
+        return {'total_bytes': db.session.execute(query).scalar()}
+    return {}
+
+def compact_explanations(older_than_days=None, batch_size=None, pause=None,
+                         progress=None):
+    """Strip rendered charts from the explanations of old predictions.
+
+    Rows created more than ``older_than_days`` ago keep their label, probability,
+    contributions and clinical interpretation; only ``visualizations`` (HTML and
+    base64 PNG charts) is emptied and a ``compacted_at`` stamp added. Rows are
+    walked in primary-key order in batches of ``batch_size``, each written with
+    one executemany UPDATE and committed on its own, with ``pause`` seconds
+    between batches so request writes never wait long for the lock. Rows
+    without charts are skipped in SQL, so a rerun only touches new candidates.
+    """
+    if older_than_days is None:
+        older_than_days = Config.RETENTION_VISUALIZATION_DAYS
+    batch_size = batch_size or Config.COMPACTION_BATCH_SIZE
+    pause = Config.COMPACTION_PAUSE if pause is None else pause
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    compacted_at = datetime.utcnow().isoformat()
+    last_id = 0
+    scanned = 0
+    compacted = 0
+    bytes_freed = 0
+    started = time.monotonic()
+
+    while True:
+        rows = db.session.execute(
+            select(Prediction.id, Prediction.explanation)
+            .where(Prediction.id > last_id)
+            .where(Prediction.created_at < cutoff)
+            .where(Prediction.explanation.is_not(None))
+            .where(Prediction.explanation.not_like(f'%{EMPTY_VISUALIZATIONS}%'))
+            .order_by(Prediction.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        updates = []
+        now = datetime.utcnow()
+        for prediction_id, explanation in rows:
+            try:
+                payload = json.loads(explanation)
+            except ValueError:
+                logger.warning("Skipping prediction %s with unreadable explanation",
+                               prediction_id)
+                continue
+            if not isinstance(payload, dict) or not payload.get('visualizations'):
+                continue
+            payload['visualizations'] = {}
+            payload['compacted_at'] = compacted_at
+            stripped = json.dumps(payload)
+            bytes_freed += (len(explanation.encode('utf-8'))
+                            - len(stripped.encode('utf-8')))
+            updates.append({'id': prediction_id, 'explanation': stripped,
+                            'updated_at': now})
+
+        if updates:
+            db.session.execute(update(Prediction), updates)
+        db.session.commit()
+
+        scanned += len(rows)
+        compacted += len(updates)
+        last_id = rows[-1][0]
+        if progress:
+            progress(scanned, compacted, bytes_freed, time.monotonic() - started)
+        if pause:
+            time.sleep(pause)
+
+    return {
+        'cutoff': cutoff.isoformat(),
+        'scanned': scanned,
+        'compacted': compacted,
+        'bytes_freed': bytes_freed,
+        'seconds': time.monotonic() - started
+    }
+
+def reclaim_space(full_vacuum=False):
+    """Refresh planner statistics and return freed pages to the filesystem where
+    that is cheap.
+
+    SQLite: ANALYZE, then ``PRAGMA incremental_vacuum`` when the database uses
+    auto_vacuum=INCREMENTAL. Otherwise freed pages are reused by later inserts,
+    and a full VACUUM (which locks the database while it rewrites the file) only
+    runs with ``full_vacuum``. Postgres: a plain ``VACUUM (ANALYZE)`` of the
+    table, which does not block reads or writes.
+    """
+    dialect = db.engine.dialect.name
+    before = database_size()
+    actions = []
+
+    db.session.commit()
+    # VACUUM cannot run inside a transaction block
+    with db.engine.connect().execution_options(
+            isolation_level='AUTOCOMMIT') as connection:
+        if dialect == 'sqlite':
+            connection.execute(text('ANALYZE predictions'))
+            actions.append('analyze')
+            if full_vacuum:
+                connection.execute(text('VACUUM'))
+                actions.append('vacuum')
+            elif connection.execute(text('PRAGMA auto_vacuum')).scalar() == 2:
+                # Pages are released one per result row
+                connection.execute(text('PRAGMA incremental_vacuum')).fetchall()
+                actions.append('incremental_vacuum')
+        elif dialect == 'postgresql':
+            connection.execute(text('VACUUM (FULL, ANALYZE) predictions' if full_vacuum
+                                    else 'VACUUM (ANALYZE) predictions'))
+            actions.append('vacuum_full_analyze' if full_vacuum else 'vacuum_analyze')
+    if not actions:
+        logger.info("No space reclamation for the %s dialect", dialect)
+
+    after = database_size()
+    db.session.commit()
+    return {
+        'actions': actions,
+        'size_before': before,
+        'size_after': after,
+        'bytes_reclaimed': ((before.get('total_bytes', 0) - after.get('total_bytes', 0))
+                            if before else 0)
+    }
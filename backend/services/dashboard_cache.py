@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session, object_session
+from config import Config
+from models import db, Prediction, Prescription
+from services.http_cache import make_etag, prediction_validator, prescription_validator
+
+RECENT_LIMIT = 5
+
+def build_dashboard_data(user_id):
+    """Recent predictions (with the total from a window count) and prescriptions
+    in two indexed queries"""
+    rows = db.session.execute(
+        select(Prediction, func.count().over().label('total'))
+        .where(Prediction.user_id == user_id)
+        .order_by(Prediction.id.desc())
+        .limit(RECENT_LIMIT)
+    ).all()
+
+    prescriptions = db.session.execute(
+        select(Prescription)
+        .where(Prescription.patient_id == user_id)
+        .order_by(Prescription.prescribed_at.desc())
+        .limit(RECENT_LIMIT)
+    ).scalars().all()
+
+    return {
+        'recent_predictions': [prediction.to_dict() for prediction, _ in rows],
+        'active_prescriptions': [prescription.to_dict()
+                                 for prescription in prescriptions],
+        'total_predictions': rows[0].total if rows else 0
+    }
+
+def dashboard_validator(user_id):
+    """Changes with any prediction or prescription write for the patient, from any
+    worker or bulk job (two aggregate queries on the per-patient indexes)"""
+    return prediction_validator(user_id), prescription_validator(user_id)
+
+class DashboardCache:
+    """Per-worker cache of the prediction/prescription part of each patient's dashboard.
+
+    An entry is only served while the patient's dashboard_validator still
+    matches the one it was built under, so writes made by other workers and by
+    bulk jobs that bypass the ORM show up on the next read. This worker's own
+    writes also drop the entry right away.
+    """
+
+    def __init__(self, ttl=None, maxsize=None):
+        self.ttl = Config.DASHBOARD_CACHE_TTL if ttl is None else ttl
+        self.maxsize = maxsize or Config.DASHBOARD_CACHE_MAXSIZE
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Cached dashboard data for a patient, built on a miss"""
+        return self.lookup(user_id)[0]
+
+    def lookup(self, user_id):
+        """(data, etag) for a patient; the etag is computed once per build"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        # Read before building: a write that lands in between leaves a validator
+        # behind the data, which only costs one extra rebuild
+        validator = dashboard_validator(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now and entry[1] == validator:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2:]
+            self.misses += 1
+            generation = self._generations.get(user_id, 0)
+
+        data = build_dashboard_data(user_id)
+        etag = make_etag(data)
+
+        with self._lock:
+            # Skip caching if the patient was invalidated while we were building
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[user_id] = (now + self.ttl, validator, data, etag)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return data, etag
+
+    def invalidate(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+# Global instance
+dashboard_cache = DashboardCache()
+
+def _mark_dirty(target, user_id):
+    # Drop now, and again after commit so a read between flush and commit cannot
+    # re-cache stale data
+    dashboard_cache.invalidate(user_id)
+    object_session(target).info.setdefault('invalidate_dashboards', set()).add(user_id)
+
+@event.listens_for(Prediction, 'after_insert')
+@event.listens_for(Prediction, 'after_update')
+@event.listens_for(Prediction, 'after_delete')
+def _invalidate_on_prediction_write(mapper, connection, target):
+    _mark_dirty(target, target.user_id)
+
+@event.listens_for(Prescription, 'after_insert')
+@event.listens_for(Prescription, 'after_update')
+@event.listens_for(Prescription, 'after_delete')
+def _invalidate_on_prescription_write(mapper, connection, target):
+    _mark_dirty(target, target.patient_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop('invalidate_dashboards', ()):
+        dashboard_cache.invalidate(user_id)
@@ -0,0 +1,237 @@
+import math
+import threading
+import time
+import logging
+from config import Config
+from services.worker_state import WorkerStateStore
+
+logger = logging.getLogger(__name__)
+
+# Histogram ranges mirror the accepted input ranges in PredictionService._validate_input
+FEATURE_RANGES = {
+    'Hemoglobin': (3.0, 25.0),
+    'MCH': (10.0, 50.0),
+    'MCHC': (20.0, 45.0),
+    'MCV': (50.0, 130.0)
+}
+
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+class FeatureSketch:
+    """Constant-memory sketch of one feature: fixed-bin histogram plus running
+    moments"""
+
+    def __init__(self, low, high, bins):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.width = (high - low) / bins
+        self.counts = [0] * bins
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, value):
+        index = int((value - self.low) / self.width)
+        self.counts[min(max(index, 0), self.bins - 1)] += 1
+
+        # Welford's online mean/variance
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Merge another sketch with the same bin layout into this one"""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def edges(self):
+        return [self.low + i * self.width for i in range(self.bins + 1)]
+
+    def quantile(self, q):
+        """Approximate quantile by linear interpolation inside the histogram bin"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            if c and cumulative + c >= target:
+                return self.low + (i + (target - cumulative) / c) * self.width
+            cumulative += c
+        return self.high
+
+    def to_dict(self):
+        return {
+            'low': self.low, 'high': self.high, 'bins': self.bins,
+            'counts': self.counts, 'count': self.count,
+            'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['low'], data['high'], data['bins'])
+        sketch.counts = list(data['counts'])
+        sketch.count = data['count']
+        sketch.mean = data['mean']
+        sketch.m2 = data['m2']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        return sketch
+
+def _normal_cdf(x, mean, std):
+    return 0.5 * (1.0 + math.erf((x - mean) / (std * math.sqrt(2.0))))
+
+def compare_to_baseline(sketch, mean, std):
+    """Compute PSI and KS statistics of a sketch against a normal baseline"""
+    edges = sketch.edges()
+
+    # Expected mass per bin; the tails fold into the outer bins, like clamped updates do
+    cdf = [_normal_cdf(e, mean, std) for e in edges]
+    cdf[0], cdf[-1] = 0.0, 1.0
+    expected = [cdf[i + 1] - cdf[i] for i in range(sketch.bins)]
+
+    epsilon = 1e-4
+    psi = 0.0
+    ks = 0.0
+    observed_cdf = 0.0
+    for i, c in enumerate(sketch.counts):
+        actual = c / sketch.count
+        e = max(expected[i], epsilon)
+        a = max(actual, epsilon)
+        psi += (a - e) * math.log(a / e)
+        observed_cdf += actual
+        ks = max(ks, abs(observed_cdf - cdf[i + 1]))
+
+    return psi, ks
+
+class DriftMonitor:
+    """Track live feature distributions and compare them with
+    Config.FEATURE_MEANS/STDS"""
+
+    def __init__(self, state_dir=None, bins=None, flush_interval=None, ttl=None):
+        self.bins = bins or Config.DRIFT_HISTOGRAM_BINS
+        self.flush_interval = (Config.DRIFT_FLUSH_INTERVAL if flush_interval is None
+                               else flush_interval)
+        self.store = WorkerStateStore(
+            state_dir or Config.WORKER_STATE_DIR, 'drift',
+            ttl=Config.DRIFT_STATE_TTL if ttl is None else ttl)
+        self.lock = threading.Lock()
+        self.sketches = self._new_sketches()
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        self._epoch = self.store.epoch()
+
+    def _new_sketches(self):
+        return {name: FeatureSketch(low, high, self.bins)
+                for name, (low, high) in FEATURE_RANGES.items()}
+
+    def update(self, features):
+        """Record one validated input row"""
+        with self.lock:
+            for name, sketch in self.sketches.items():
+                sketch.update(float(features[name]))
+            self._dirty = True
+            should_flush = time.monotonic() - self._last_flush >= self.flush_interval
+
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Write this worker's sketches so other workers can merge them"""
+        epoch = self.store.epoch()
+        with self.lock:
+            if epoch > self._epoch:
+                # Another worker reset the monitor: drop what was counted before that
+                self.sketches = self._new_sketches()
+                self._epoch = epoch
+                self._dirty = False
+            if not self._dirty:
+                return
+            state = {name: sketch.to_dict() for name, sketch in self.sketches.items()}
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        self.store.save(state)
+
+    def merged_sketches(self):
+        """Merge the snapshots of every worker into one set of sketches"""
+        self.flush()
+        merged = self._new_sketches()
+        states = self.store.load_all()
+        for state in states.values():
+            for name, data in state.items():
+                if name in merged and data.get('bins') == self.bins:
+                    merged[name].merge(FeatureSketch.from_dict(data))
+        return merged, len(states)
+
+    def report(self):
+        """Build a drift report for every monitored feature"""
+        sketches, workers = self.merged_sketches()
+        features = {}
+
+        for name, sketch in sketches.items():
+            baseline_mean = Config.FEATURE_MEANS[name]
+            baseline_std = Config.FEATURE_STDS[name]
+            entry = {
+                'count': sketch.count,
+                'baseline': {'mean': baseline_mean, 'std': baseline_std},
+                'observed': None,
+                'psi': None,
+                'ks': None,
+                'status': 'insufficient_data'
+            }
+
+            if sketch.count:
+                psi, ks = compare_to_baseline(sketch, baseline_mean, baseline_std)
+                entry['observed'] = {
+                    'mean': sketch.mean,
+                    'std': sketch.std,
+                    'min': sketch.min,
+                    'max': sketch.max,
+                    'p05': sketch.quantile(0.05),
+                    'p50': sketch.quantile(0.5),
+                    'p95': sketch.quantile(0.95)
+                }
+                entry['psi'] = psi
+                entry['ks'] = ks
+                if sketch.count >= Config.DRIFT_MIN_SAMPLES:
+                    entry['status'] = 'significant_drift' if psi >= PSI_SIGNIFICANT \
+                        else 'moderate_drift' if psi >= PSI_MODERATE else 'stable'
+
+            features[name] = entry
+
+        return {
+            'workers': workers,
+            'min_samples': Config.DRIFT_MIN_SAMPLES,
+            'features': features
+        }
+
+    def reset(self):
+        """Drop all local and shared sketch state (other workers drop theirs on
+        their next flush)"""
+        self.store.clear()
+        with self.lock:
+            self.sketches = self._new_sketches()
+            self._dirty = False
+            self._epoch = self.store.epoch()
+
+# Global instance
+drift_monitor = DriftMonitor()
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from itsdangerous import URLSafeTimedSerializer, BadData
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.util import identity_key
+from config import Config
+from models import User, Prediction, Prescription
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """One open event stream: a bounded queue of (event id, type, payload)"""
+
+    def __init__(self, doctor_id, maxsize):
+        self.doctor_id = doctor_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventBroker:
+    """In-process pub/sub of per-doctor events, with an optional cross-worker relay.
+
+    Publishing fans out to this worker's subscribers straight away. With
+    EVENT_RELAY enabled, events are also appended to a local SQLite log that a
+    background thread in every worker with open streams tails, so doctors get
+    events no matter which worker handled the write. Slow consumers never block
+    publishers: a full subscriber queue drops the event.
+    """
+
+    def __init__(self, relay=None, relay_path=None, queue_size=None, poll_interval=None,
+                 retention=None, max_streams=None):
+        self.relay = Config.EVENT_RELAY if relay is None else relay
+        self.max_streams = max_streams or Config.EVENT_STREAM_MAX_PER_WORKER
+        self.relay_path = relay_path or Config.EVENT_RELAY_PATH
+        self.queue_size = queue_size or Config.EVENT_STREAM_QUEUE_SIZE
+        self.poll_interval = poll_interval or Config.EVENT_RELAY_POLL_INTERVAL
+        self.retention = retention or Config.EVENT_RELAY_RETENTION
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._relay_thread = None
+        self._relay_ready = False
+        self.published = 0
+
+    def subscribe(self, doctor_id):
+        """Open a stream for a doctor; None when this worker already serves
+        max_streams streams"""
+        subscription = Subscription(doctor_id, self.queue_size)
+        with self._lock:
+            # Each open stream holds a worker thread, so leave the rest for ordinary
+            # requests
+            open_streams = sum(len(subscribers)
+                               for subscribers in self._subscribers.values())
+            if open_streams >= self.max_streams:
+                return None
+            self._subscribers.setdefault(doctor_id, set()).add(subscription)
+        if self.relay:
+            self._ensure_relay()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.doctor_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.doctor_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, doctor_id, event_type, payload):
+        """Deliver an event to the doctor's streams in this worker and, if enabled,
+        to the relay"""
+        self._deliver(doctor_id, event_type, payload)
+        self.published += 1
+        if self.relay:
+            try:
+                self._append_to_relay(doctor_id, event_type, payload)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not relay {event_type} event: {e}")
+
+    def _deliver(self, doctor_id, event_type, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(doctor_id, ()))
+            self._sequence += 1
+            sequence = self._sequence
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((sequence, event_type, payload))
+            except queue.Full:
+                subscription.dropped += 1
+
+    # Cross-worker relay
+
+    def _connect(self):
+        if not self._relay_ready:
+            os.makedirs(os.path.dirname(os.path.abspath(self.relay_path)),
+                        exist_ok=True)
+        conn = sqlite3.connect(self.relay_path, timeout=5, isolation_level=None)
+        if not self._relay_ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    origin INTEGER NOT NULL,
+                    doctor_id INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            ''')
+            self._relay_ready = True
+        return conn
+
+    def _append_to_relay(self, doctor_id, event_type, payload):
+        conn = self._connect()
+        try:
+            conn.execute('INSERT INTO events (created_at, origin, doctor_id, '
+                         'event_type, payload) VALUES (?, ?, ?, ?, ?)',
+                         (time.time(), os.getpid(), doctor_id, event_type,
+                          json.dumps(payload)))
+        finally:
+            conn.close()
+
+    def _ensure_relay(self):
+        # Started lazily so each forked gunicorn worker gets its own thread
+        if self._relay_thread is not None and self._relay_thread.is_alive():
+            return
+        with self._lock:
+            if self._relay_thread is None or not self._relay_thread.is_alive():
+                self._relay_thread = threading.Thread(target=self._run_relay,
+                                                      name='event-relay', daemon=True)
+                self._relay_thread.start()
+
+    def _run_relay(self):
+        conn = self._connect()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+        last_prune = time.monotonic()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if not self.subscriber_count():
+                    last_id = conn.execute(
+                        'SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+                    continue
+                rows = conn.execute('''
+                    SELECT id, origin, doctor_id, event_type, payload FROM events
+                    WHERE id > ? ORDER BY id
+                ''', (last_id,)).fetchall()
+                pid = os.getpid()
+                for event_id, origin, doctor_id, event_type, payload in rows:
+                    last_id = event_id
+                    if origin != pid:
+                        self._deliver(doctor_id, event_type, json.loads(payload))
+
+                if time.monotonic() - last_prune > self.retention:
+                    conn.execute('DELETE FROM events WHERE created_at < ?',
+                                 (time.time() - self.retention,))
+                    last_prune = time.monotonic()
+            except sqlite3.Error as e:
+                logger.warning(f"Event relay poll failed: {e}")
+
+# Global instance
+event_broker = EventBroker()
+
+def _stream_token_serializer():
+    return URLSafeTimedSerializer(Config.JWT_SECRET_KEY, salt='doctor-event-stream')
+
+def issue_stream_token(doctor_id):
+    """Short-lived token that only opens an event stream (EventSource has to put
+    it in the URL)"""
+    return _stream_token_serializer().dumps({'doctor_id': int(doctor_id)})
+
+def verify_stream_token(token):
+    """Doctor id of a valid, unexpired stream token, else None"""
+    try:
+        claims = _stream_token_serializer().loads(
+            token, max_age=Config.EVENT_STREAM_TOKEN_TTL)
+        return int(claims['doctor_id'])
+    except (BadData, KeyError, TypeError, ValueError):
+        return None
+
+def _queue_event(session, doctor_id, event_type, payload):
+    if doctor_id is not None:
+        session.info.setdefault('pending_events', []).append(
+            (doctor_id, event_type, payload))
+
+@event.listens_for(Prediction, 'after_insert')
+def _prediction_event(mapper, connection, target):
+    # No stream here and no relay to other workers: nobody can receive the event
+    if not event_broker.relay and not event_broker.subscriber_count():
+        return
+    session = object_session(target)
+    # Use the patient already loaded in the session, else look the doctor up on the
+    # flush connection; the session cannot be used (or lazy-load) mid-flush
+    patient = (target.__dict__.get('user')
+               or session.identity_map.get(identity_key(User, target.user_id)))
+    if patient is not None and 'doctor_id' in patient.__dict__:
+        doctor_id = patient.doctor_id
+    else:
+        doctor_id = connection.execute(
+            select(User.doctor_id).where(User.id == target.user_id)).scalar()
+    _queue_event(session, doctor_id, 'prediction', {
+        'patient_id': target.user_id,
+        'prediction_id': target.id,
+        'predicted_label': target.predicted_label,
+        'predicted_proba': target.predicted_proba,
+        'created_at': target.created_at.isoformat() if target.created_at else None
+    })
+
+@event.listens_for(Prescription, 'after_insert')
+def _prescription_event(mapper, connection, target):
+    _queue_event(object_session(target), target.doctor_id, 'prescription', {
+        'patient_id': target.patient_id,
+        'prescription_id': target.id,
+        'title': target.title,
+        'prescribed_at': (target.prescribed_at.isoformat()
+                          if target.prescribed_at else None)
+    })
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(session):
+    for doctor_id, event_type, payload in session.info.pop('pending_events', ()):
+        event_broker.publish(doctor_id, event_type, payload)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('pending_events', None)
@@ -0,0 +1,66 @@
+import csv
+import io
+import itertools
+import math
+
+# Typed schema of the lab values PredictionService._validate_input checks
+FEATURE_TYPES = {'Gender': int, 'Hemoglobin': float, 'MCH': float, 'MCHC': float,
+                 'MCV': float}
+
+def coerce_features(record):
+    """Typed feature dict from a JSON object or CSV record; returns (features, error)
+
+    Numbers may arrive as JSON numbers or numeric strings. Gender must be 0 or 1
+    (``"1"`` and ``1.0`` are accepted). Fields outside the schema are dropped.
+    """
+    if not isinstance(record, dict):
+        return None, 'Input must be a JSON object of lab values'
+    features = {}
+    for name, cast in FEATURE_TYPES.items():
+        value = record.get(name)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None, f'Missing required feature: {name}'
+        if isinstance(value, bool):
+            return None, f'{name} must be a number'
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None, f'{name} must be a number'
+        if not math.isfinite(number):
+            return None, f'{name} must be a finite number'
+        if cast is int:
+            if number not in (0.0, 1.0):
+                return None, 'Gender must be 0 (female) or 1 (male)'
+            number = int(number)
+        features[name] = number
+    return features, None
+
+def iter_csv_rows(stream, max_rows=None):
+    """Stream rows of a binary CSV upload as ``{'row': i, 'features': ...}`` or
+    ``{'row': i, 'error': ...}``
+
+    Raises ValueError when a required column is missing from the header or
+    the file has more than ``max_rows`` rows.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    missing = [name for name in FEATURE_TYPES if name not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+    for index, record in enumerate(reader):
+        if max_rows is not None and index >= max_rows:
+            raise ValueError(f'CSV is limited to {max_rows} rows')
+        features, error = coerce_features(record)
+        if error:
+            yield {'row': index, 'error': error}
+        else:
+            yield {'row': index, 'features': features}
+
+def read_single_csv_row(stream):
+    """Features of a one-row CSV upload (reads at most two rows); raises
+    ValueError for anything else"""
+    rows = list(itertools.islice(iter_csv_rows(stream), 2))
+    if len(rows) != 1:
+        raise ValueError('CSV must contain exactly one row of data')
+    if 'error' in rows[0]:
+        raise ValueError(rows[0]['error'])
+    return rows[0]['features']
@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+import json
+from flask import request, Response
+from sqlalchemy import select, func
+from config import Config
+from models import db, User, Prediction, Prescription
+
+def make_etag(*parts):
+    """Short hash of validator values (ids, counts, cached payload tags)"""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()[:32]
+
+def prediction_validator(user_id):
+    """Changes whenever a prediction is added, removed or rewritten (re-scored,
+    compacted)"""
+    return tuple(db.session.execute(
+        select(func.max(Prediction.id), func.count(Prediction.id),
+               func.max(Prediction.updated_at))
+        .where(Prediction.user_id == user_id)
+    ).one())
+
+def prescription_validator(patient_id):
+    return tuple(db.session.execute(
+        select(func.max(Prescription.id), func.count(Prescription.id))
+        .where(Prescription.patient_id == patient_id)
+    ).one())
+
+def patient_list_validator():
+    return (
+        tuple(db.session.execute(select(func.max(User.id), func.count(User.id))
+                                 .where(User.role == 'user')).one()),
+        db.session.execute(select(func.max(Prediction.id))).scalar()
+    )
+
+def not_modified(etag):
+    """A bodyless 304 if the client already holds this version, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        return with_etag(response, etag)
+    return None
+
+def with_etag(response, etag):
+    # Weak: the same version may be sent gzip-compressed or not
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+class ResponseCompressor:
+    """gzip large JSON responses for clients that accept it"""
+
+    def __init__(self, min_size=None, level=None):
+        self.min_size = min_size or Config.GZIP_MIN_SIZE
+        self.level = level or Config.GZIP_LEVEL
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or response.is_streamed or response.mimetype != 'application/json'
+                or 'Content-Encoding' in response.headers
+                or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        response.set_data(gzip.compress(data, compresslevel=self.level))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+
+# Global instance
+response_compressor = ResponseCompressor()
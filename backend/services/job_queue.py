@@ -0,0 +1,310 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from config import Config
+from services.prediction_service import prediction_service
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """Durable bulk-prediction queue in a local SQLite file (no external broker).
+
+    A job is split into chunks at submission time. Workers claim one chunk at a
+    time under a lease, write that chunk's results to a JSONL file and only then
+    mark the chunk done, so every finished chunk is a checkpoint. Chunks whose
+    worker died are re-claimed once their lease expires, which lets jobs
+    survive restarts; a chunk whose lease has expired JOB_MAX_ATTEMPTS times is
+    marked failed instead, so a chunk that crashes its worker is not retried
+    forever.
+    """
+
+    def __init__(self, db_path=None, results_dir=None, chunk_size=None):
+        self.db_path = db_path or Config.JOB_QUEUE_PATH
+        self.results_dir = results_dir or Config.JOB_RESULTS_DIR
+        self.chunk_size = chunk_size or Config.JOB_CHUNK_SIZE
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            self._init_db(conn)
+        return conn
+
+    def _init_db(self, conn):
+        os.makedirs(self.results_dir, exist_ok=True)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                source TEXT NOT NULL,
+                submitted_by TEXT,
+                include_explanations INTEGER NOT NULL DEFAULT 0,
+                total_rows INTEGER NOT NULL,
+                total_chunks INTEGER NOT NULL,
+                done_chunks INTEGER NOT NULL DEFAULT 0,
+                failed_chunks INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_chunks (
+                job_id TEXT NOT NULL REFERENCES jobs(id),
+                chunk_index INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_expires REAL,
+                error TEXT,
+                PRIMARY KEY (job_id, chunk_index)
+            );
+            CREATE INDEX IF NOT EXISTS ix_job_chunks_status
+                ON job_chunks (status, lease_expires);
+        ''')
+        self._initialized = True
+
+    def submit(self, rows, source, submitted_by=None, include_explanations=False):
+        """Queue a list of input rows as a new job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        chunks = [rows[i:i + self.chunk_size]
+                  for i in range(0, len(rows), self.chunk_size)]
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('''
+                INSERT INTO jobs (id, status, source, submitted_by,
+                                  include_explanations, total_rows, total_chunks,
+                                  created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, 'queued' if chunks else 'completed', source, submitted_by,
+                  int(include_explanations), len(rows), len(chunks), now, now))
+            conn.executemany(
+                'INSERT INTO job_chunks (job_id, chunk_index, status, payload) '
+                'VALUES (?, ?, ?, ?)',
+                [(job_id, i, 'pending', json.dumps(chunk))
+                 for i, chunk in enumerate(chunks)]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        logger.info(f"Queued job {job_id} with {len(rows)} rows in "
+                    f"{len(chunks)} chunks")
+        return job_id
+
+    def claim(self, lease_seconds=None):
+        """Atomically lease the next runnable chunk; returns None when the queue
+        is empty"""
+        lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            while True:
+                row = conn.execute('''
+                    SELECT c.job_id, c.chunk_index, c.payload, c.status,
+                           c.attempts, j.include_explanations
+                    FROM job_chunks c JOIN jobs j ON j.id = c.job_id
+                    WHERE c.status = 'pending'
+                       OR (c.status = 'running' AND c.lease_expires < ?)
+                    ORDER BY j.created_at, c.chunk_index
+                    LIMIT 1
+                ''', (now,)).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                if row['status'] == 'pending' or \
+                        row['attempts'] < Config.JOB_MAX_ATTEMPTS:
+                    break
+                self._mark_finished(conn, row['job_id'], row['chunk_index'],
+                                    'failed', f"Lease expired after "
+                                    f"{row['attempts']} attempts")
+
+            conn.execute('''
+                UPDATE job_chunks
+                SET status = 'running', lease_expires = ?, attempts = attempts + 1
+                WHERE job_id = ? AND chunk_index = ?
+            ''', (now + lease_seconds, row['job_id'], row['chunk_index']))
+            conn.execute("UPDATE jobs SET status = 'running', updated_at = ? "
+                         "WHERE id = ? AND status = 'queued'",
+                         (datetime.utcnow().isoformat(), row['job_id']))
+            conn.execute('COMMIT')
+            return {
+                'job_id': row['job_id'],
+                'chunk_index': row['chunk_index'],
+                'rows': json.loads(row['payload']),
+                'include_explanations': bool(row['include_explanations'])
+            }
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _chunk_path(self, job_id, chunk_index):
+        return os.path.join(self.results_dir, job_id, f"chunk_{chunk_index:06d}.jsonl")
+
+    def complete(self, job_id, chunk_index, results):
+        """Persist a chunk's results, then checkpoint the chunk as done"""
+        path = self._chunk_path(job_id, chunk_index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        self._finish_chunk(job_id, chunk_index, 'done', None)
+
+    def fail(self, job_id, chunk_index, error):
+        """Release a chunk for retry, or mark it failed after JOB_MAX_ATTEMPTS"""
+        conn = self._connect()
+        try:
+            attempts = conn.execute('SELECT attempts FROM job_chunks '
+                                    'WHERE job_id = ? AND chunk_index = ?',
+                                    (job_id, chunk_index)).fetchone()['attempts']
+        finally:
+            conn.close()
+
+        if attempts >= Config.JOB_MAX_ATTEMPTS:
+            self._finish_chunk(job_id, chunk_index, 'failed', error)
+        else:
+            conn = self._connect()
+            try:
+                conn.execute("UPDATE job_chunks SET status = 'pending', error = ? "
+                             "WHERE job_id = ? AND chunk_index = ?",
+                             (error, job_id, chunk_index))
+            finally:
+                conn.close()
+
+    def _finish_chunk(self, job_id, chunk_index, status, error):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._mark_finished(conn, job_id, chunk_index, status, error)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _mark_finished(self, conn, job_id, chunk_index, status, error):
+        """Finish a running chunk and update its job's counters inside the
+        caller's transaction"""
+        counter = 'done_chunks' if status == 'done' else 'failed_chunks'
+        updated = conn.execute('''
+            UPDATE job_chunks
+            SET status = ?, error = ?, payload = NULL, lease_expires = NULL
+            WHERE job_id = ? AND chunk_index = ? AND status = 'running'
+        ''', (status, error, job_id, chunk_index)).rowcount
+        if updated:
+            conn.execute(f'''
+                UPDATE jobs SET {counter} = {counter} + 1, updated_at = ?,
+                    status = CASE
+                        WHEN done_chunks + failed_chunks + 1 < total_chunks
+                            THEN 'running'
+                        WHEN failed_chunks + ? > 0 THEN 'completed_with_errors'
+                        ELSE 'completed'
+                    END
+                WHERE id = ?
+            ''', (datetime.utcnow().isoformat(), int(status == 'failed'), job_id))
+
+    def get(self, job_id):
+        """Job status and progress, or None if unknown"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['include_explanations'] = bool(job['include_explanations'])
+        finished = job['done_chunks'] + job['failed_chunks']
+        job['progress'] = finished / job['total_chunks'] if job['total_chunks'] else 1.0
+        return job
+
+    def iter_results(self, job_id):
+        """Yield result rows of all finished chunks in input order"""
+        job_dir = os.path.join(self.results_dir, job_id)
+        if not os.path.isdir(job_dir):
+            return
+        for name in sorted(os.listdir(job_dir)):
+            if not name.endswith('.jsonl'):
+                continue
+            with open(os.path.join(job_dir, name)) as f:
+                for line in f:
+                    yield json.loads(line)
+
+def score_chunk(rows, include_explanations):
+    """Score one chunk of job rows through PredictionService"""
+    results = []
+    valid = []
+    for row in rows:
+        result = {'row': row['row'], 'patient_id': row.get('patient_id')}
+        if row.get('error'):
+            result['error'] = row['error']
+        else:
+            try:
+                prediction_service._validate_input(row['features'])
+                valid.append((result, row['features']))
+            except (ValueError, TypeError) as e:
+                result['error'] = str(e)
+        results.append(result)
+
+    if include_explanations:
+        for result, features in valid:
+            prediction = prediction_service.predict(features, track=False)
+            result.update(predicted_label=prediction['predicted_label'],
+                          predicted_proba=prediction['predicted_proba'],
+                          explanations=prediction['explanations'])
+    elif valid:
+        labels, probabilities, version = prediction_service.score_batch(
+            [features for _, features in valid])
+        for (result, _), label, probability in zip(valid, labels, probabilities):
+            result.update(predicted_label=int(label),
+                          predicted_proba=float(probability),
+                          rule_set_version=version)
+
+    return results
+
+def process_next(job_queue):
+    """Claim, score and checkpoint one chunk; returns False when there was no work"""
+    chunk = job_queue.claim()
+    if chunk is None:
+        return False
+    try:
+        results = score_chunk(chunk['rows'], chunk['include_explanations'])
+        job_queue.complete(chunk['job_id'], chunk['chunk_index'], results)
+    except Exception as e:
+        logger.error(f"Chunk {chunk['chunk_index']} of job {chunk['job_id']} "
+                     f"failed: {e}")
+        job_queue.fail(chunk['job_id'], chunk['chunk_index'], str(e))
+    return True
+
+def run_worker(poll_interval=None, stop_event=None):
+    """Worker process loop: keep processing chunks until stopped"""
+    poll_interval = poll_interval or Config.JOB_POLL_INTERVAL
+    job_queue = JobQueue()
+    logger.info(f"Job worker {os.getpid()} started")
+    while stop_event is None or not stop_event.is_set():
+        if not process_next(job_queue):
+            time.sleep(poll_interval)
+
+# Global instance
+job_queue = JobQueue()
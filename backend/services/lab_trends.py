@@ -0,0 +1,230 @@
+import json
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import event, select, insert, update, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from config import Config
+from models import db, Prediction, LabTrend
+from services.prediction_service import HIGH_RISK_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+LAB_FEATURES = ('Hemoglobin', 'MCV', 'MCH', 'MCHC')
+SECONDS_PER_DAY = 86400.0
+
+# Buckets are [first_ts, last_ts, n, mean, min, max] (timestamps in epoch seconds)
+def _new_bucket(ts, value):
+    return [ts, ts, 1, value, value, value]
+
+def _merge(a, b):
+    n = a[2] + b[2]
+    return [a[0], b[1], n, (a[3] * a[2] + b[3] * b[2]) / n,
+            min(a[4], b[4]), max(a[5], b[5])]
+
+def _halve(buckets):
+    return [_merge(*buckets[i:i + 2]) if i + 1 < len(buckets) else buckets[i]
+            for i in range(0, len(buckets), 2)]
+
+def _slope(points):
+    """Least-squares slope of (ts, value) points, in units per day"""
+    if len(points) < 2:
+        return None
+    xs = [ts / SECONDS_PER_DAY for ts, _ in points]
+    ys = [value for _, value in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+def empty_stats():
+    return {name: {'count': 0, 'last': None, 'last_at': None, 'min': None, 'max': None,
+                   'slope_per_day': None, 'window': [], 'bucket_size': 1, 'buckets': []}
+            for name in LAB_FEATURES}
+
+def fold(stats, features, ts, window=None, capacity=None):
+    """Add one prediction's lab values at ``ts`` to the running stats, in place.
+
+    Work and state per feature are bounded: the slope is refit over the last
+    ``window`` points, and the series keeps at most ``capacity`` buckets; when
+    it fills up, neighbouring buckets are merged pairwise and the bucket size
+    doubles, so older history is kept at a coarser resolution.
+    """
+    window = window or Config.TREND_WINDOW
+    capacity = capacity or Config.TREND_SERIES_POINTS
+    for name in LAB_FEATURES:
+        value = features.get(name)
+        if value is None:
+            continue
+        value = float(value)
+        state = stats[name]
+        state['count'] += 1
+        state['last'], state['last_at'] = value, ts
+        state['min'] = value if state['min'] is None else min(state['min'], value)
+        state['max'] = value if state['max'] is None else max(state['max'], value)
+
+        state['window'] = (state['window'] + [[ts, value]])[-window:]
+        state['slope_per_day'] = _slope(sorted(state['window']))
+
+        buckets = state['buckets']
+        if buckets and buckets[-1][2] < state['bucket_size']:
+            buckets[-1] = _merge(buckets[-1], _new_bucket(ts, value))
+        else:
+            buckets.append(_new_bucket(ts, value))
+        if len(buckets) > capacity:
+            state['buckets'] = _halve(buckets)
+            state['bucket_size'] *= 2
+    return stats
+
+def _timestamp(created_at):
+    return (created_at or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp()
+
+def _isoformat(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+def _ensure_row(connection, user_id):
+    """Create an empty trend row, tolerating a concurrent insert of the same row"""
+    values = {'user_id': user_id, 'prediction_count': 0, 'high_risk_count': 0,
+              'stats': json.dumps(empty_stats())}
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        module = sqlite if dialect == 'sqlite' else postgresql
+        connection.execute(module.insert(LabTrend.__table__).values(**values)
+                           .on_conflict_do_nothing())
+    else:
+        connection.execute(insert(LabTrend.__table__).values(**values))
+
+@event.listens_for(Prediction, 'after_insert')
+def _fold_prediction(mapper, connection, target):
+    table = LabTrend.__table__
+    query = select(table).where(table.c.user_id == target.user_id).with_for_update()
+    row = connection.execute(query).first()
+    if row is None:
+        _ensure_row(connection, target.user_id)
+        row = connection.execute(query).first()
+
+    stats = fold(json.loads(row.stats), json.loads(target.input_features),
+                 _timestamp(target.created_at))
+    last_at = row.last_prediction_at
+    if target.created_at and (last_at is None or target.created_at > last_at):
+        last_at = target.created_at
+    high_risk = int(target.predicted_proba > HIGH_RISK_THRESHOLD)
+    connection.execute(update(table).where(table.c.user_id == target.user_id).values(
+        prediction_count=row.prediction_count + 1,
+        high_risk_count=row.high_risk_count + high_risk,
+        last_prediction_id=max(row.last_prediction_id or 0, target.id),
+        last_prediction_at=last_at,
+        stats=json.dumps(stats),
+        updated_at=datetime.utcnow()
+    ))
+
+def rebuild_lab_trends(user_ids=None, users_per_batch=500, progress=None):
+    """Recompute trend rows from stored predictions, a batch of patients per
+    transaction.
+
+    For databases predating lab_trends and for bulk inserts that bypass the
+    mapper event. Predictions are folded in created_at order.
+    """
+    if user_ids is None:
+        user_ids = db.session.execute(
+            select(Prediction.user_id).distinct().order_by(Prediction.user_id)
+        ).scalars().all()
+    user_ids = list(user_ids)
+    rebuilt = 0
+
+    for start in range(0, len(user_ids), users_per_batch):
+        batch = user_ids[start:start + users_per_batch]
+        trends = {}
+        rows = db.session.execute(
+            select(Prediction.id, Prediction.user_id, Prediction.input_features,
+                   Prediction.predicted_proba, Prediction.created_at)
+            .where(Prediction.user_id.in_(batch))
+            .order_by(Prediction.user_id, Prediction.created_at, Prediction.id)
+        )
+        for prediction_id, user_id, input_features, probability, created_at in rows:
+            trend = trends.setdefault(user_id, {
+                'user_id': user_id, 'prediction_count': 0, 'high_risk_count': 0,
+                'last_prediction_id': None, 'last_prediction_at': None,
+                'stats': empty_stats()
+            })
+            try:
+                fold(trend['stats'], json.loads(input_features), _timestamp(created_at))
+            except ValueError:
+                logger.warning("Skipping prediction %s with unreadable input features",
+                               prediction_id)
+                continue
+            trend['prediction_count'] += 1
+            trend['high_risk_count'] += int(probability > HIGH_RISK_THRESHOLD)
+            trend['last_prediction_id'] = max(trend['last_prediction_id'] or 0,
+                                              prediction_id)
+            trend['last_prediction_at'] = created_at
+
+        db.session.execute(delete(LabTrend).where(LabTrend.user_id.in_(batch)))
+        if trends:
+            now = datetime.utcnow()
+            db.session.execute(insert(LabTrend), [
+                dict(trend, stats=json.dumps(trend['stats']), updated_at=now)
+                for trend in trends.values()
+            ])
+        db.session.commit()
+
+        rebuilt += len(trends)
+        if progress:
+            progress(min(start + users_per_batch, len(user_ids)), rebuilt)
+
+    return {'patients': rebuilt}
+
+def refresh_high_risk_counts():
+    """Recount high-risk results in SQL after predictions were re-scored"""
+    count = select(func.count()) \
+        .where(Prediction.user_id == LabTrend.user_id) \
+        .where(Prediction.predicted_proba > HIGH_RISK_THRESHOLD) \
+        .scalar_subquery()
+    db.session.execute(update(LabTrend).values(high_risk_count=count),
+                       execution_options={'synchronize_session': False})
+    db.session.commit()
+
+def _downsample(buckets, points):
+    while points and len(buckets) > points:
+        buckets = _halve(buckets)
+    return buckets
+
+def trend_summary(user_id, points=None):
+    """Summary stats and downsampled series for a patient, read from one row.
+
+    ``points`` merges the stored buckets further (it cannot add resolution).
+    """
+    trend = db.session.get(LabTrend, user_id)
+    stats = trend.get_stats() if trend else empty_stats()
+    features = {}
+    for name in LAB_FEATURES:
+        state = stats[name]
+        buckets = _downsample(state['buckets'], points)
+        features[name] = {
+            'count': state['count'],
+            'last': state['last'],
+            'last_at': _isoformat(state['last_at']),
+            'min': state['min'],
+            'max': state['max'],
+            'slope_per_day': state['slope_per_day'],
+            'series': [{
+                'start': _isoformat(first),
+                'end': _isoformat(last),
+                'n': n,
+                'mean': round(mean, 3),
+                'min': low,
+                'max': high
+            } for first, last, n, mean, low, high in buckets]
+        }
+    return {
+        'patient_id': user_id,
+        'prediction_count': trend.prediction_count if trend else 0,
+        'high_risk_count': trend.high_risk_count if trend else 0,
+        'last_prediction_at': (trend.last_prediction_at.isoformat()
+                               if trend and trend.last_prediction_at else None),
+        'window': Config.TREND_WINDOW,
+        'features': features
+    }
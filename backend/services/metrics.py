@@ -0,0 +1,217 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from services.worker_state import WorkerStateStore, instance_pid
+from services.tracing import tracer
+
+# Upper bounds in seconds (Prometheus "le" buckets); +Inf is implied
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'taps_stage_duration_seconds': 'Latency of prediction pipeline stages',
+    'taps_stage_errors_total': 'Prediction pipeline stages that raised',
+    'taps_predictions_total': 'Predictions served, by scorer and degradation',
+    'taps_admission_admitted_total': 'Calls admitted per admission stage',
+    'taps_admission_shed_total': 'Calls shed per admission stage',
+    'taps_admission_queue_depth': 'Callers currently waiting per admission stage',
+    'taps_admission_in_flight': 'Calls currently running per admission stage'
+}
+
+def _empty_histogram():
+    return {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+
+def _key(name, labels):
+    return name + ''.join(f'|{k}={v}' for k, v in sorted(labels.items()))
+
+def _parse_key(key):
+    name, *pairs = key.split('|')
+    return name, dict(pair.split('=', 1) for pair in pairs)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+class Metrics:
+    """Per-worker latency histograms and counters, merged across workers on scrape.
+
+    Recording is a dict update under a lock. Each worker periodically writes its
+    totals to a WorkerStateStore snapshot; the worker serving /metrics sums the
+    snapshots of every worker and renders the Prometheus text format. Counters
+    of exited workers are kept until their snapshot is older than ``ttl``, so
+    totals do not drop when a worker is recycled, while files of long-gone
+    workers are pruned.
+    """
+
+    def __init__(self, state_dir=None, flush_interval=None, enabled=None, ttl=None):
+        self.enabled = Config.METRICS_ENABLED if enabled is None else enabled
+        self.flush_interval = (Config.METRICS_FLUSH_INTERVAL if flush_interval is None
+                               else flush_interval)
+        self.store = WorkerStateStore(
+            state_dir or Config.WORKER_STATE_DIR, 'metrics',
+            ttl=Config.METRICS_STATE_TTL if ttl is None else ttl)
+        self.lock = threading.Lock()
+        self._collectors = []
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self._last_flush = time.monotonic()
+            self._dirty = False
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _empty_histogram()
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            should_flush = self._mark_dirty()
+        if should_flush:
+            self.flush()
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            should_flush = self._mark_dirty()
+        if should_flush:
+            self.flush()
+
+    def _mark_dirty(self):
+        self._dirty = True
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    @contextmanager
+    def timer(self, stage):
+        """Time a block as one observation of taps_stage_duration_seconds{stage=...}
+
+        The block is also recorded as a span when the request is being traced.
+        """
+        started = time.perf_counter()
+        try:
+            with tracer.span(stage):
+                yield
+        except Exception:
+            self.inc('taps_stage_errors_total', stage=stage)
+            raise
+        finally:
+            self.observe('taps_stage_duration_seconds', time.perf_counter() - started,
+                         stage=stage)
+
+    def timed(self, stage):
+        """Decorator form of timer()"""
+        def decorator(f):
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return f(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_collector(self, collector):
+        """Register a callable sampled at flush time.
+
+        It returns ``{'counters': [...], 'gauges': [...]}`` lists of (name, labels,
+        value) samples, for components that already keep their own totals.
+        """
+        self._collectors.append(collector)
+
+    def flush(self):
+        """Write this worker's totals so the scraping worker can merge them"""
+        collected_counters, gauges = {}, {}
+        for collector in self._collectors:
+            samples = collector()
+            for name, labels, value in samples.get('counters', ()):
+                collected_counters[_key(name, labels)] = value
+            for name, labels, value in samples.get('gauges', ()):
+                gauges[_key(name, labels)] = value
+        with self.lock:
+            state = {
+                'histograms': {key: dict(h, buckets=list(h['buckets']))
+                               for key, h in self.histograms.items()},
+                'counters': dict(self.counters, **collected_counters),
+                'gauges': gauges
+            }
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        self.store.save(state)
+
+    def merged(self):
+        """Sum every worker's snapshot (gauges only from workers that are still
+        running)"""
+        self.flush()
+        histograms, counters, gauges = {}, {}, {}
+        for instance, state in self.store.load_all().items():
+            for key, h in state.get('histograms', {}).items():
+                merged = histograms.setdefault(key, _empty_histogram())
+                merged['buckets'] = [a + b for a, b in
+                                     zip(merged['buckets'], h['buckets'])]
+                merged['sum'] += h['sum']
+                merged['count'] += h['count']
+            for key, value in state.get('counters', {}).items():
+                counters[key] = counters.get(key, 0) + value
+            if _pid_alive(instance_pid(instance)):
+                for key, value in state.get('gauges', {}).items():
+                    gauges[key] = gauges.get(key, 0) + value
+        return histograms, counters, gauges
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        histograms, counters, gauges = self.merged()
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append(f'# HELP {name} {HELP[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for key in sorted(histograms):
+            name, labels = _parse_key(key)
+            h = histograms[key]
+            describe(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, h['buckets']):
+                cumulative += count
+                bucket_labels = _format_labels(dict(labels, le=repr(bound)))
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            bucket_labels = _format_labels(dict(labels, le="+Inf"))
+            lines.append(f'{name}_bucket{bucket_labels} {h["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {h["sum"]:.6f}')
+            lines.append(f'{name}_count{_format_labels(labels)} {h["count"]}')
+
+        for kind, values in (('counter', counters), ('gauge', gauges)):
+            for key in sorted(values):
+                name, labels = _parse_key(key)
+                describe(name, kind)
+                lines.append(f'{name}{_format_labels(labels)} {values[key]}')
+
+        return '\n'.join(lines) + '\n'
+
+def _pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except (OSError, ValueError):
+        return False
+
+# Global instance
+metrics = Metrics()
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from config import Config
+
+try:
+    from tensorflow import keras
+    TF_AVAILABLE = True
+except ImportError:
+    keras = None
+    TF_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Immutable snapshot of the serving model; swapped with a single reference assignment
+ActiveModel = namedtuple('ActiveModel', ['version', 'model', 'sha256', 'path'])
+
+def file_sha256(path):
+    """Hex SHA-256 checksum of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelRegistry:
+    """Versioned Keras models on local disk with background loading and atomic swaps.
+
+    The registry directory holds one file per version plus ``manifest.json``
+    recording each version's checksum and the active version. Every worker
+    polls the manifest; when the active version changes it loads and warms up
+    the new model in a background thread and then swaps it in. Requests that
+    already read ``current()`` keep using the old model until they finish.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory=None, poll_interval=None):
+        self.directory = directory or Config.MODEL_REGISTRY_DIR
+        self.poll_interval = (Config.MODEL_REGISTRY_POLL_INTERVAL
+                              if poll_interval is None else poll_interval)
+        self._active = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._failed_version = None
+        self._initial_load_done = threading.Event()
+
+    # Manifest handling
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, self.MANIFEST)
+
+    def read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'active': None, 'versions': {}}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._manifest_path()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def register(self, source_path, version, activate=False):
+        """Copy a model file into the registry under a new version"""
+        with self._lock:
+            manifest = self.read_manifest()
+            if version in manifest['versions']:
+                raise ValueError(f"Model version already registered: {version}")
+
+            os.makedirs(self.directory, exist_ok=True)
+            file_name = f"{version}{os.path.splitext(source_path)[1]}"
+            shutil.copyfile(source_path, os.path.join(self.directory, file_name))
+            manifest['versions'][version] = {
+                'file': file_name,
+                'sha256': file_sha256(os.path.join(self.directory, file_name)),
+                'registered_at': datetime.utcnow().isoformat()
+            }
+            if activate:
+                manifest['active'] = version
+            self._write_manifest(manifest)
+            logger.info(f"Registered model version {version}")
+            return manifest['versions'][version]
+
+    def activate(self, version):
+        """Mark a registered version active; every worker switches on its next poll"""
+        with self._lock:
+            manifest = self.read_manifest()
+            if version not in manifest['versions']:
+                raise ValueError(f"Unknown model version: {version}")
+            manifest['active'] = version
+            self._write_manifest(manifest)
+
+    # Loading and swapping
+
+    def _load_and_warm(self, path):
+        model = keras.models.load_model(path)
+        # First predict traces the graph; do it here rather than on a live request
+        model.predict(np.zeros((1, 5), dtype=np.float32), verbose=0)
+        return model
+
+    def load_version(self, version):
+        """Load a registered version (checksum verified), warm it up and swap it in"""
+        if not TF_AVAILABLE:
+            raise RuntimeError("TensorFlow not available")
+
+        entry = self.read_manifest()['versions'].get(version)
+        if entry is None:
+            raise ValueError(f"Unknown model version: {version}")
+
+        path = os.path.join(self.directory, entry['file'])
+        checksum = file_sha256(path)
+        if checksum != entry['sha256']:
+            raise ValueError(f"Checksum mismatch for model version {version}")
+
+        self._swap(ActiveModel(version, self._load_and_warm(path), checksum, path))
+
+    def load_file(self, path):
+        """Load an unregistered model file directly (the legacy MODEL_PATH setting)"""
+        if not TF_AVAILABLE:
+            raise RuntimeError("TensorFlow not available")
+        checksum = file_sha256(path)
+        self._swap(ActiveModel(f"file-{checksum[:12]}", self._load_and_warm(path),
+                               checksum, path))
+
+    def _swap(self, active):
+        self._active = active
+        logger.info(f"Serving model version {active.version}")
+        for listener in self._listeners:
+            try:
+                listener(active)
+            except Exception as e:
+                logger.warning(f"Model swap listener failed: {e}")
+
+    def current(self):
+        """The active model snapshot, or None when no model is loaded"""
+        return self._active
+
+    def add_listener(self, callback):
+        """Call ``callback(active_model)`` after every swap"""
+        self._listeners.append(callback)
+
+    # Background watcher
+
+    def start(self, fallback_path=None):
+        """Load the active version in the background and keep following the manifest"""
+        if not TF_AVAILABLE:
+            logger.info("TensorFlow not available - model registry disabled")
+            self._initial_load_done.set()
+            return
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(fallback_path,),
+                                         name='model-registry', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def wait_until_loaded(self, timeout=None):
+        """Block until the first load attempt after start() has finished"""
+        return self._initial_load_done.wait(timeout)
+
+    def _watch(self, fallback_path):
+        if (not self.read_manifest().get('active') and fallback_path
+                and os.path.exists(fallback_path)):
+            try:
+                self.load_file(fallback_path)
+            except Exception as e:
+                logger.error(f"Error loading model from {fallback_path}: {e}")
+
+        while not self._stop.is_set():
+            active_version = self.read_manifest().get('active')
+            current = self._active
+            if active_version and active_version != self._failed_version and \
+                    (current is None or current.version != active_version):
+                try:
+                    self.load_version(active_version)
+                except Exception as e:
+                    # Keep serving the previous model until a different version is
+                    # activated
+                    self._failed_version = active_version
+                    logger.error(f"Error loading model version {active_version}: {e}")
+            self._initial_load_done.set()
+            self._stop.wait(self.poll_interval)
+
+# Global instance
+model_registry = ModelRegistry()
@@ -0,0 +1,149 @@
+import csv
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import select
+from config import Config
+from models import db, bcrypt, User
+from routes.auth import generate_password
+
+logger = logging.getLogger(__name__)
+
+CSV_FIELDS = ['patient_name', 'patient_email', 'dob', 'gender', 'password']
+
+def hash_password(password):
+    """bcrypt hash in the same format as User.set_password (runs in pool processes)"""
+    return bcrypt.generate_password_hash(password).decode('utf-8')
+
+_hash_pool = None
+_hash_pool_pid = None
+_hash_pool_lock = threading.Lock()
+
+def _shared_hash_pool():
+    """Per-worker thread pool for request-time hashing, created once (bcrypt
+    releases the GIL)"""
+    global _hash_pool, _hash_pool_pid
+    with _hash_pool_lock:
+        if _hash_pool is None or _hash_pool_pid != os.getpid():
+            _hash_pool = ThreadPoolExecutor(
+                max_workers=Config.BULK_ONBOARDING_HASH_THREADS,
+                thread_name_prefix='password-hash')
+            _hash_pool_pid = os.getpid()
+        return _hash_pool
+
+def read_patient_csv(stream):
+    """Read patient rows from a binary CSV stream"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    return [{field: (record.get(field) or '').strip() for field in CSV_FIELDS}
+            for record in reader]
+
+def validate_patients(records):
+    """Validate every row up front; returns (valid rows, per-row report entries)"""
+    report = []
+    valid = []
+    seen = set()
+
+    emails = {r['patient_email'].lower() for r in records if r['patient_email']}
+    existing = set()
+    email_list = list(emails)
+    for i in range(0, len(email_list), 10000):
+        existing.update(db.session.execute(
+            select(User.email).where(User.email.in_(email_list[i:i + 10000]))
+        ).scalars())
+
+    for index, record in enumerate(records):
+        email = record['patient_email'].lower()
+        errors = []
+        if not record['patient_name']:
+            errors.append('patient_name is required')
+        if not email:
+            errors.append('patient_email is required')
+        elif '@' not in email:
+            errors.append('Invalid email address')
+        elif email in existing:
+            errors.append('Email already registered')
+        elif email in seen:
+            errors.append('Duplicate email in file')
+
+        dob = None
+        if record['dob']:
+            try:
+                dob = datetime.strptime(record['dob'], '%Y-%m-%d').date()
+            except ValueError:
+                errors.append('Invalid date format. Use YYYY-MM-DD')
+
+        gender = None
+        if record['gender']:
+            if record['gender'] not in ('0', '1'):
+                errors.append('gender must be 0 (female) or 1 (male)')
+            else:
+                gender = int(record['gender'])
+
+        entry = {'row': index, 'email': email,
+                 'status': 'error' if errors else 'pending', 'errors': errors}
+        report.append(entry)
+        if not errors:
+            seen.add(email)
+            valid.append((entry, {
+                'name': record['patient_name'],
+                'email': email,
+                'date_of_birth': dob,
+                'gender': gender,
+                'password': record['password'] or generate_password()
+            }))
+
+    return valid, report
+
+def onboard_patients(records, doctor_id, workers=None, batch_size=None,
+                     processes=False):
+    """Validate, hash in parallel and insert patients in batched transactions
+
+    ``processes`` hashes in a fresh process pool of ``workers`` processes, for
+    the offline CLI only: web workers share one small thread pool instead of
+    forking a threaded process per request.
+    """
+    batch_size = batch_size or Config.BULK_ONBOARDING_BATCH_SIZE
+    valid, report = validate_patients(records)
+
+    passwords = [patient['password'] for _, patient in valid]
+    if len(passwords) >= Config.BULK_ONBOARDING_POOL_THRESHOLD and processes:
+        # bcrypt is deliberately CPU-bound, so spread it across processes
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(hash_password, passwords, chunksize=16))
+    elif len(passwords) >= Config.BULK_ONBOARDING_POOL_THRESHOLD:
+        hashes = list(_shared_hash_pool().map(hash_password, passwords))
+    else:
+        hashes = [hash_password(p) for p in passwords]
+
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        users = [
+            User(name=patient['name'], email=patient['email'], role='user',
+                 doctor_id=doctor_id, date_of_birth=patient['date_of_birth'],
+                 gender=patient['gender'], password_hash=password_hash)
+            for (_, patient), password_hash in zip(batch,
+                                                   hashes[start:start + batch_size])
+        ]
+        try:
+            db.session.add_all(users)
+            db.session.commit()
+            for (entry, patient), user in zip(batch, users):
+                entry.update(status='created', patient_id=user.id,
+                             temporary_password=patient['password'])
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Bulk onboarding batch starting at row {batch[0][0]['row']} "
+                         f"failed: {e}")
+            for entry, _ in batch:
+                entry.update(status='error', errors=[f'Insert failed: {e}'])
+
+    created = sum(1 for entry in report if entry['status'] == 'created')
+    return {
+        'total': len(report),
+        'created': created,
+        'failed': len(report) - created,
+        'results': report
+    }
@@ -0,0 +1,185 @@
+import logging
+from datetime import date
+from sqlalchemy import DDL, event, select, update, func, case, or_, and_, text
+from models import db, User, Prediction
+from services.prediction_service import (risk_level, HIGH_RISK_THRESHOLD,
+                                         MODERATE_RISK_THRESHOLD)
+
+logger = logging.getLogger(__name__)
+
+RISK_LEVELS = ('low', 'moderate', 'high')
+MAX_PER_PAGE = 100
+
+# SQLite: external-content FTS5 table over patients' names and emails. The trigram
+# tokenizer matches any substring of three or more characters, case-insensitively.
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+    "name, email, content='users', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_ai AFTER INSERT ON users "
+    "WHEN new.role = 'user' BEGIN "
+    "INSERT INTO patient_search(rowid, name, email) "
+    "VALUES (new.id, new.name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_ad AFTER DELETE ON users "
+    "WHEN old.role = 'user' BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, name, email) "
+    "VALUES ('delete', old.id, old.name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS patient_search_au "
+    "AFTER UPDATE OF name, email, role ON users BEGIN "
+    "INSERT INTO patient_search(patient_search, rowid, name, email) "
+    "SELECT 'delete', old.id, old.name, old.email WHERE old.role = 'user'; "
+    "INSERT INTO patient_search(rowid, name, email) "
+    "SELECT new.id, new.name, new.email WHERE new.role = 'user'; END",
+    "INSERT INTO patient_search(rowid, name, email) "
+    "SELECT id, name, email FROM users WHERE role = 'user'"
+]
+
+# Postgres: pg_trgm GIN indexes serve LIKE '%...%' on the lower-cased columns
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm "
+    "ON users USING gin (lower(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm "
+    "ON users USING gin (lower(email) gin_trgm_ops)"
+]
+
+# Build the search index alongside db.create_all() (migration 005 does the same
+# for existing databases)
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(User.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(User.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+# Dropping users removes the triggers but not the virtual table, whose rowids
+# would then be stale
+event.listen(User.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS patient_search').execute_if(dialect='sqlite'))
+
+def _risk_case(probability):
+    return case((probability > HIGH_RISK_THRESHOLD, 'high'),
+                (probability > MODERATE_RISK_THRESHOLD, 'moderate'), else_='low')
+
+@event.listens_for(Prediction, 'after_insert')
+def _track_latest_risk(mapper, connection, target):
+    # Group commits may insert out of id order, so only move forward
+    connection.execute(
+        update(User)
+        .where(User.id == target.user_id)
+        .where(or_(User.latest_prediction_id.is_(None),
+                   User.latest_prediction_id < target.id))
+        .values(latest_prediction_id=target.id,
+                latest_risk_level=risk_level(target.predicted_proba))
+    )
+
+def refresh_latest_risk(user_ids=None):
+    """Recompute latest_prediction_id/latest_risk_level in SQL (after bulk inserts or
+    re-scoring)"""
+    latest_id = select(func.max(Prediction.id)).where(Prediction.user_id == User.id) \
+                                               .scalar_subquery()
+    latest_risk = select(_risk_case(Prediction.predicted_proba)) \
+        .where(Prediction.id == User.latest_prediction_id).scalar_subquery()
+    condition = User.role == 'user'
+    if user_ids is not None:
+        condition = and_(condition, User.id.in_(user_ids))
+    db.session.execute(update(User).where(condition)
+                       .values(latest_prediction_id=latest_id),
+                       execution_options={'synchronize_session': False})
+    db.session.execute(update(User).where(condition)
+                       .values(latest_risk_level=latest_risk),
+                       execution_options={'synchronize_session': False})
+    db.session.commit()
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _sqlite_fts_available():
+    return db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patient_search'"
+    )).first() is not None
+
+def _text_condition(query):
+    """Name/email substring condition, served by the dialect's index where the query
+    allows it"""
+    dialect = db.engine.dialect.name
+    lowered = query.lower()
+    if dialect == 'sqlite' and len(query) >= 3 and _sqlite_fts_available():
+        phrase = '"' + query.replace('"', '""') + '"'
+        match = text('patient_search MATCH :phrase').bindparams(phrase=phrase)
+        return User.id.in_(select(text('rowid')).select_from(text('patient_search'))
+                           .where(match))
+    # Shorter queries (and other databases) fall back to LIKE; on Postgres the
+    # trigram indexes serve it
+    pattern = f'%{_escape_like(lowered)}%'
+    return or_(func.lower(User.name).like(pattern, escape='\\'),
+               func.lower(User.email).like(pattern, escape='\\'))
+
+def _years_ago(today, years):
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:  # 29 February
+        return today.replace(year=today.year - years, day=28)
+
+def search_patients(query=None, gender=None, age_min=None, age_max=None, risk=None,
+                    doctor_id=None, page=1, per_page=25):
+    """One page of patients matching a name/email search and filters.
+
+    Prefix matches on name or email rank before other substring matches. Age
+    bands are turned into a date_of_birth range and the risk filter reads the
+    latest_risk_level kept current on each prediction, so every filter is an
+    indexed condition on users.
+    """
+    conditions = [User.role == 'user']
+    query = (query or '').strip()
+    if query:
+        conditions.append(_text_condition(query))
+    if gender is not None:
+        conditions.append(User.gender == gender)
+    today = date.today()
+    if age_min is not None:
+        conditions.append(User.date_of_birth <= _years_ago(today, age_min))
+    if age_max is not None:
+        conditions.append(User.date_of_birth > _years_ago(today, age_max + 1))
+    if risk:
+        conditions.append(User.latest_risk_level.in_(risk))
+    if doctor_id is not None:
+        conditions.append(User.doctor_id == doctor_id)
+
+    total = db.session.execute(
+        select(func.count()).select_from(User).where(*conditions)).scalar()
+
+    order = [User.name, User.id]
+    if query:
+        prefix = f'{_escape_like(query.lower())}%'
+        starts = or_(func.lower(User.name).like(prefix, escape='\\'),
+                     func.lower(User.email).like(prefix, escape='\\'))
+        order.insert(0, case((starts, 0), else_=1))
+    patients = db.session.execute(
+        select(User).where(*conditions).order_by(*order)
+        .limit(per_page).offset((page - 1) * per_page)
+    ).scalars().all()
+
+    counts = dict(db.session.execute(
+        select(Prediction.user_id, func.count())
+        .where(Prediction.user_id.in_([p.id for p in patients]))
+        .group_by(Prediction.user_id)
+    ).all()) if patients else {}
+
+    results = []
+    for patient in patients:
+        patient_dict = patient.to_dict()
+        patient_dict.update(
+            gender=patient.gender,
+            date_of_birth=(patient.date_of_birth.isoformat()
+                           if patient.date_of_birth else None),
+            latest_risk_level=patient.latest_risk_level,
+            prediction_count=counts.get(patient.id, 0)
+        )
+        results.append(patient_dict)
+
+    return {
+        'patients': results,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page
+    }
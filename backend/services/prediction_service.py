@@ -1,10 +1,15 @@
 import numpy as np
-import pandas as pd
 import logging
 import os
-import base64
-import io
+import time
 from config import Config
+from services.drift_monitor import drift_monitor
+from services.rule_sets import rule_set_registry, features_to_matrix
+from services.shadow_scoring import shadow_scorer
+from services.model_registry import model_registry
+from services.admission import admission
+from services.render_pool import render_pool
+from services.metrics import metrics
 
 # Try to import TensorFlow with graceful fallback
 try:
@@ -40,30 +45,48 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# Probability bands of the clinical risk levels
+HIGH_RISK_THRESHOLD = 0.7
+MODERATE_RISK_THRESHOLD = 0.3
+
+def risk_level(probability):
+    if probability > HIGH_RISK_THRESHOLD:
+        return "high"
+    return "moderate" if probability > MODERATE_RISK_THRESHOLD else "low"
+
 class PredictionService:
     def __init__(self):
-        self.model = None
         self.explainer = None
         self.lime_explainer = None
         self.feature_names = ['Gender', 'Hemoglobin', 'MCH', 'MCHC', 'MCV']
-        self.model_loaded = False
         self.latest_prediction = None
         self.latest_explanation = None
 
+        # Whichever model the registry swaps in becomes the shadow scorer's secondary
+        model_registry.add_listener(
+            lambda active: shadow_scorer.set_secondary(self.model_predict_batch,
+                                                       active.version))
+
+    @property
+    def model(self):
+        active = model_registry.current()
+        return active.model if active else None
+
+    @property
+    def model_loaded(self):
+        return model_registry.current() is not None
+
     def load_model(self, model_path):
         """Load the Keras model and initialize explainers"""
         if not TF_AVAILABLE:
             logger.warning("TensorFlow not available - using fallback prediction")
-            self.model_loaded = False
             return
 
         try:
-            self.model = keras.models.load_model(model_path)
+            model_registry.load_file(model_path)
             logger.info(f"Model loaded successfully from {model_path}")
-            self.model_loaded = True
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
-            self.model_loaded = False
 
     def _validate_input(self, features):
         """Validate input features"""
@@ -89,115 +112,153 @@ class PredictionService:
         if not (50.0 <= features['MCV'] <= 130.0):
             raise ValueError("MCV must be between 50.0 and 130.0 fL")
 
-    def predict(self, features):
-        """Make prediction with comprehensive XAI explanations"""
-        # Validate input
-        self._validate_input(features)
+    def predict(self, features, track=True, render=True):
+        """Make prediction with comprehensive XAI explanations
 
-        # Use enhanced fallback prediction with XAI explanations
-        logger.info("Using enhanced rule-based prediction with XAI")
-        return self._fallback_prediction(features)
+        ``track=False`` skips drift and shadow bookkeeping (used for synthetic
+        warm-up traffic).
+        ``render=False`` skips chart rendering and flags the result as degraded
+        (used when shedding load).
+        """
+        with metrics.timer('predict'):
+            result = self._predict(features, track, render)
+        metrics.inc('taps_predictions_total', model_used=result['model_used'],
+                    degraded=str(bool(result.get('degraded'))).lower())
+        return result
 
-    def _fallback_prediction(self, features):
-        """Enhanced fallback prediction when ML model is unavailable"""
-        hemoglobin = features['Hemoglobin']
-        mcv = features['MCV']
-        mch = features['MCH']
-        mchc = features['MCHC']
-        gender = features['Gender']
-
-        # Enhanced anemia assessment using clinical guidelines
-        hb_threshold = 12.0 if gender == 0 else 13.0
-
-        # Initialize risk factors
-        risk_factors = []
-        risk_score = 0.0
-
-        # Hemoglobin assessment (primary indicator)
-        if hemoglobin < hb_threshold:
-            hb_deficit = hb_threshold - hemoglobin
-            if hb_deficit >= 3:
-                risk_score += 0.8  # Severe anemia
-                risk_factors.append({'feature': 'Hemoglobin', 'value': hemoglobin, 'contribution': 0.8})
-            elif hb_deficit >= 1.5:
-                risk_score += 0.6  # Moderate anemia
-                risk_factors.append({'feature': 'Hemoglobin', 'value': hemoglobin, 'contribution': 0.6})
-            else:
-                risk_score += 0.4  # Mild anemia
-                risk_factors.append({'feature': 'Hemoglobin', 'value': hemoglobin, 'contribution': 0.4})
-        else:
-            risk_factors.append({'feature': 'Hemoglobin', 'value': hemoglobin, 'contribution': -0.3})
-
-        # MCV assessment (cell size - indicates anemia type)
-        if mcv < 80:  # Microcytic
-            risk_score += 0.25
-            risk_factors.append({'feature': 'MCV', 'value': mcv, 'contribution': 0.25})
-        elif mcv > 100:  # Macrocytic
-            risk_score += 0.20
-            risk_factors.append({'feature': 'MCV', 'value': mcv, 'contribution': 0.20})
-        else:
-            risk_factors.append({'feature': 'MCV', 'value': mcv, 'contribution': -0.1})
-
-        # MCH assessment
-        if mch < 27:
-            risk_score += 0.15
-            risk_factors.append({'feature': 'MCH', 'value': mch, 'contribution': 0.15})
-        elif mch > 32:
-            risk_score += 0.10
-            risk_factors.append({'feature': 'MCH', 'value': mch, 'contribution': 0.10})
-        else:
-            risk_factors.append({'feature': 'MCH', 'value': mch, 'contribution': -0.05})
-
-        # MCHC assessment
-        if mchc < 32:
-            risk_score += 0.12
-            risk_factors.append({'feature': 'MCHC', 'value': mchc, 'contribution': 0.12})
-        elif mchc > 36:
-            risk_score += 0.08
-            risk_factors.append({'feature': 'MCHC', 'value': mchc, 'contribution': 0.08})
-        else:
-            risk_factors.append({'feature': 'MCHC', 'value': mchc, 'contribution': -0.02})
+    def _predict(self, features, track, render):
+        # Validate input
+        with metrics.timer('validate'):
+            self._validate_input(features)
 
-        # Gender factor
-        if gender == 0:  # Female - higher anemia risk
-            risk_score += 0.05
-            risk_factors.append({'feature': 'Gender', 'value': gender, 'contribution': 0.05})
-        else:
-            risk_factors.append({'feature': 'Gender', 'value': gender, 'contribution': -0.02})
+        # Feed the streaming drift sketches
+        if track:
+            with metrics.timer('drift_update'):
+                drift_monitor.update(features)
 
-        # Calculate final probability (ensure it's meaningful)
-        probability = max(0.05, min(0.95, risk_score))
-        predicted_label = 1 if probability > 0.5 else 0
+        # Use the registry's Keras model once it is promoted to primary scorer
+        active = model_registry.current()
+        if Config.PRIMARY_SCORER == 'model' and active is not None:
+            return self._model_prediction(features, active, render)
+
+        # Use enhanced fallback prediction with XAI explanations
+        logger.debug("Using enhanced rule-based prediction with XAI")
+        started = time.perf_counter()
+        result = self._fallback_prediction(features, render)
+
+        # Score the Keras model in the background for agreement statistics
+        if track:
+            shadow_scorer.submit(features, result,
+                                 (time.perf_counter() - started) * 1000.0)
+        return result
+
+    def _model_prediction(self, features, active, render=True):
+        """Score with a registry model snapshot, explained by the rule-based
+        contributions"""
+        with metrics.timer('model_score'):
+            probability = float(self.model_predict_batch([features], active)[0])
+        result = self._fallback_prediction(features, render)
+        result['predicted_label'] = 1 if probability > 0.5 else 0
+        result['predicted_proba'] = probability
+        result['explanations']['shap']['prediction_value'] = probability
+        result['explanations']['clinical_interpretation'] = \
+            self._get_clinical_interpretation(features, probability)
+        result['model_used'] = 'keras'
+        result['model_version'] = active.version
+        # The rule set only supplied the explanation, not the score
+        result['rule_set_version'] = None
+        return result
+
+    def _prepare_model_input(self, feature_rows):
+        """Standardize lab values with the configured means/stds (Gender stays 0/1)"""
+        matrix = features_to_matrix(feature_rows)
+        for column, name in enumerate(self.feature_names):
+            if name in Config.FEATURE_MEANS:
+                matrix[:, column] = ((matrix[:, column] - Config.FEATURE_MEANS[name])
+                                     / Config.FEATURE_STDS[name])
+        return matrix
+
+    def model_predict_batch(self, feature_rows, active=None):
+        """Anemia probabilities from the Keras model for a batch of feature dicts"""
+        # Hold one snapshot for the whole call so a concurrent swap cannot mix versions
+        active = active or model_registry.current()
+        if active is None:
+            raise RuntimeError("No model loaded")
+        matrix = self._prepare_model_input(feature_rows)
+        output = np.asarray(active.model.predict(matrix, verbose=0))
+        # Sigmoid head -> (n, 1); softmax head -> (n, 2) with the anemic class last
+        return output[:, -1] if output.ndim == 2 else output.reshape(-1)
+
+    def _fallback_prediction(self, features, render=True):
+        """Enhanced fallback prediction when ML model is unavailable"""
+        # Thresholds and weights come from the active versioned rule set
+        rule_set = rule_set_registry.active()
+        with metrics.timer('score'):
+            contributions, probability, predicted_label = rule_set.evaluate(features)
+
+        risk_factors = [
+            {'feature': name, 'value': features[name], 'contribution': contribution}
+            for name, contribution in zip(rule_set.factor_names, contributions)
+        ]
+
+        # Charts are the expensive part; skip them when the render stage is saturated
+        visualizations = None
+        if render:
+            with admission.stage('render') as admitted:
+                if admitted:
+                    visualizations = self._generate_fallback_visualizations(
+                        risk_factors, features)
 
         # Generate comprehensive explanations
         explanations = {
             'shap': self._generate_fallback_shap(risk_factors, probability),
             'lime': None,
-            'visualizations': self._generate_fallback_visualizations(risk_factors, features),
-            'clinical_interpretation': self._get_clinical_interpretation(features, probability)
+            'visualizations': visualizations or {},
+            'clinical_interpretation': self._get_clinical_interpretation(features,
+                                                                         probability)
         }
 
-        logger.info(f"Fallback prediction: {predicted_label} with probability {probability:.3f}")
+        logger.debug("Fallback prediction: %s with probability %.3f", predicted_label,
+                     probability)
 
-        return {
+        result = {
             'predicted_label': predicted_label,
             'predicted_proba': float(probability),
             'explanations': explanations,
-            'model_used': 'rule_based_fallback'
+            'model_used': 'rule_based_fallback',
+            'model_version': f"rules-{rule_set.version}",
+            'rule_set_version': rule_set.version
         }
-
+        if visualizations is None:
+            result['degraded'] = True
+            result['degraded_reason'] = ('Server busy: charts were skipped; score and '
+                                         'numeric explanation are complete')
+        return result
+
+    def score_batch(self, feature_rows, version=None):
+        """Vectorized label/probability scoring of many rows without explanations"""
+        rule_set = (rule_set_registry.get(version) if version
+                    else rule_set_registry.active())
+        _, probabilities, labels = rule_set.score_batch(
+            features_to_matrix(feature_rows))
+        return labels, probabilities, rule_set.version
+
+    @metrics.timed('shap')
     def _generate_fallback_shap(self, risk_factors, probability):
         """Generate SHAP-like explanations for fallback mode"""
         feature_contributions = []
 
         for factor in risk_factors:
+            strength = abs(factor['contribution'])
             feature_contributions.append({
                 'feature': factor['feature'],
                 'value': float(factor['value']),
                 'contribution': factor['contribution'],
-                'abs_contribution': abs(factor['contribution']),
-                'impact': 'increases_risk' if factor['contribution'] > 0 else 'decreases_risk',
-                'impact_strength': 'high' if abs(factor['contribution']) > 0.3 else 'medium' if abs(factor['contribution']) > 0.1 else 'low'
+                'abs_contribution': strength,
+                'impact': ('increases_risk' if factor['contribution'] > 0
+                           else 'decreases_risk'),
+                'impact_strength': ('high' if strength > 0.3
+                                    else 'medium' if strength > 0.1 else 'low')
             })
 
         # Sort by absolute contribution
@@ -211,46 +272,25 @@ class PredictionService:
             'prediction_value': float(probability)
         }
 
+    @metrics.timed('render')
     def _generate_fallback_visualizations(self, risk_factors, features):
         """Generate visualizations for fallback mode with improved error handling"""
         visualizations = {}
 
         try:
             # Always create a simple HTML-based visualization as fallback
-            html_chart = self._create_html_chart(risk_factors)
+            with metrics.timer('render_html'):
+                html_chart = self._create_html_chart(risk_factors)
             visualizations['feature_importance_html'] = html_chart
 
-            # Try to create Plotly chart if available
+            # Try to create Plotly chart if available (rendered off the request thread)
             if PLOTTING_AVAILABLE:
                 try:
-                    # Create feature importance chart
-                    feature_names = [f['feature'] for f in risk_factors]
-                    contributions = [f['contribution'] for f in risk_factors]
-
-                    fig = go.Figure()
-                    colors = ['rgba(255, 65, 54, 0.8)' if c > 0 else 'rgba(30, 136, 229, 0.8)' for c in contributions]
-
-                    fig.add_trace(go.Bar(
-                        x=feature_names,
-                        y=[abs(c) for c in contributions],
-                        marker_color=colors,
-                        text=[f"Impact: {c:+.2f}" for c in contributions],
-                        textposition='outside'
-                    ))
-
-                    fig.update_layout(
-                        title='Feature Contributions to Anemia Risk (Rule-Based Analysis)',
-                        xaxis_title='Lab Parameters',
-                        yaxis_title='Risk Contribution',
-                        height=400,
-                        plot_bgcolor='white',
-                        paper_bgcolor='white'
-                    )
-
-                    # Convert to base64
-                    img_bytes = pio.to_image(fig, format='png', width=800, height=400)
-                    img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-                    visualizations['feature_importance'] = f"data:image/png;base64,{img_base64}"
+                    with metrics.timer('render_png'):
+                        visualizations['feature_importance'] = \
+                            render_pool.render_feature_importance(
+                                [f['feature'] for f in risk_factors],
+                                [f['contribution'] for f in risk_factors])
 
                 except Exception as plotly_error:
                     logger.warning(f"Plotly visualization failed: {plotly_error}")
@@ -268,13 +308,16 @@ class PredictionService:
     def _create_html_chart(self, risk_factors):
         """Create a simple HTML-based chart visualization"""
         html = """
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 20px auto;">
-            <h3 style="text-align: center; color: #333; margin-bottom: 20px;">Feature Contributions to Anemia Risk</h3>
+        <div style="font-family: Arial, sans-serif; max-width: 600px;
+                    margin: 20px auto;">
+            <h3 style="text-align: center; color: #333; margin-bottom: 20px;">
+                Feature Contributions to Anemia Risk</h3>
             <div style="background: #f8f9fa; padding: 20px; border-radius: 8px;">
         """
 
         # Sort risk factors by absolute contribution
-        sorted_factors = sorted(risk_factors, key=lambda x: abs(x['contribution']), reverse=True)
+        sorted_factors = sorted(risk_factors, key=lambda x: abs(x['contribution']),
+                                reverse=True)
 
         for factor in sorted_factors:
             contribution = factor['contribution']
@@ -283,27 +326,37 @@ class PredictionService:
             impact_text = 'Increases Risk' if contribution > 0 else 'Decreases Risk'
 
             html += f"""
-                <div style="margin-bottom: 15px; padding: 10px; background: white; border-radius: 6px; border-left: 4px solid {color};">
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
+                <div style="margin-bottom: 15px; padding: 10px; background: white;
+                            border-radius: 6px; border-left: 4px solid {color};">
+                    <div style="display: flex; justify-content: space-between;
+                                align-items: center;">
                         <div>
                             <strong style="color: #333;">{factor['feature']}</strong>
-                            <div style="color: #666; font-size: 0.9em;">Value: {factor['value']}</div>
+                            <div style="color: #666; font-size: 0.9em;">
+                                Value: {factor['value']}</div>
                         </div>
                         <div style="text-align: right;">
-                            <div style="color: {color}; font-weight: bold;">{impact_text}</div>
-                            <div style="color: #666; font-size: 0.9em;">{percentage:.1f}% impact</div>
+                            <div style="color: {color}; font-weight: bold;">
+                                {impact_text}</div>
+                            <div style="color: #666; font-size: 0.9em;">
+                                {percentage:.1f}% impact</div>
                         </div>
                     </div>
-                    <div style="margin-top: 8px; background: #e9ecef; height: 8px; border-radius: 4px;">
-                        <div style="background: {color}; height: 100%; width: {min(percentage * 2, 100)}%; border-radius: 4px;"></div>
+                    <div style="margin-top: 8px; background: #e9ecef; height: 8px;
+                                border-radius: 4px;">
+                        <div style="background: {color}; height: 100%;
+                                    width: {min(percentage * 2, 100)}%;
+                                    border-radius: 4px;"></div>
                     </div>
                 </div>
             """
 
         html += """
             </div>
-            <div style="text-align: center; margin-top: 15px; color: #666; font-size: 0.9em;">
-                Interactive visualization showing how each lab parameter contributes to the anemia risk assessment
+            <div style="text-align: center; margin-top: 15px; color: #666;
+                        font-size: 0.9em;">
+                Interactive visualization showing how each lab parameter contributes to
+                the anemia risk assessment
             </div>
         </div>
         """
@@ -314,26 +367,32 @@ class PredictionService:
         """Create a simple text-based visualization as ultimate fallback"""
         text = "Feature Contributions to Anemia Risk:\n\n"
 
-        sorted_factors = sorted(risk_factors, key=lambda x: abs(x['contribution']), reverse=True)
+        sorted_factors = sorted(risk_factors, key=lambda x: abs(x['contribution']),
+                                reverse=True)
 
         for i, factor in enumerate(sorted_factors, 1):
             contribution = factor['contribution']
             impact_text = "increases risk" if contribution > 0 else "decreases risk"
-            text += f"{i}. {factor['feature']} (value: {factor['value']}) - {impact_text} by {abs(contribution)*100:.1f}%\n"
+            text += (f"{i}. {factor['feature']} (value: {factor['value']}) - "
+                     f"{impact_text} by {abs(contribution)*100:.1f}%\n")
 
         return text
 
+    @metrics.timed('clinical_interpretation')
     def _get_clinical_interpretation(self, features, prediction_proba):
         """Provide comprehensive clinical interpretation"""
-        risk_level = "high" if prediction_proba > 0.7 else "moderate" if prediction_proba > 0.3 else "low"
+        level = risk_level(prediction_proba)
 
         interpretation = {
-            'risk_level': risk_level,
+            'risk_level': level,
             'confidence': float(prediction_proba),
-            'summary': f"Based on the lab values, the analysis indicates a {risk_level} risk of anemia (confidence: {prediction_proba:.2%}).",
+            'summary': f"Based on the lab values, the analysis indicates a {level} "
+                       f"risk of anemia (confidence: {prediction_proba:.2%}).",
             'key_factors': [],
-            'recommendations': self._generate_clinical_recommendations(features, prediction_proba),
-            'disclaimer': "Please consult with a healthcare provider for proper diagnosis and treatment."
+            'recommendations': self._generate_clinical_recommendations(
+                features, prediction_proba),
+            'disclaimer': "Please consult with a healthcare provider for proper "
+                          "diagnosis and treatment."
         }
 
         return interpretation
@@ -342,24 +401,30 @@ class PredictionService:
         """Generate clinical recommendations based on prediction and features"""
         recommendations = []
 
-        if prediction_proba > 0.7:
-            recommendations.append("High risk detected - immediate medical evaluation recommended")
-            recommendations.append("Complete blood count (CBC) with differential advised")
+        if prediction_proba > HIGH_RISK_THRESHOLD:
+            recommendations.append("High risk detected - immediate medical evaluation "
+                                   "recommended")
+            recommendations.append("Complete blood count (CBC) with differential "
+                                   "advised")
 
         if features['Hemoglobin'] < 10.0:
-            recommendations.append("Severe anemia suspected - urgent medical attention required")
+            recommendations.append("Severe anemia suspected - urgent medical attention "
+                                   "required")
         elif features['Hemoglobin'] < 12.0:
             recommendations.append("Iron deficiency evaluation recommended")
             recommendations.append("Dietary counseling for iron-rich foods")
 
         if features['MCV'] < 80:
-            recommendations.append("Microcytic anemia pattern - check iron studies, ferritin")
+            recommendations.append("Microcytic anemia pattern - check iron studies, "
+                                   "ferritin")
         elif features['MCV'] > 100:
-            recommendations.append("Macrocytic anemia pattern - check B12, folate levels")
+            recommendations.append("Macrocytic anemia pattern - check B12, folate "
+                                   "levels")
 
         if not recommendations:
             recommendations.append("Continue regular health monitoring")
-            recommendations.append("Maintain balanced diet rich in iron, B12, and folate")
+            recommendations.append("Maintain balanced diet rich in iron, B12, and "
+                                   "folate")
 
         return recommendations
 
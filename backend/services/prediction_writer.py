@@ -0,0 +1,209 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from config import Config
+from models import db, Prediction
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+class PendingWrite:
+    """One queued prediction row and the handshake its request waits on"""
+
+    __slots__ = ('row', 'done', 'prediction_id', 'error', 'state')
+
+    def __init__(self, row):
+        self.row = row
+        self.done = threading.Event()
+        self.prediction_id = None
+        self.error = None
+        # -> 'claimed' by the writer or 'abandoned' by a request that gave up
+        self.state = 'queued'
+
+class PredictionWriter:
+    """Persist predictions directly or through a write-behind buffer with group commit.
+
+    Modes (Config.PREDICTION_WRITE_MODE):
+
+    * ``sync``    - one INSERT + COMMIT per request (default, original behaviour).
+    * ``group``   - rows from concurrent requests are buffered and committed
+      together every PREDICTION_FLUSH_INTERVAL_MS or PREDICTION_FLUSH_BATCH_SIZE
+      rows. Each request still waits until its own row is committed, so the
+      response is only sent for durable data; many requests share one fsync.
+    * ``relaxed`` - as ``group`` but the request returns as soon as the row is
+      buffered and the response carries no ``saved_prediction_id``. Rows still
+      in the buffer are lost if the process is killed (SIGKILL/OOM); they are
+      flushed on normal shutdown.
+
+    The buffer holds at most PREDICTION_WRITE_BUFFER_SIZE rows. When it is
+    full, requests wait briefly and then fall back to a direct write. A request
+    whose row has not been picked up within PREDICTION_WRITE_TIMEOUT (writer
+    thread stalled or dead) withdraws it and writes it directly too.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode or Config.PREDICTION_WRITE_MODE
+        self.batch_size = Config.PREDICTION_FLUSH_BATCH_SIZE
+        self.flush_interval = Config.PREDICTION_FLUSH_INTERVAL_MS / 1000.0
+        self.write_timeout = Config.PREDICTION_WRITE_TIMEOUT
+        self.queue = queue.Queue(maxsize=Config.PREDICTION_WRITE_BUFFER_SIZE)
+        self.app = None
+        self.batches = 0
+        self.rows_written = 0
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.flush)
+
+    @staticmethod
+    def build_row(user_id, features, result):
+        """Serialize a prediction into column values (done on the request thread)"""
+        return {
+            'user_id': int(user_id),
+            'input_features': json.dumps(features),
+            'predicted_label': result['predicted_label'],
+            'predicted_proba': result['predicted_proba'],
+            'explanation': json.dumps(result['explanations']),
+            'rule_set_version': result.get('rule_set_version'),
+            'model_version': result.get('model_version'),
+            'created_at': datetime.utcnow()
+        }
+
+    def save(self, user_id, features, result):
+        """Persist one prediction; returns its id (None in relaxed mode)"""
+        row = self.build_row(user_id, features, result)
+
+        if self.mode == 'sync' or self.app is None:
+            return self._write_direct(row)
+
+        self._ensure_worker()
+        pending = PendingWrite(row)
+        try:
+            self.queue.put(pending, timeout=self.flush_interval * 10)
+        except queue.Full:
+            logger.warning("Prediction write buffer full - writing directly")
+            return self._write_direct(row)
+
+        if self.mode == 'relaxed':
+            return None
+
+        if not pending.done.wait(self.write_timeout):
+            with self._claim_lock:
+                abandoned = pending.state == 'queued'
+                if abandoned:
+                    pending.state = 'abandoned'
+            if abandoned:
+                logger.warning("Group commit did not pick up a prediction within "
+                               "%.1fs - writing directly", self.write_timeout)
+                return self._write_direct(row)
+            # Already in a commit: its outcome is only a moment away
+            if not pending.done.wait(self.write_timeout):
+                raise RuntimeError("Timed out waiting for the prediction to be "
+                                   "committed")
+        if pending.error:
+            raise RuntimeError(pending.error)
+        return pending.prediction_id
+
+    def _write_direct(self, row):
+        record = Prediction(**row)
+        db.session.add(record)
+        with tracer.span('db.commit'):
+            db.session.commit()
+        return record.id
+
+    def _ensure_worker(self):
+        # Started lazily so each forked gunicorn worker gets its own flusher
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    logger.error("Prediction writer thread died - restarting it")
+                self._thread = threading.Thread(target=self._run,
+                                                name='prediction-writer', daemon=True)
+                self._thread.start()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            try:
+                with self._flush_lock:
+                    self._commit(self._collect(first))
+            except Exception:
+                logger.exception("Prediction writer failed outside a commit")
+
+    def _commit(self, batch):
+        """Insert a batch in one transaction and release the waiting requests"""
+        with self._claim_lock:
+            batch = [pending for pending in batch if pending.state == 'queued']
+            for pending in batch:
+                pending.state = 'claimed'
+        if not batch:
+            return
+        with self.app.app_context():
+            try:
+                records = [Prediction(**pending.row) for pending in batch]
+                db.session.add_all(records)
+                db.session.commit()
+                for pending, record in zip(batch, records):
+                    pending.prediction_id = record.id
+                self.batches += 1
+                self.rows_written += len(batch)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Group commit of {len(batch)} predictions failed: {e}")
+                for pending in batch:
+                    pending.error = str(e)
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def flush(self):
+        """Synchronously commit everything still buffered (called on shutdown)"""
+        if self.app is None:
+            return
+        with self._flush_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+                if len(batch) >= self.batch_size:
+                    self._commit(batch)
+                    batch = []
+            if batch:
+                self._commit(batch)
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'buffered': self.queue.qsize(),
+            'batches': self.batches,
+            'rows_written': self.rows_written,
+            'avg_batch_size': self.rows_written / self.batches if self.batches else 0.0
+        }
+
+# Global instance
+prediction_writer = PredictionWriter()
@@ -0,0 +1,234 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from flask import g, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from config import Config
+
+# Sampling profiles are optional
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+    SAMPLING_AVAILABLE = True
+except ImportError:
+    SamplingProfiler = None
+    SAMPLING_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Frames the report always breaks out, whatever their share of the total
+FOCUS_PATTERN = r'sqlalchemy|json|prediction_service'
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+class RequestProfiler:
+    """Opt-in profiling of single requests for admins.
+
+    A request carrying ``X-Profile: 1`` (or ``?profile=1``, ``sample`` for the
+    sampling profiler) from a user whose JWT role is in PROFILING_ROLES runs under
+    cProfile. The call-graph report is stored in PROFILE_DIR and its id returned in
+    the ``X-Profile-Id`` header. Anyone else's flag is ignored. Each worker profiles
+    one request at a time and at most PROFILE_RATE_LIMIT per PROFILE_RATE_WINDOW.
+    Only the newest PROFILE_MAX_REPORTS reports younger than PROFILE_MAX_AGE are
+    kept.
+    """
+
+    def __init__(self, profile_dir=None, roles=None, rate_limit=None, rate_window=None,
+                 max_reports=None, max_age=None):
+        self.profile_dir = profile_dir or Config.PROFILE_DIR
+        self.max_reports = max_reports or Config.PROFILE_MAX_REPORTS
+        self.max_age = max_age or Config.PROFILE_MAX_AGE
+        self.roles = roles or Config.PROFILING_ROLES
+        self.rate_limit = rate_limit or Config.PROFILE_RATE_LIMIT
+        self.rate_window = rate_window or Config.PROFILE_RATE_WINDOW
+        self._active = threading.Lock()
+        self._recent = deque()
+        self._recent_lock = threading.Lock()
+        self.rejected = 0
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._stop)
+
+    def _requested_mode(self):
+        flag = (request.headers.get('X-Profile') or request.args.get('profile')
+                or '').lower()
+        if flag in ('1', 'true', 'cprofile'):
+            return 'cprofile'
+        if flag == 'sample':
+            return 'sample' if SAMPLING_AVAILABLE else 'cprofile'
+        return None
+
+    def is_admin(self):
+        try:
+            verify_jwt_in_request(optional=True)
+            return get_jwt().get('role') in self.roles
+        except Exception:
+            return False
+
+    def _take_slot(self):
+        now = time.monotonic()
+        with self._recent_lock:
+            while self._recent and now - self._recent[0] > self.rate_window:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return False
+            if not self._active.acquire(blocking=False):
+                return False
+            self._recent.append(now)
+            return True
+
+    def _start(self):
+        mode = self._requested_mode()
+        if mode is None:
+            return
+        if not self.is_admin():
+            logger.warning(f"Ignoring profiling flag from non-admin request to "
+                           f"{request.path}")
+            return
+        if not self._take_slot():
+            self.rejected += 1
+            g.profile_rejected = True
+            return
+
+        if mode == 'sample':
+            profiler = SamplingProfiler(interval=0.001)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        g.profile = (mode, profiler, time.perf_counter())
+
+    def _stop(self, response):
+        if g.pop('profile_rejected', False):
+            response.headers['X-Profile-Status'] = 'rate-limited'
+            return response
+        state = g.pop('profile', None)
+        if state is None:
+            return response
+
+        mode, profiler, started = state
+        try:
+            if mode == 'sample':
+                profiler.stop()
+            else:
+                profiler.disable()
+            duration_ms = (time.perf_counter() - started) * 1000.0
+            profile_id = self._save(mode, profiler, duration_ms, response.status_code)
+            response.headers['X-Profile-Id'] = profile_id
+        except Exception as e:
+            logger.error(f"Could not save profile for {request.path}: {e}")
+        finally:
+            self._active.release()
+        return response
+
+    def _save(self, mode, profiler, duration_ms, status_code):
+        profile_id = uuid.uuid4().hex
+        os.makedirs(self.profile_dir, exist_ok=True)
+        report = {
+            'id': profile_id,
+            'created_at': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'status_code': status_code,
+            'duration_ms': round(duration_ms, 3),
+            'profiler': mode
+        }
+        if mode == 'sample':
+            report['text'] = profiler.output_text(unicode=False, color=False,
+                                                  show_all=False)
+        else:
+            report.update(self._call_graph(profiler))
+            # Raw stats for snakeviz/pstats: python -m pstats <id>.prof
+            profiler.dump_stats(os.path.join(self.profile_dir, f'{profile_id}.prof'))
+
+        with open(os.path.join(self.profile_dir, f'{profile_id}.json'), 'w') as f:
+            json.dump(report, f)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        """Delete reports (and their raw stats) past max_age or max_reports"""
+        reports = []
+        for name in os.listdir(self.profile_dir):
+            if name.endswith('.json'):
+                try:
+                    mtime = os.path.getmtime(os.path.join(self.profile_dir, name))
+                except FileNotFoundError:
+                    continue  # pruned by another worker
+                reports.append((mtime, name[:-len('.json')]))
+        reports.sort(reverse=True)
+
+        cutoff = time.time() - self.max_age
+        for index, (mtime, profile_id) in enumerate(reports):
+            if index < self.max_reports and mtime >= cutoff:
+                continue
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(self.profile_dir, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _call_graph(profiler, limit=40):
+        """Top functions by cumulative time plus caller -> callee edges of the
+        focus frames"""
+        stats = pstats.Stats(profiler)
+        label = lambda func: f"{func[0]}:{func[1]}({func[2]})"
+
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3],
+                           reverse=True)
+        top = [{'function': label(func), 'calls': nc, 'total_ms': tt * 1000.0,
+                'cumulative_ms': ct * 1000.0}
+               for func, (cc, nc, tt, ct, callers) in functions[:limit]]
+
+        focus = re.compile(FOCUS_PATTERN)
+        edges = []
+        for func, (cc, nc, tt, ct, callers) in functions:
+            if not focus.search(label(func)):
+                continue
+            for caller, caller_stats in callers.items():
+                edges.append({'caller': label(caller), 'callee': label(func),
+                              'calls': caller_stats[1],
+                              'cumulative_ms': caller_stats[3] * 1000.0})
+        edges.sort(key=lambda edge: edge['cumulative_ms'], reverse=True)
+
+        text = io.StringIO()
+        printable = pstats.Stats(profiler, stream=text)
+        printable.sort_stats('cumulative').print_stats(limit)
+        printable.print_callees(FOCUS_PATTERN, limit)
+        return {'top_functions': top, 'call_graph': edges[:200],
+                'text': text.getvalue()}
+
+    def list_reports(self, limit=50):
+        if not os.path.isdir(self.profile_dir):
+            return []
+        reports = []
+        for name in os.listdir(self.profile_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.profile_dir, name)) as f:
+                    report = json.load(f)
+                reports.append({key: report[key] for key in
+                                ('id', 'created_at', 'method', 'path', 'status_code',
+                                 'duration_ms', 'profiler')})
+        reports.sort(key=lambda report: report['created_at'], reverse=True)
+        return reports[:limit]
+
+    def get_report(self, profile_id):
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.profile_dir, f'{profile_id}.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+# Global instance
+request_profiler = RequestProfiler()
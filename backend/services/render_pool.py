@@ -0,0 +1,82 @@
+import base64
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def render_feature_importance_png(feature_names, contributions):
+    """Render the contribution bar chart to a PNG data URI (runs in a pool process)"""
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    fig = go.Figure()
+    colors = ['rgba(255, 65, 54, 0.8)' if c > 0 else 'rgba(30, 136, 229, 0.8)'
+              for c in contributions]
+
+    fig.add_trace(go.Bar(
+        x=feature_names,
+        y=[abs(c) for c in contributions],
+        marker_color=colors,
+        text=[f"Impact: {c:+.2f}" for c in contributions],
+        textposition='outside'
+    ))
+
+    fig.update_layout(
+        title='Feature Contributions to Anemia Risk (Rule-Based Analysis)',
+        xaxis_title='Lab Parameters',
+        yaxis_title='Risk Contribution',
+        height=400,
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+
+    img_bytes = pio.to_image(fig, format='png', width=800, height=400)
+    return f"data:image/png;base64,{base64.b64encode(img_bytes).decode('utf-8')}"
+
+class RenderPool:
+    """Run chart rendering outside the request thread.
+
+    With RENDER_POOL_WORKERS > 0, PNG rendering goes to a per-worker process pool,
+    so threaded workers keep serving while kaleido works and the GIL is not held.
+    With 0, rendering runs inline under a lock, because kaleido's shared renderer
+    process is not safe to drive from several threads at once.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        self.workers = Config.RENDER_POOL_WORKERS if workers is None else workers
+        self.timeout = timeout or Config.RENDER_TIMEOUT
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._inline_lock = threading.Lock()
+
+    def _get_executor(self):
+        # One pool per gunicorn worker; spawn avoids forking a multithreaded process
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def render_feature_importance(self, feature_names, contributions):
+        if not self.workers:
+            with self._inline_lock:
+                return render_feature_importance_png(feature_names, contributions)
+        future = self._get_executor().submit(render_feature_importance_png,
+                                             list(feature_names), list(contributions))
+        return future.result(timeout=self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+render_pool = RenderPool()
@@ -0,0 +1,88 @@
+import json
+import logging
+import time
+from datetime import datetime
+from sqlalchemy import select, update, or_
+from models import db, Prediction
+from services.rule_sets import rule_set_registry, features_to_matrix
+from services.patient_search import refresh_latest_risk
+from services.lab_trends import refresh_high_risk_counts
+
+logger = logging.getLogger(__name__)
+
+def rescore_predictions(version, chunk_size=5000, progress=None):
+    """Re-score every stored prediction under a rule set version.
+
+    Rows are walked in primary-key order (keyset pagination, so each chunk is
+    an index range scan), scored through the vectorized evaluator and written
+    back with one executemany UPDATE and one commit per chunk. Rows already
+    tagged with ``version`` are skipped, so an interrupted run can be resumed.
+    Only rule-scored rows (``model_version`` ``rules-*``, or NULL for rows
+    written before the column existed) are touched; rows a registry model
+    scored keep their score. Stored explanations are left as they were
+    originally generated.
+    """
+    rule_set = rule_set_registry.get(version)
+    last_id = 0
+    scanned = 0
+    updated = 0
+    started = time.monotonic()
+
+    while True:
+        rows = db.session.execute(
+            select(Prediction.id, Prediction.input_features)
+            .where(Prediction.id > last_id)
+            .where(or_(Prediction.model_version.is_(None),
+                       Prediction.model_version.like('rules-%')))
+            .where(or_(Prediction.rule_set_version.is_(None),
+                       Prediction.rule_set_version != version))
+            .order_by(Prediction.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        ids = []
+        features = []
+        for prediction_id, input_features in rows:
+            try:
+                features.append(json.loads(input_features))
+                ids.append(prediction_id)
+            except ValueError:
+                logger.warning(f"Skipping prediction {prediction_id} with unreadable "
+                               f"input features")
+
+        if ids:
+            _, probabilities, labels = rule_set.score_batch(
+                features_to_matrix(features))
+            now = datetime.utcnow()
+            db.session.execute(update(Prediction), [
+                {
+                    'id': prediction_id,
+                    'predicted_label': int(label),
+                    'predicted_proba': float(probability),
+                    'rule_set_version': version,
+                    'model_version': f'rules-{version}',
+                    'updated_at': now
+                }
+                for prediction_id, label, probability in zip(ids, labels, probabilities)
+            ])
+            db.session.commit()
+
+        scanned += len(rows)
+        updated += len(ids)
+        last_id = rows[-1][0]
+        if progress:
+            progress(scanned, updated, time.monotonic() - started)
+
+    if updated:
+        # Patients' latest risk level and high-risk counts follow the new probabilities
+        refresh_latest_risk()
+        refresh_high_risk_counts()
+
+    return {
+        'version': version,
+        'scanned': scanned,
+        'updated': updated,
+        'seconds': time.monotonic() - started
+    }
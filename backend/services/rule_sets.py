@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import threading
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Column order of feature matrices passed to CompiledRuleSet.score_batch
+FEATURE_COLUMNS = ['Gender', 'Hemoglobin', 'MCH', 'MCHC', 'MCV']
+
+def features_to_matrix(rows):
+    """Stack feature dicts into an (n, 5) float matrix in FEATURE_COLUMNS order"""
+    matrix = np.array([[float(row[name]) for name in FEATURE_COLUMNS] for row in rows],
+                      dtype=np.float64)
+    return matrix.reshape(-1, len(FEATURE_COLUMNS))
+
+class CompiledRuleSet:
+    """A rule set definition compiled into flat arrays.
+
+    ``evaluate`` scores a single feature dict with plain Python comparisons
+    (cheapest for one request); ``score_batch`` scores a whole matrix with
+    vectorized numpy operations. Both produce identical results.
+    """
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.version = definition['version']
+
+        hb = definition['hemoglobin']
+        self.hb_thresholds = (float(hb['thresholds']['0']),
+                              float(hb['thresholds']['1']))
+        bands = sorted(hb['deficit_bands'], key=lambda b: b['min_deficit'],
+                       reverse=True)
+        self.band_mins = tuple(float(b['min_deficit']) for b in bands)
+        self.band_weights = tuple(float(b['weight']) for b in bands)
+        self.hb_normal = float(hb['normal_contribution'])
+
+        ranges = definition['ranges']
+        self.range_features = tuple(r['feature'] for r in ranges)
+        self.range_lows = tuple(float(r['low']) for r in ranges)
+        self.range_highs = tuple(float(r['high']) for r in ranges)
+        self.range_low_weights = tuple(float(r['low_weight']) for r in ranges)
+        self.range_high_weights = tuple(float(r['high_weight']) for r in ranges)
+        self.range_normals = tuple(float(r['normal_contribution']) for r in ranges)
+
+        self.gender_weights = (float(definition['gender']['0']),
+                               float(definition['gender']['1']))
+        self.proba_low, self.proba_high = (float(v) for v in
+                                           definition['probability_bounds'])
+        self.decision_threshold = float(definition['decision_threshold'])
+
+        # Array forms for the vectorized path
+        self._hb_thresholds = np.array(self.hb_thresholds)
+        self._band_mins = np.array(self.band_mins)
+        self._band_weights = np.array(self.band_weights)
+        self._range_columns = np.array([FEATURE_COLUMNS.index(f)
+                                        for f in self.range_features], dtype=np.intp)
+        self._range_lows = np.array(self.range_lows)
+        self._range_highs = np.array(self.range_highs)
+        self._range_low_weights = np.array(self.range_low_weights)
+        self._range_high_weights = np.array(self.range_high_weights)
+        self._range_normals = np.array(self.range_normals)
+        self._gender_weights = np.array(self.gender_weights)
+
+    @property
+    def factor_names(self):
+        """Feature name of each contribution, in explanation order"""
+        return ('Hemoglobin',) + self.range_features + ('Gender',)
+
+    def evaluate(self, features):
+        """Score one feature dict, returning (contributions, probability, label)"""
+        gender = int(features['Gender'])
+        hemoglobin = features['Hemoglobin']
+
+        contributions = []
+        deficit = self.hb_thresholds[gender] - hemoglobin
+        if deficit > 0:
+            for band_min, weight in zip(self.band_mins, self.band_weights):
+                if deficit >= band_min:
+                    contributions.append(weight)
+                    break
+        else:
+            contributions.append(self.hb_normal)
+
+        for i, name in enumerate(self.range_features):
+            value = features[name]
+            if value < self.range_lows[i]:
+                contributions.append(self.range_low_weights[i])
+            elif value > self.range_highs[i]:
+                contributions.append(self.range_high_weights[i])
+            else:
+                contributions.append(self.range_normals[i])
+
+        contributions.append(self.gender_weights[gender])
+
+        # Protective (negative) contributions are explanatory only and do not lower
+        # the score
+        risk_score = 0.0
+        for c in contributions:
+            if c > 0:
+                risk_score += c
+
+        probability = max(self.proba_low, min(self.proba_high, risk_score))
+        label = 1 if probability > self.decision_threshold else 0
+        return contributions, probability, label
+
+    def score_batch(self, matrix):
+        """Score an (n, 5) matrix, returning (contributions, probabilities, labels)
+        arrays"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        gender = matrix[:, 0].astype(np.intp)
+        hemoglobin = matrix[:, 1]
+
+        deficit = self._hb_thresholds[gender] - hemoglobin
+        band = np.argmax(deficit[:, None] >= self._band_mins[None, :], axis=1)
+        hb_contribution = np.where(deficit > 0, self._band_weights[band],
+                                   self.hb_normal)
+
+        values = matrix[:, self._range_columns]
+        range_contribution = np.where(
+            values < self._range_lows, self._range_low_weights,
+            np.where(values > self._range_highs, self._range_high_weights,
+                     self._range_normals)
+        )
+
+        contributions = np.column_stack([hb_contribution, range_contribution,
+                                         self._gender_weights[gender]])
+
+        risk_score = np.zeros(len(matrix))
+        for column in contributions.T:
+            risk_score += np.maximum(column, 0.0)
+
+        probabilities = np.clip(risk_score, self.proba_low, self.proba_high)
+        labels = (probabilities > self.decision_threshold).astype(np.int64)
+        return contributions, probabilities, labels
+
+class RuleSetRegistry:
+    """Load versioned rule set definitions from JSON files and cache their
+    compiled form"""
+
+    def __init__(self, directory=None, active_version=None):
+        self.directory = directory or Config.RULE_SETS_DIR
+        self.active_version = active_version or Config.ACTIVE_RULE_SET
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def versions(self):
+        """List the available rule set versions"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len('.json')] for name in os.listdir(self.directory)
+                      if name.endswith('.json'))
+
+    def get(self, version):
+        """Return the compiled rule set for a version"""
+        compiled = self._compiled.get(version)
+        if compiled is not None:
+            return compiled
+
+        with self._lock:
+            if version not in self._compiled:
+                path = os.path.join(self.directory, f"{version}.json")
+                if not os.path.exists(path):
+                    raise ValueError(f"Unknown rule set version: {version}")
+                with open(path) as f:
+                    definition = json.load(f)
+                if definition.get('version') != version:
+                    raise ValueError(f"Rule set file {path} declares version "
+                                     f"{definition.get('version')}")
+                self._compiled[version] = CompiledRuleSet(definition)
+                logger.info(f"Compiled rule set {version}")
+            return self._compiled[version]
+
+    def active(self):
+        """Return the compiled rule set used for live predictions"""
+        return self.get(self.active_version)
+
+# Global instance
+rule_set_registry = RuleSetRegistry()
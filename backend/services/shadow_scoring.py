@@ -0,0 +1,221 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class ShadowScorer:
+    """Score a secondary model off the request path and record agreement with the
+    primary.
+
+    Requests only enqueue work (never blocking; a full queue drops the sample).
+    A background thread drains the queue in batches, scores each batch with the
+    secondary model in a single call and appends the outcomes to a local SQLite
+    table that the summary endpoint aggregates for the current secondary model.
+    Only the newest ``max_rows`` outcomes are kept.
+    """
+
+    def __init__(self, db_path=None, enabled=None, queue_size=None, batch_size=None,
+                 batch_wait=None, max_rows=None):
+        self.db_path = db_path or Config.SHADOW_DB_PATH
+        self.max_rows = max_rows or Config.SHADOW_MAX_ROWS
+        self.enabled = Config.SHADOW_MODE if enabled is None else enabled
+        self.batch_size = batch_size or Config.SHADOW_BATCH_SIZE
+        self.batch_wait = Config.SHADOW_BATCH_WAIT if batch_wait is None else batch_wait
+        self.queue = queue.Queue(maxsize=queue_size or Config.SHADOW_QUEUE_SIZE)
+        self.secondary = None
+        self.secondary_name = None
+        self.dropped = 0
+        self.scored = 0
+        self.failed = 0
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._pending = 0
+
+    def set_secondary(self, predict_batch, name):
+        """Register the secondary scorer: a callable mapping a list of feature
+        dicts to probabilities"""
+        self.secondary = predict_batch
+        self.secondary_name = name
+
+    def submit(self, features, primary_result, primary_latency_ms):
+        """Queue one primary outcome for shadow scoring"""
+        if not self.enabled or self.secondary is None:
+            return
+
+        self._ensure_worker()
+        item = (datetime.utcnow().isoformat(), features,
+                primary_result['predicted_label'], primary_result['predicted_proba'],
+                primary_latency_ms)
+        with self._idle:
+            self._pending += 1
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self._idle:
+                self._pending -= 1
+                self.dropped += 1
+
+    def _ensure_worker(self):
+        # Started lazily so each forked gunicorn worker gets its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._init_db()
+                self._thread = threading.Thread(target=self._run, name='shadow-scorer',
+                                                daemon=True)
+                self._thread.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS shadow_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at TEXT NOT NULL,
+                    secondary_model TEXT,
+                    primary_label INTEGER NOT NULL,
+                    primary_proba REAL NOT NULL,
+                    shadow_label INTEGER NOT NULL,
+                    shadow_proba REAL NOT NULL,
+                    agree INTEGER NOT NULL,
+                    primary_latency_ms REAL NOT NULL,
+                    shadow_latency_ms REAL NOT NULL,
+                    batch_size INTEGER NOT NULL
+                )
+            ''')
+            # Per-model percentiles walk these indexes instead of sorting the table
+            conn.execute('DROP INDEX IF EXISTS ix_shadow_primary_latency')
+            conn.execute('DROP INDEX IF EXISTS ix_shadow_shadow_latency')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_shadow_model_primary_latency '
+                         'ON shadow_results (secondary_model, primary_latency_ms)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_shadow_model_shadow_latency '
+                         'ON shadow_results (secondary_model, shadow_latency_ms)')
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._score_batch(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.warning(f"Shadow scoring batch failed: {e}")
+            finally:
+                with self._idle:
+                    self._pending -= len(batch)
+                    self._idle.notify_all()
+
+    def _score_batch(self, batch):
+        started = time.perf_counter()
+        probabilities = self.secondary([item[1] for item in batch])
+        per_row_ms = (time.perf_counter() - started) * 1000.0 / len(batch)
+
+        rows = []
+        for item, shadow_proba in zip(batch, probabilities):
+            created_at, _, primary_label, primary_proba, primary_latency_ms = item
+            shadow_proba = float(shadow_proba)
+            shadow_label = 1 if shadow_proba > 0.5 else 0
+            rows.append((created_at, self.secondary_name, int(primary_label),
+                         float(primary_proba), shadow_label, shadow_proba,
+                         int(shadow_label == primary_label),
+                         float(primary_latency_ms), per_row_ms, len(batch)))
+
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT INTO shadow_results (created_at, secondary_model, primary_label,
+                                            primary_proba, shadow_label, shadow_proba,
+                                            agree, primary_latency_ms,
+                                            shadow_latency_ms, batch_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            # Retention: ids are sequential, so the newest max_rows rows are an id
+            # range
+            conn.execute('DELETE FROM shadow_results '
+                         'WHERE id <= (SELECT MAX(id) FROM shadow_results) - ?',
+                         (self.max_rows,))
+        self.scored += len(rows)
+
+    def wait_idle(self, timeout=None):
+        """Block until every queued item has been scored (used by tests and shutdown)"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def _percentiles(self, conn, column, count):
+        result = {}
+        for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            offset = min(count - 1, int(q * count))
+            row = conn.execute(f'SELECT {column} FROM shadow_results '
+                               f'WHERE secondary_model IS ? '
+                               f'ORDER BY {column} LIMIT 1 OFFSET ?',
+                               (self.secondary_name, offset)).fetchone()
+            result[name] = row[0] if row else None
+        return result
+
+    def summary(self):
+        """Aggregate agreement and latency statistics across the retained samples
+        of the current secondary model; rows left by an earlier one are ignored"""
+        local = {
+            'enabled': self.enabled,
+            'secondary_model': self.secondary_name,
+            'queue_depth': self.queue.qsize(),
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
+        if not os.path.exists(self.db_path):
+            return {**local, 'samples': 0}
+
+        with self._connect() as conn:
+            (count, agreements, mean_abs_diff,
+             primary_only, shadow_only) = conn.execute('''
+                SELECT COUNT(*), SUM(agree), AVG(ABS(primary_proba - shadow_proba)),
+                       SUM(CASE WHEN primary_label = 1 AND shadow_label = 0
+                                THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN primary_label = 0 AND shadow_label = 1
+                                THEN 1 ELSE 0 END)
+                FROM shadow_results
+                WHERE secondary_model IS ?
+            ''', (self.secondary_name,)).fetchone()
+            if not count:
+                return {**local, 'samples': 0}
+
+            return {
+                **local,
+                'samples': count,
+                'agreement_rate': agreements / count,
+                'disagreements': {
+                    'total': count - agreements,
+                    'primary_positive_only': primary_only,
+                    'shadow_positive_only': shadow_only
+                },
+                'mean_abs_probability_diff': mean_abs_diff,
+                'latency_ms': {
+                    'primary': self._percentiles(conn, 'primary_latency_ms', count),
+                    'shadow': self._percentiles(conn, 'shadow_latency_ms', count)
+                }
+            }
+
+# Global instance
+shadow_scorer = ShadowScorer()
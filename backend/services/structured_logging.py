@@ -0,0 +1,192 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from config import Config
+from services.tracing import tracer
+
+# LogRecord attributes that are not caller-supplied ``extra`` fields
+_RECORD_FIELDS = (set(vars(logging.LogRecord('', 0, '', 0, '', None, None)))
+                  | {'message', 'asctime', 'trace_id'})
+
+def cap(value, limit):
+    """Cut a string to ``limit`` characters, saying how much was dropped"""
+    if limit and len(value) > limit:
+        return f"{value[:limit]}...[{len(value) - limit} more chars]"
+    return value
+
+def parse_sample_rates(spec):
+    """'routes.patient=0.1,services.prediction_service=0.01' -> {logger name: rate}"""
+    rates = {}
+    for item in (spec or '').split(','):
+        name, _, rate = item.strip().partition('=')
+        if name and rate:
+            rates[name] = float(rate)
+    return rates
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of a logger's records below WARNING.
+
+    Rates apply to a logger and its children (the longest configured prefix
+    wins); warnings and errors are never sampled away.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}
+
+    def rate_for(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace id and
+    ``extra`` fields"""
+
+    def __init__(self, max_length=None):
+        super().__init__()
+        self.max_length = max_length
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc)
+                          .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': cap(record.getMessage(), self.max_length),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                if isinstance(value, (int, float, bool, type(None))):
+                    entry[key] = value
+                else:
+                    entry[key] = cap(str(value), self.max_length)
+        if record.exc_info:
+            entry['exception'] = cap(self.formatException(record.exc_info),
+                                     self.max_length)
+        return json.dumps(entry, default=str)
+
+class CappedFormatter(logging.Formatter):
+    """The usual text format, with the message and traceback capped"""
+
+    def __init__(self, fmt, max_length=None):
+        super().__init__(fmt)
+        self.max_length = max_length
+
+    def formatMessage(self, record):
+        record.message = cap(record.message, self.max_length)
+        return super().formatMessage(record)
+
+    def formatException(self, exc_info):
+        return cap(super().formatException(exc_info), self.max_length)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the listener thread without formatting them first.
+
+    The stock QueueHandler renders the message in the calling thread; here the
+    record is only copied (with the current trace id), so %-style arguments are
+    formatted by the listener, and only if the record is written at all. When
+    the queue is full the record is dropped and counted instead of blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.trace_id = tracer.current_trace_id()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LoggingSetup:
+    """Root logger wiring: sampling filter and queue handler in request threads,
+    I/O in a listener thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self.handler = None
+        self.listener = None
+
+    def configure(self, level=None, fmt=None, sample_rates=None, max_length=None,
+                  queue_size=None, log_file=None):
+        """Install the queue handler on the root logger (once per process)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            level = level or Config.LOG_LEVEL
+            fmt = fmt or Config.LOG_FORMAT
+            max_length = Config.LOG_MAX_LENGTH if max_length is None else max_length
+            log_file = Config.LOG_FILE if log_file is None else log_file
+
+            if fmt == 'json':
+                formatter = JsonFormatter(max_length)
+            else:
+                formatter = CappedFormatter('%(levelname)s:%(name)s:%(message)s',
+                                            max_length)
+            if log_file:
+                output = logging.handlers.RotatingFileHandler(
+                    log_file, maxBytes=Config.LOG_FILE_MAX_BYTES,
+                    backupCount=Config.LOG_FILE_BACKUPS)
+            else:
+                output = logging.StreamHandler(sys.stderr)
+            output.setFormatter(formatter)
+
+            log_queue = queue.Queue(maxsize=queue_size or Config.LOG_QUEUE_SIZE)
+            handler = NonBlockingQueueHandler(log_queue)
+            handler.addFilter(SamplingFilter(parse_sample_rates(
+                Config.LOG_SAMPLE_RATES if sample_rates is None else sample_rates)))
+            listener = logging.handlers.QueueListener(log_queue, output,
+                                                      respect_handler_level=True)
+            listener.start()
+
+            root = logging.getLogger()
+            if self.handler in root.handlers:
+                root.removeHandler(self.handler)
+            root.addHandler(handler)
+            root.setLevel(level)
+            self.handler, self.listener, self._pid = handler, listener, os.getpid()
+
+    def stop(self):
+        """Write out queued records and stop the listener thread"""
+        with self._lock:
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+                logging.getLogger().removeHandler(self.handler)
+                self._pid = None
+
+# Global instance
+logging_setup = LoggingSetup()
+atexit.register(logging_setup.stop)
@@ -0,0 +1,231 @@
+import csv
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from models import db, bcrypt, User, Prediction, Prescription
+from services.prediction_service import prediction_service
+from services.patient_search import refresh_latest_risk
+from services.lab_trends import rebuild_lab_trends
+from services.rule_sets import FEATURE_COLUMNS
+
+# Validation ranges from PredictionService._validate_input; generated values stay
+# inside them
+LAB_RANGES = {
+    'Hemoglobin': (5.0, 20.0),
+    'MCH': (15.0, 40.0),
+    'MCHC': (20.0, 45.0),
+    'MCV': (50.0, 130.0)
+}
+
+# Floor on the per-feature spread, since the bundled sample file is tiny
+MIN_SPREAD = {'Hemoglobin': 1.2, 'MCH': 2.0, 'MCHC': 1.2, 'MCV': 5.0}
+
+PRESCRIPTIONS = [
+    ('Iron supplementation', [{'name': 'Ferrous sulfate', 'dosage': '325 mg',
+                               'frequency': 'Once daily'}]),
+    ('Folic acid', [{'name': 'Folic acid', 'dosage': '1 mg',
+                     'frequency': 'Once daily'}]),
+    ('Vitamin B12', [{'name': 'Cyanocobalamin', 'dosage': '1000 mcg',
+                      'frequency': 'Once weekly'}]),
+    ('Dietary iron and follow-up CBC', []),
+    ('Iron and vitamin C', [{'name': 'Ferrous gluconate', 'dosage': '240 mg',
+                             'frequency': 'Twice daily'},
+                            {'name': 'Ascorbic acid', 'dosage': '500 mg',
+                             'frequency': 'Once daily'}])
+]
+
+FIRST_NAMES = ['Ava', 'Noah', 'Mia', 'Liam', 'Zara', 'Omar', 'Lena', 'Ravi', 'Chen',
+               'Sofia', 'Kofi', 'Ines']
+LAST_NAMES = ['Okafor', 'Silva', 'Nguyen', 'Haddad', 'Kowalski', 'Patel', 'Moreau',
+              'Tanaka', 'Larsen', 'Diaz']
+
+class LabDistribution:
+    """Lab values resampled from a reference file.
+
+    Each draw picks a reference row of the requested gender (and anemia class,
+    when the file has a ``Result`` column) and perturbs every lab value with
+    Gaussian noise of that group's spread, clipped to the validation ranges.
+    """
+
+    def __init__(self, rows):
+        if not rows:
+            raise ValueError("No reference rows to sample lab values from")
+        self.groups = {}
+        for row in rows:
+            key = (int(row['Gender']), row.get('Result'))
+            self.groups.setdefault(key, []).append(row)
+        self.spread = {}
+        for key, group in self.groups.items():
+            self.spread[key] = {}
+            for name in LAB_RANGES:
+                values = [row[name] for row in group]
+                mean = sum(values) / len(values)
+                std = (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5
+                self.spread[key][name] = max(std, MIN_SPREAD[name])
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            rows = []
+            for record in reader:
+                row = {name: float(record[name]) for name in FEATURE_COLUMNS}
+                if record.get('Result') not in (None, ''):
+                    row['Result'] = int(float(record['Result']))
+                rows.append(row)
+        return cls(rows)
+
+    def sample(self, rng, gender, anemic=None):
+        keys = [key for key in self.groups if key[0] == gender
+                and (anemic is None or key[1] in (None, int(anemic)))]
+        key = rng.choice(keys or list(self.groups))
+        base = rng.choice(self.groups[key])
+        features = {'Gender': gender}
+        for name, (low, high) in LAB_RANGES.items():
+            value = rng.gauss(base[name], self.spread[key][name])
+            features[name] = round(min(max(value, low), high), 1)
+        return features
+
+def _insert(model, rows, returning=False):
+    """Multi-row INSERT through the ORM bulk path (no per-object mapper events)
+
+    With ``returning`` the new ids come back in the order of ``rows``.
+    """
+    if returning:
+        # Callers zip the ids with their specs; only sort_by_parameter_order
+        # guarantees that order
+        statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+        return list(db.session.scalars(statement, rows))
+    if rows:
+        db.session.execute(insert(model), rows)
+    return None
+
+def _score(samples, explanations):
+    """Prediction rows for (patient id, features) pairs"""
+    if explanations:
+        results = [prediction_service.predict(dict(features), track=False)
+                   for _, features in samples]
+        scored = [(r['predicted_label'], r['predicted_proba'],
+                   json.dumps(r['explanations']), r['rule_set_version'])
+                  for r in results]
+    elif samples:
+        labels, probabilities, version = prediction_service.score_batch(
+            [features for _, features in samples])
+        scored = [(int(label), float(probability), None, version)
+                  for label, probability in zip(labels, probabilities)]
+    else:
+        scored = []
+    return [{
+        'user_id': patient_id,
+        'input_features': json.dumps(features),
+        'predicted_label': label,
+        'predicted_proba': probability,
+        'explanation': explanation,
+        'rule_set_version': version,
+        'model_version': f'rules-{version}'
+    } for (patient_id, features), (label, probability, explanation, version)
+        in zip(samples, scored)]
+
+def generate_population(doctors, patients_per_doctor, predictions_per_patient,
+                        prescriptions_per_patient, distribution,
+                        password='synthetic123', anemia_rate=0.35, days=365,
+                        batch_size=5000, explanations=True, seed=None, tag=None,
+                        progress=None):
+    """Insert a synthetic clinic population in batched transactions.
+
+    Users are named ``<role>-<tag>-<n>@synthetic.local`` and share one bcrypt
+    hash of ``password`` so load tests can log in as any of them. Predictions
+    are scored by the active rule set (with full explanations unless
+    ``explanations`` is False) and spread over the last ``days`` days.
+    """
+    rng = random.Random(seed)
+    tag = tag or datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    counts = {'doctors': 0, 'patients': 0, 'predictions': 0, 'prescriptions': 0}
+
+    def created_at():
+        return now - timedelta(seconds=rng.uniform(0, days * 86400))
+
+    def date_of_birth():
+        return (now - timedelta(days=rng.randint(18 * 365, 90 * 365))).date()
+
+    doctor_ids = _insert(User, [{
+        'name': f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'email': f'doctor-{tag}-{i}@synthetic.local',
+        'password_hash': password_hash,
+        'role': 'doctor',
+        'hospital': f'Synthetic Hospital {i % 10}',
+        'created_at': created_at()
+    } for i in range(doctors)], returning=True)
+    db.session.commit()
+    counts['doctors'] = len(doctor_ids)
+
+    patient_specs = [(doctor_id, d * patients_per_doctor + p)
+                     for d, doctor_id in enumerate(doctor_ids)
+                     for p in range(patients_per_doctor)]
+    for start in range(0, len(patient_specs), batch_size):
+        specs = patient_specs[start:start + batch_size]
+        genders = [rng.randint(0, 1) for _ in specs]
+        patient_ids = _insert(User, [{
+            'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'email': f'patient-{tag}-{n}@synthetic.local',
+            'password_hash': password_hash,
+            'role': 'user',
+            'doctor_id': doctor_id,
+            'gender': gender,
+            'date_of_birth': date_of_birth(),
+            'created_at': created_at()
+        } for (doctor_id, n), gender in zip(specs, genders)], returning=True)
+
+        samples, prescriptions = [], []
+        for (doctor_id, _), patient_id, gender in zip(specs, patient_ids, genders):
+            anemic = rng.random() < anemia_rate
+            for _ in range(predictions_per_patient):
+                samples.append((patient_id, distribution.sample(rng, gender, anemic)))
+            for _ in range(prescriptions_per_patient):
+                title, medications = rng.choice(PRESCRIPTIONS)
+                prescribed_at = created_at()
+                prescriptions.append({
+                    'patient_id': patient_id,
+                    'doctor_id': doctor_id,
+                    'title': title,
+                    'medications': json.dumps(medications),
+                    'notes': 'Synthetic prescription',
+                    'prescribed_at': prescribed_at,
+                    'expires_at': prescribed_at + timedelta(days=90),
+                    'created_at': prescribed_at
+                })
+
+        predictions = _score(samples, explanations)
+        for prediction in predictions:
+            prediction['created_at'] = created_at()
+        for i in range(0, len(predictions), batch_size):
+            _insert(Prediction, predictions[i:i + batch_size])
+        for i in range(0, len(prescriptions), batch_size):
+            _insert(Prescription, prescriptions[i:i + batch_size])
+        db.session.commit()
+        # Bulk inserts skip the mapper events that track each patient's latest risk
+        # and lab trends
+        refresh_latest_risk(patient_ids)
+        rebuild_lab_trends(patient_ids)
+
+        counts['patients'] += len(patient_ids)
+        counts['predictions'] += len(predictions)
+        counts['prescriptions'] += len(prescriptions)
+        if progress:
+            progress(counts, time.perf_counter() - started)
+
+    return {
+        'tag': tag,
+        'password': password,
+        'patients_per_doctor': patients_per_doctor,
+        'doctor_emails': f'doctor-{tag}-<0..{doctors - 1}>@synthetic.local',
+        'patient_emails':
+            f'patient-{tag}-<0..{len(patient_specs) - 1}>@synthetic.local',
+        'counts': counts,
+        'seconds': time.perf_counter() - started
+    }
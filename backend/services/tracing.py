@@ -0,0 +1,277 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_current_trace = ContextVar('taps_current_trace', default=None)
+_current_span = ContextVar('taps_current_span', default=None)
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+# OTLP span kinds
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'error')
+
+    def __init__(self, name, parent_id, kind=KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def end(self):
+        self.end_ns = time.time_ns()
+
+class Trace:
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+        self.dropped = 0
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)}
+            for key, value in attributes.items() if value is not None]
+
+class Tracer:
+    """Per-request span trees, tail-sampled and written as OTLP/JSON lines.
+
+    Every request collects its spans (stage timers, SQL statements, auth); the
+    keep/drop decision is made when the request ends, so slow or failed
+    requests are always kept while the rest are sampled at TRACE_SAMPLE_RATE.
+    Kept traces are queued and written by a background listener to a rotating
+    per-worker file, one OTLP ``resourceSpans`` document per line (the layout
+    of the OpenTelemetry Collector file exporter).
+    """
+
+    def __init__(self, enabled=None, sample_rate=None, slow_ms=None, trace_dir=None,
+                 max_spans=None):
+        self.enabled = Config.TRACING_ENABLED if enabled is None else enabled
+        self.sample_rate = (Config.TRACE_SAMPLE_RATE if sample_rate is None
+                            else sample_rate)
+        self.slow_ms = Config.TRACE_SLOW_MS if slow_ms is None else slow_ms
+        self.trace_dir = trace_dir or Config.TRACE_DIR
+        self.max_spans = max_spans or Config.TRACE_MAX_SPANS
+        self._export_logger = None
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.kept = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._tag_response)
+        app.teardown_request(self._end_request)
+
+    # Span API
+
+    @contextmanager
+    def span(self, name, kind=KIND_INTERNAL, **attributes):
+        """Record a child span of the current span; a no-op outside a traced request"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        span = self._open(trace, name, kind, attributes)
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+
+    def _open(self, trace, name, kind, attributes):
+        if len(trace.spans) >= self.max_spans:
+            trace.dropped += 1
+            return None
+        parent = _current_span.get()
+        span = Span(name, parent.span_id if parent else None, kind, attributes)
+        trace.spans.append(span)
+        return span
+
+    def current_trace_id(self):
+        trace = _current_trace.get()
+        return trace.trace_id if trace else None
+
+    # Request lifecycle
+
+    def _start_request(self):
+        if not self.enabled:
+            return
+        trace_id, parent_id = None, None
+        match = TRACEPARENT.match(request.headers.get('traceparent', ''))
+        if match:
+            trace_id, parent_id = match.groups()
+
+        trace = Trace(trace_id)
+        # Path only: query strings may carry tokens (the event stream's ?token=)
+        route = request.url_rule.rule if request.url_rule else None
+        root = Span(f"{request.method} {route or request.path}", parent_id, KIND_SERVER,
+                    {'http.method': request.method, 'http.target': request.path,
+                     'http.route': route})
+        trace.spans.append(root)
+        g.trace_tokens = (_current_trace.set(trace), _current_span.set(root))
+        g.trace_root = root
+
+    def _tag_response(self, response):
+        root = g.get('trace_root')
+        if root is not None:
+            root.attributes['http.status_code'] = response.status_code
+            response.headers['X-Trace-Id'] = _current_trace.get().trace_id
+        return response
+
+    def _end_request(self, exc):
+        tokens = g.pop('trace_tokens', None)
+        root = g.pop('trace_root', None)
+        if tokens is None:
+            return
+        trace = _current_trace.get()
+        _current_span.reset(tokens[1])
+        _current_trace.reset(tokens[0])
+
+        root.end()
+        if exc is not None:
+            root.error = repr(exc)
+        duration_ms = (root.end_ns - root.start_ns) / 1e6
+        failed = (root.error is not None
+                  or root.attributes.get('http.status_code', 200) >= 500)
+        slow = duration_ms >= self.slow_ms
+        if failed or slow or random.random() < self.sample_rate:
+            root.attributes['taps.sampled_reason'] = (
+                'error' if failed else 'slow' if slow else 'rate')
+            self.export(trace)
+        else:
+            self.dropped += 1
+
+    # Export
+
+    def to_otlp(self, trace):
+        spans = []
+        for span in trace.spans:
+            record = {
+                'traceId': trace.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': span.kind,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                'attributes': _otlp_attributes(span.attributes),
+                'status': ({'code': 2, 'message': span.error} if span.error
+                           else {'code': 0})
+            }
+            if span.parent_id:
+                record['parentSpanId'] = span.parent_id
+            spans.append(record)
+        resource = {'service.name': 'taps-backend', 'process.pid': os.getpid()}
+        if trace.dropped:
+            resource['taps.dropped_spans'] = trace.dropped
+        return {'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes(resource)},
+            'scopeSpans': [{'scope': {'name': 'taps.tracing'}, 'spans': spans}]
+        }]}
+
+    def export(self, trace):
+        """Queue a finished trace for the background file writer"""
+        self.kept += 1
+        self._get_export_logger().info(json.dumps(self.to_otlp(trace),
+                                                  separators=(',', ':')))
+
+    def _get_export_logger(self):
+        # One file and listener thread per gunicorn worker, so rotation never races
+        # another process
+        with self._lock:
+            if self._export_logger is None or self._pid != os.getpid():
+                os.makedirs(self.trace_dir, exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    os.path.join(self.trace_dir, f'traces.{os.getpid()}.jsonl'),
+                    maxBytes=Config.TRACE_FILE_MAX_BYTES,
+                    backupCount=Config.TRACE_FILE_BACKUPS)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                trace_queue = queue.Queue(maxsize=10000)
+                self._listener = logging.handlers.QueueListener(trace_queue, handler)
+                self._listener.start()
+
+                export_logger = logging.getLogger(f'taps.traces.{os.getpid()}')
+                export_logger.propagate = False
+                export_logger.setLevel(logging.INFO)
+                export_logger.handlers = [logging.handlers.QueueHandler(trace_queue)]
+                self._export_logger = export_logger
+                self._pid = os.getpid()
+            return self._export_logger
+
+    def flush(self):
+        """Write out queued traces (stops and restarts the listener)"""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                self._listener.start()
+
+# Global instance
+tracer = Tracer()
+
+# SQL spans: one client span per statement, carrying the statement text (never
+# parameters)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _sql_span_start(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    span = tracer._open(trace, 'db.query', KIND_CLIENT, {
+        'db.system': conn.dialect.name,
+        'db.statement': statement[:Config.TRACE_SQL_MAX_LENGTH],
+        'db.executemany': executemany
+    })
+    conn.info.setdefault('taps_sql_spans', []).append(span)
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _sql_span_end(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('taps_sql_spans')
+    if spans:
+        span = spans.pop()
+        if span is not None:
+            span.end()
+
+@event.listens_for(Engine, 'handle_error')
+def _sql_span_error(context):
+    spans = (context.connection.info.get('taps_sql_spans')
+             if context.connection is not None else None)
+    if spans:
+        span = spans.pop()
+        if span is not None:
+            span.error = repr(context.original_exception)
+            span.end()
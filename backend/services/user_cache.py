@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from config import Config
+from models import db, User
+
+class UserCache:
+    """Small per-worker TTL cache of user records (serialized with User.to_dict).
+
+    Entries are dropped as soon as this worker updates or deletes the user;
+    the TTL bounds how long another worker's change can go unnoticed.
+    """
+
+    def __init__(self, ttl=None, maxsize=None):
+        self.ttl = Config.USER_CACHE_TTL if ttl is None else ttl
+        self.maxsize = maxsize or Config.USER_CACHE_MAXSIZE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Return a copy of the user's dict, loading it by primary key on a miss"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return dict(entry[1])
+            self.misses += 1
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        data = user.to_dict()
+
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, data)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return dict(data)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Global instance
+user_cache = UserCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_write(mapper, connection, target):
+    # Drop now, and again after commit so a read between flush and commit cannot
+    # re-cache stale data
+    user_cache.invalidate(target.id)
+    object_session(target).info.setdefault('invalidate_users', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop('invalidate_users', ()):
+        user_cache.invalidate(user_id)
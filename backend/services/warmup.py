@@ -0,0 +1,122 @@
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from flask import jsonify
+from sqlalchemy import text
+from config import Config
+from models import db, Prediction
+from services.prediction_service import prediction_service
+from services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Used when the sample CSV is not shipped (e.g. the backend-only Docker image)
+FALLBACK_SAMPLES = [
+    {'Gender': 0, 'Hemoglobin': 12.9, 'MCH': 32.6, 'MCHC': 35.5, 'MCV': 92.1},
+    {'Gender': 0, 'Hemoglobin': 9.1, 'MCH': 24.2, 'MCHC': 31.2, 'MCV': 76.8},
+    {'Gender': 1, 'Hemoglobin': 13.2, 'MCH': 30.7, 'MCHC': 34.8, 'MCV': 88.2}
+]
+
+class WarmupState:
+    """Readiness of one app instance; ready once warm-up has finished"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.started_at = None
+        self.finished_at = None
+        self.steps = {}
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'ready': self.ready.is_set(),
+            'duration_ms': ((self.finished_at - self.started_at) * 1000.0
+                            if self.finished_at else None),
+            'steps_ms': self.steps,
+            'error': self.error
+        }
+
+def load_samples(path=None):
+    """Read warm-up feature rows from the sample CSV"""
+    path = path or Config.WARMUP_SAMPLE_PATH
+    if not os.path.exists(path):
+        return FALLBACK_SAMPLES
+
+    samples = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            samples.append({
+                'Gender': int(row['Gender']),
+                'Hemoglobin': float(row['Hemoglobin']),
+                'MCH': float(row['MCH']),
+                'MCHC': float(row['MCHC']),
+                'MCV': float(row['MCV'])
+            })
+    return samples or FALLBACK_SAMPLES
+
+def run_warmup(app, state):
+    """Push synthetic traffic through every enabled path of this worker"""
+    state.started_at = time.monotonic()
+
+    def step(name, func):
+        started = time.monotonic()
+        func()
+        state.steps[name] = (time.monotonic() - started) * 1000.0
+
+    try:
+        samples = load_samples()
+
+        # Let the registry finish its first load so model tracing happens here
+        step('model_load',
+             lambda: model_registry.wait_until_loaded(Config.WARMUP_MODEL_TIMEOUT))
+
+        # Scoring, explanations and chart rendering (first kaleido call starts its
+        # browser)
+        results = []
+        step('predict', lambda: results.extend(
+            prediction_service.predict(dict(s), track=False) for s in samples))
+
+        if model_registry.current() is not None:
+            step('model_predict',
+                 lambda: prediction_service.model_predict_batch(samples))
+
+        with app.app_context():
+            step('database', lambda: db.session.execute(text('SELECT 1')))
+
+            def serialize():
+                for features, result in zip(samples, results):
+                    record = Prediction(user_id=0,
+                                        predicted_label=result['predicted_label'],
+                                        predicted_proba=result['predicted_proba'])
+                    record.set_input_features(features)
+                    record.set_explanation(result['explanations'])
+                    json.dumps(record.to_dict())
+                with app.test_request_context():
+                    jsonify(results[0])
+            step('serialize', serialize)
+            db.session.remove()
+    except Exception as e:
+        # A failed warm-up must not keep the worker out of rotation forever
+        state.error = str(e)
+        logger.error(f"Warm-up failed: {e}")
+    finally:
+        state.finished_at = time.monotonic()
+        state.ready.set()
+        duration_ms = (state.finished_at - state.started_at) * 1000.0
+        logger.info(f"Warm-up finished in {duration_ms:.0f}ms")
+
+def start_warmup(app):
+    """Attach a readiness state to the app and warm it up in the background"""
+    state = WarmupState()
+    app.extensions['warmup'] = state
+
+    if not Config.WARMUP_ENABLED:
+        state.ready.set()
+        return state
+
+    threading.Thread(target=run_warmup, args=(app, state), name='warmup',
+                     daemon=True).start()
+    return state
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import glob
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+def instance_pid(key):
+    """Process id part of a ``<pid>-<token>`` snapshot key"""
+    return int(str(key).split('-', 1)[0])
+
+class WorkerStateStore:
+    """Share small per-worker state snapshots through a local directory.
+
+    Every gunicorn worker writes its own ``<name>.<pid>-<token>.json`` file and
+    any worker can read all of them back to merge a cluster-wide view. The
+    random token is drawn once per process, so a reused pid never overwrites
+    an earlier process's snapshot. With a ``ttl``, snapshots that have not been
+    rewritten for that many seconds (those of stopped workers and earlier
+    deployments) are deleted when the store is read.
+    """
+
+    def __init__(self, directory, name, ttl=None):
+        self.directory = directory
+        self.name = name
+        self.ttl = ttl
+        self._instance = None
+
+    def instance_id(self):
+        pid = os.getpid()
+        if self._instance is None or instance_pid(self._instance) != pid:
+            self._instance = f"{pid}-{uuid.uuid4().hex[:8]}"
+        return self._instance
+
+    def _path(self):
+        return os.path.join(self.directory, f"{self.name}.{self.instance_id()}.json")
+
+    def _epoch_path(self):
+        return os.path.join(self.directory, f"{self.name}.epoch")
+
+    def save(self, state):
+        """Atomically write this worker's snapshot"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path()
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save {self.name} worker state: {e}")
+
+    def load_all(self):
+        """Return the snapshots of all workers, keyed by ``<pid>-<token>``"""
+        states = {}
+        cutoff = time.time() - self.ttl if self.ttl else None
+        for path in glob.glob(os.path.join(self.directory, f"{self.name}.*.json")):
+            key = path[:-len('.json')].rsplit('.', 1)[-1]
+            try:
+                if cutoff is not None and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    states[key] = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable worker state {path}: {e}")
+        return states
+
+    def epoch(self):
+        """Time of the last clear() by any worker (0.0 if never cleared)"""
+        try:
+            return os.path.getmtime(self._epoch_path())
+        except OSError:
+            return 0.0
+
+    def clear(self):
+        """Remove all snapshots for this store and tell other workers to drop
+        their local state"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._epoch_path(), 'w') as f:
+                f.write(str(time.time()))
+        except OSError as e:
+            logger.warning(f"Could not mark {self.name} worker state as cleared: {e}")
+        for path in glob.glob(os.path.join(self.directory, f"{self.name}.*.json")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
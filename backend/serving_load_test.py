@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from services.rule_sets import FEATURE_COLUMNS
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, '..', 'sample_data', 'sample_input.csv')
+
+def load_samples(path):
+    with open(path, newline='') as f:
+        return [{name: float(record[name]) for name in FEATURE_COLUMNS}
+                for record in csv.DictReader(f)]
+
+def call(base_url, method, path, body=None, token=None, timeout=60):
+    """Send a JSON request; returns (status, parsed body or None)"""
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, headers=headers,
+                                     method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+def start_server(mode, port, env, workers, threads):
+    """Start gunicorn for a '<worker class>[:<prediction write mode>]' spec and wait
+    until ready"""
+    worker_class, _, write_mode = mode.partition(':')
+    server_env = dict(env, GUNICORN_BIND=f'127.0.0.1:{port}',
+                      GUNICORN_WORKER_CLASS=worker_class,
+                      GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads))
+    if write_mode:
+        server_env['PREDICTION_WRITE_MODE'] = write_mode
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn',
+                                '-c', 'gunicorn.conf.py', 'app:create_app()'],
+                               cwd=BACKEND_DIR, env=server_env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}/api'
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'gunicorn ({mode}) exited with code {process.returncode}')
+        try:
+            if call(base_url, 'GET', '/health/ready', timeout=2)[0] == 200:
+                return process, base_url
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f'gunicorn ({mode}) did not become ready')
+
+def patient_token(base_url):
+    """Register a throwaway doctor and patient; return the patient's access token"""
+    suffix = uuid.uuid4().hex[:8]
+    _, doctor = call(base_url, 'POST', '/auth/register-doctor', {
+        'name': 'Load Test Doctor', 'email': f'doctor-{suffix}@loadtest.local',
+        'password': 'loadtest123', 'hospital': 'Load Test Hospital'})
+    _, patient = call(base_url, 'POST', '/doctor/register-patient', {
+        'patient_name': 'Load Test Patient',
+        'patient_email': f'patient-{suffix}@loadtest.local', 'gender': 1},
+        token=doctor['access_token'])
+    _, login = call(base_url, 'POST', '/auth/login', {
+        'email': f'patient-{suffix}@loadtest.local',
+        'password': patient['temporary_password']})
+    return login['access_token']
+
+def run_load(base_url, token, samples, clients, duration):
+    """Closed-loop load: each client sends its next /predict as soon as the last one
+    returns"""
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        latencies, errors, sent = [], 0, index
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _ = call(base_url, 'POST', '/patients/predict',
+                                 samples[sent % len(samples)], token)
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            errors += status != 200
+            sent += 1
+        return latencies, errors
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, range(clients)))
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(l for result, _ in results for l in result)
+    pct = lambda p: (latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+                     * 1000.0 if latencies else 0.0)
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99)
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare /predict throughput of gunicorn worker modes')
+    parser.add_argument('--modes', nargs='+', default=['sync:sync', 'gthread:group'],
+                        help='<worker class>[:<PREDICTION_WRITE_MODE>] specs; '
+                             'the first is the baseline')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Threads per gthread worker')
+    parser.add_argument('--render-pool-workers', type=int, default=0,
+                        help='RENDER_POOL_WORKERS for the server')
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=20.0,
+                        help='Seconds of load per mode')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES,
+                        help='CSV of lab values to send')
+    parser.add_argument('--json', dest='json_path',
+                        help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    workdir = tempfile.mkdtemp(prefix='taps_load_')
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'load.db')}",
+               LOCAL_DATA_DIR=workdir,
+               RENDER_POOL_WORKERS=str(args.render_pool_workers))
+
+    # Create the schema once; every mode writes to the same fresh database
+    subprocess.run([sys.executable, '-c',
+                    'from app import create_app; from models import db; '
+                    'app = create_app(); app.app_context().push(); db.create_all()'],
+                   cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    results = {}
+    for mode in args.modes:
+        process, base_url = start_server(mode, args.port, env, args.workers,
+                                         args.threads)
+        try:
+            token = patient_token(base_url)
+            # Warm connections and caches
+            run_load(base_url, token, samples, args.clients, min(3.0, args.duration))
+            results[mode] = run_load(base_url, token, samples, args.clients,
+                                     args.duration)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        r = results[mode]
+        print(f"{mode:>14}: {r['throughput_rps']:8.1f} req/s  "
+              f"p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms  "
+              f"p99 {r['p99_ms']:7.1f} ms  "
+              f"({r['requests']} requests, {r['errors']} errors)")
+
+    if len(results) > 1:
+        baseline = results[args.modes[0]]['throughput_rps']
+        for mode in args.modes[1:]:
+            ratio = results[mode]['throughput_rps'] / baseline
+            print(f"{mode} vs {args.modes[0]}: {ratio:.2f}x throughput")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
@@ -1,10 +1,14 @@
 import pytest
+import gzip
 import json
 import os
 import tempfile
+import time
 from app import create_app
-from models import db, User, Prediction, Prescription
+from models import db, User, Prediction, Prescription, LabTrend
 from config import Config
+from services.user_cache import user_cache
+from services.dashboard_cache import dashboard_cache
 
 class TestConfig(Config):
     TESTING = True
@@ -12,6 +16,23 @@ class TestConfig(Config):
     JWT_SECRET_KEY = 'test-jwt-secret'
     SECRET_KEY = 'test-secret'
 
+@pytest.fixture(scope='session', autouse=True)
+def local_output_dirs(tmp_path_factory):
+    """Write request traces and profiles under pytest's tmp dir, not
+    backend/instance"""
+    from services.tracing import tracer
+    from services.profiling import request_profiler
+
+    trace_dir = str(tmp_path_factory.mktemp('traces'))
+    profile_dir = str(tmp_path_factory.mktemp('profiles'))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(TestConfig, 'TRACE_DIR', trace_dir)
+        mp.setattr(TestConfig, 'PROFILE_DIR', profile_dir)
+        # The global instances read their directory once, at import time
+        mp.setattr(tracer, 'trace_dir', trace_dir)
+        mp.setattr(request_profiler, 'profile_dir', profile_dir)
+        yield
+
 @pytest.fixture
 def app():
     app = create_app()
@@ -21,6 +42,9 @@ def app():
         db.create_all()
         yield app
         db.drop_all()
+    # Ids are reused after drop_all, so cached records must not outlive the test
+    user_cache.clear()
+    dashboard_cache.clear()
 
 @pytest.fixture
 def client(app):
@@ -202,5 +226,1002 @@ def test_view_prescriptions(client, auth_headers):
     assert response.status_code == 200
     assert len(response.json['prescriptions']) >= 1
 
+def test_drift_sketch_merge_and_report(tmp_path):
+    """Test drift sketches merge across workers and report PSI/KS"""
+    from services.drift_monitor import DriftMonitor, FeatureSketch
+
+    a = FeatureSketch(3.0, 25.0, 40)
+    b = FeatureSketch(3.0, 25.0, 40)
+    for value in [10.0, 12.0, 14.0]:
+        a.update(value)
+    for value in [11.0, 13.0]:
+        b.update(value)
+    a.merge(b)
+
+    assert a.count == 5
+    assert abs(a.mean - 12.0) < 1e-9
+    assert abs(a.std - (2.5 ** 0.5)) < 1e-9
+
+    monitor = DriftMonitor(state_dir=str(tmp_path), flush_interval=0)
+    monitor.update({'Gender': 0, 'Hemoglobin': 12.5, 'MCH': 28.0, 'MCHC': 33.5,
+                    'MCV': 85.0})
+    report = monitor.report()
+
+    assert report['features']['Hemoglobin']['count'] == 1
+    assert report['features']['Hemoglobin']['psi'] is not None
+    assert 0.0 <= report['features']['MCV']['ks'] <= 1.0
+
+    # A stale snapshot (stopped worker) is pruned; a reset on one worker clears
+    # the others
+    stale = tmp_path / 'drift.1-dead.json'
+    sketch = monitor.sketches['Hemoglobin'].to_dict()
+    stale.write_text(json.dumps({'Hemoglobin': sketch}))
+    os.utime(stale, (0, 0))
+    other = DriftMonitor(state_dir=str(tmp_path), flush_interval=0)
+    other.update({'Gender': 1, 'Hemoglobin': 14.0, 'MCH': 29.0, 'MCHC': 34.0,
+                  'MCV': 88.0})
+    assert monitor.report()['features']['Hemoglobin']['count'] == 2
+    assert not stale.exists()
+    monitor.reset()
+    other.flush()
+    assert monitor.report()['features']['Hemoglobin']['count'] == 0
+
+def test_drift_endpoint(client, auth_headers, monkeypatch):
+    """Test drift report endpoint"""
+    response = client.get('/api/monitoring/drift', headers=auth_headers['doctor'])
+
+    assert response.status_code == 200
+    assert set(response.json['features']) == {'Hemoglobin', 'MCH', 'MCHC', 'MCV'}
+    response = client.get('/api/monitoring/drift', headers=auth_headers['patient'])
+    assert response.status_code == 403
+    response = client.post('/api/monitoring/drift/reset',
+                           headers=auth_headers['doctor'])
+    assert response.status_code == 403
+    assert response.json['error'] == 'Monitoring admin access required'
+
+    monkeypatch.setattr(Config, 'MONITORING_ADMIN_ROLES', ['doctor'])
+    response = client.post('/api/monitoring/drift/reset',
+                           headers=auth_headers['doctor'])
+    assert response.status_code == 200
+
+def test_rule_set_batch_matches_single_row():
+    """Test the vectorized rule set evaluator agrees with the per-request path"""
+    import csv
+    from services.rule_sets import rule_set_registry, features_to_matrix
+
+    sample_path = os.path.join(os.path.dirname(__file__), '..', '..', 'sample_data',
+                               'sample_input.csv')
+    with open(sample_path) as f:
+        rows = [{k: float(v) for k, v in row.items()} for row in csv.DictReader(f)]
+
+    rule_set = rule_set_registry.get('v1')
+    _, probabilities, labels = rule_set.score_batch(features_to_matrix(rows))
+
+    for row, probability, label in zip(rows, probabilities, labels):
+        _, expected_probability, expected_label = rule_set.evaluate(row)
+        assert abs(probability - expected_probability) < 1e-12
+        assert label == expected_label
+
+def test_rescore_predictions(client, auth_headers):
+    """Test bulk re-scoring tags stored predictions with the rule set version"""
+    from services.rescoring import rescore_predictions
+
+    prediction_data = {'Gender': 0, 'Hemoglobin': 9.0, 'MCH': 24.0, 'MCHC': 30.0,
+                       'MCV': 72.0}
+    client.post('/api/patients/predict',
+               data=json.dumps(prediction_data),
+               content_type='application/json',
+               headers=auth_headers['patient'])
+    Prediction.query.update({'rule_set_version': None, 'predicted_proba': 0.0})
+    db.session.commit()
+
+    summary = rescore_predictions('v1', chunk_size=1)
+
+    assert summary['updated'] >= 1
+    prediction = Prediction.query.order_by(Prediction.id.desc()).first()
+    assert prediction.rule_set_version == 'v1'
+    assert prediction.predicted_label == 1
+    assert prediction.predicted_proba > 0.5
+    assert prediction.model_version == 'rules-v1'
+
+    # Rows scored by a registry model are not rewritten with rule-engine scores
+    prediction.model_version = '20260101-abc'
+    prediction.rule_set_version = None
+    prediction.predicted_proba = 0.2
+    db.session.commit()
+    assert rescore_predictions('v1')['updated'] == 0
+    db.session.expire_all()
+    prediction = db.session.get(Prediction, prediction.id)
+    assert prediction.model_version == '20260101-abc'
+    assert prediction.predicted_proba == 0.2
+
+def test_rescore_predictions_includes_legacy_rows(client, auth_headers):
+    """Test rows written before model_version existed are re-scored"""
+    from services.rescoring import rescore_predictions
+
+    prediction_data = {'Gender': 0, 'Hemoglobin': 9.0, 'MCH': 24.0, 'MCHC': 30.0,
+                       'MCV': 72.0}
+    client.post('/api/patients/predict',
+               data=json.dumps(prediction_data),
+               content_type='application/json',
+               headers=auth_headers['patient'])
+    Prediction.query.update({'model_version': None, 'rule_set_version': None,
+                             'predicted_proba': 0.0})
+    db.session.commit()
+
+    summary = rescore_predictions('v1')
+
+    assert summary['scanned'] >= 1
+    assert summary['updated'] == summary['scanned']
+    prediction = Prediction.query.order_by(Prediction.id.desc()).first()
+    assert prediction.predicted_proba > 0.5
+    assert prediction.rule_set_version == 'v1'
+    assert prediction.model_version == 'rules-v1'
+
+def test_shadow_scorer_records_agreement(tmp_path):
+    """Test shadow scoring runs off the request path and summarizes agreement"""
+    from services.shadow_scoring import ShadowScorer
+
+    scorer = ShadowScorer(db_path=str(tmp_path / 'shadow.db'), enabled=True,
+                          batch_wait=0.01)
+    scorer.set_secondary(
+        lambda rows: [0.9 if row['Hemoglobin'] < 12 else 0.1 for row in rows], 'stub')
+
+    scorer.submit({'Hemoglobin': 9.0},
+                  {'predicted_label': 1, 'predicted_proba': 0.95}, 1.5)
+    scorer.submit({'Hemoglobin': 14.0},
+                  {'predicted_label': 1, 'predicted_proba': 0.6}, 2.5)
+    assert scorer.wait_idle(timeout=5)
+
+    summary = scorer.summary()
+    assert summary['samples'] == 2
+    assert summary['agreement_rate'] == 0.5
+    assert summary['disagreements']['primary_positive_only'] == 1
+    assert summary['latency_ms']['primary']['p50'] is not None
+
+    scorer.max_rows = 3
+    for hemoglobin in (8.0, 9.0, 10.0, 15.0):
+        scorer.submit({'Hemoglobin': hemoglobin},
+                      {'predicted_label': 1, 'predicted_proba': 0.9}, 1.0)
+    assert scorer.wait_idle(timeout=5)
+    assert scorer.summary()['samples'] == 3
+
+    # Samples scored by a previous secondary model are left out of the summary
+    scorer.set_secondary(lambda rows: [0.9 for _ in rows], 'stub-v2')
+    scorer.submit({'Hemoglobin': 14.0},
+                  {'predicted_label': 0, 'predicted_proba': 0.2}, 1.0)
+    assert scorer.wait_idle(timeout=5)
+    summary = scorer.summary()
+    assert summary['secondary_model'] == 'stub-v2'
+    assert summary['samples'] == 1
+    assert summary['agreement_rate'] == 0.0
+
+def test_model_registry_versions(tmp_path):
+    """Test model registration records checksums and activation is validated"""
+    from services.model_registry import ModelRegistry, file_sha256
+
+    model_file = tmp_path / 'model.h5'
+    model_file.write_bytes(b'fake model weights')
+    registry = ModelRegistry(directory=str(tmp_path / 'registry'))
+
+    entry = registry.register(str(model_file), 'v1')
+    assert entry['sha256'] == file_sha256(str(model_file))
+    assert registry.read_manifest()['active'] is None
+
+    registry.activate('v1')
+    assert registry.read_manifest()['active'] == 'v1'
+    with pytest.raises(ValueError):
+        registry.activate('v2')
+    with pytest.raises(ValueError):
+        registry.register(str(model_file), 'v1')
+
+def test_prediction_records_model_version(client, auth_headers):
+    """Test saved predictions are tagged with the scorer version"""
+    prediction_data = {'Gender': 1, 'Hemoglobin': 14.5, 'MCH': 30.0, 'MCHC': 34.0,
+                       'MCV': 88.0}
+
+    response = client.post('/api/patients/predict',
+                          data=json.dumps(prediction_data),
+                          content_type='application/json',
+                          headers=auth_headers['patient'])
+
+    assert response.status_code == 200
+    assert response.json['model_version'] == 'rules-v1'
+    prediction = db.session.get(Prediction, response.json['saved_prediction_id'])
+    assert prediction.model_version == 'rules-v1'
+
+    # A registry model's score carries its version and no rule set version
+    from types import SimpleNamespace
+    import numpy as np
+    from services.prediction_service import prediction_service
+    model = SimpleNamespace(predict=lambda matrix, verbose=0: np.array([[0.2]]))
+    active = SimpleNamespace(version='20260101-abc', model=model)
+    result = prediction_service._model_prediction(dict(prediction_data), active,
+                                                  render=False)
+    assert result['model_version'] == '20260101-abc'
+    assert result['rule_set_version'] is None
+    assert result['predicted_proba'] == 0.2
+
+def test_readiness_after_warmup(app, client):
+    """Test readiness flips to true once warm-up has finished"""
+    assert app.extensions['warmup'].ready.wait(timeout=30)
+
+    response = client.get('/api/health/ready')
+    assert response.status_code == 200
+    assert response.json['ready'] is True
+
+    response = client.get('/api/health')
+    assert response.json['ready'] is True
+    assert 'predict' in response.json['warmup']['steps_ms']
+
+def test_group_commit_writer(app, client, auth_headers):
+    """Test buffered predictions are group-committed and acknowledged with ids"""
+    import threading
+    from services.prediction_writer import PredictionWriter
+
+    patient = User.query.filter_by(role='user').first()
+    writer = PredictionWriter(mode='group')
+    writer.init_app(app)
+    result = {'predicted_label': 1, 'predicted_proba': 0.8, 'explanations': {}}
+    features = {'Gender': 0, 'Hemoglobin': 9.0, 'MCH': 24.0, 'MCHC': 30.0, 'MCV': 72.0}
+
+    ids = []
+    def save():
+        ids.append(writer.save(patient.id, features, result))
+
+    threads = [threading.Thread(target=save) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+
+    assert len(ids) == 20 and None not in ids
+    assert len(set(ids)) == 20
+    assert writer.stats()['rows_written'] == 20
+    assert writer.stats()['batches'] < 20
+    assert Prediction.query.filter(Prediction.id.in_(ids)).count() == 20
+
+    # A stalled writer: the request gives up on the buffer and writes its row
+    # once, directly
+    writer.write_timeout = 0.2
+    before = Prediction.query.count()
+    with writer._flush_lock:
+        prediction_id = writer.save(patient.id, features, result)
+    assert prediction_id is not None
+    time.sleep(0.2)
+    assert Prediction.query.count() == before + 1
+
+def test_bulk_prediction_job(client, auth_headers, tmp_path, monkeypatch):
+    """Test submitting a CSV job, processing it and polling results"""
+    import io
+    from routes import jobs
+    from services.job_queue import JobQueue, process_next
+
+    queue = JobQueue(db_path=str(tmp_path / 'jobs.db'),
+                     results_dir=str(tmp_path / 'results'), chunk_size=2)
+    monkeypatch.setattr(jobs, 'job_queue', queue)
+
+    csv_data = (b'Gender,Hemoglobin,MCH,MCHC,MCV\n'
+                b'0,9.1,24.2,31.2,76.8\n'
+                b'1,14.5,30.0,34.0,88.0\n'
+                b'1,abc,30.0,34.0,88.0\n')
+    response = client.post('/api/jobs',
+                          data={'file': (io.BytesIO(csv_data), 'labs.csv')},
+                          content_type='multipart/form-data',
+                          headers=auth_headers['doctor'])
+    assert response.status_code == 202
+    job_id = response.json['job_id']
+    assert response.json['job']['total_chunks'] == 2
+
+    while process_next(queue):
+        pass
+
+    response = client.get(f'/api/jobs/{job_id}', headers=auth_headers['doctor'])
+    assert response.json['job']['status'] == 'completed'
+    assert response.json['job']['progress'] == 1.0
+
+    response = client.get(f'/api/jobs/{job_id}/results', headers=auth_headers['doctor'])
+    results = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r['row'] for r in results] == [0, 1, 2]
+    assert results[0]['predicted_label'] == 1
+    assert results[1]['predicted_label'] == 0
+    assert 'error' in results[2]
+
+    response = client.get(f'/api/jobs/{job_id}', headers=auth_headers['patient'])
+    assert response.status_code == 404
+
+    # Jobs over stored labs are limited to the requesting doctor's own patients
+    patient = User.query.filter_by(email='testpatient@test.com').one()
+    attempts = [(auth_headers['patient'], [patient.id], 403),
+                (auth_headers['doctor'], [patient.id, 9999], 403),
+                (auth_headers['doctor'], [patient.id], 202)]
+    for headers, patient_ids, status in attempts:
+        response = client.post('/api/jobs',
+                               data=json.dumps({'patient_ids': patient_ids}),
+                               content_type='application/json', headers=headers)
+        assert response.status_code == status
+
+    response = client.post('/api/jobs', data=json.dumps([patient.id]),
+                           content_type='application/json',
+                           headers=auth_headers['doctor'])
+    assert response.status_code == 400
+
+def test_job_chunk_fails_after_expired_leases(tmp_path):
+    """Test a chunk whose worker keeps dying is failed at JOB_MAX_ATTEMPTS"""
+    from services.job_queue import JobQueue
+
+    queue = JobQueue(db_path=str(tmp_path / 'jobs.db'),
+                     results_dir=str(tmp_path / 'results'), chunk_size=2)
+    job_id = queue.submit([{'row': 0, 'features': {}}], source='test')
+
+    # A negative lease expires immediately, as if the worker had crashed
+    for _ in range(TestConfig.JOB_MAX_ATTEMPTS):
+        assert queue.claim(lease_seconds=-1)['job_id'] == job_id
+    assert queue.claim(lease_seconds=-1) is None
+
+    job = queue.get(job_id)
+    assert job['status'] == 'completed_with_errors'
+    assert job['failed_chunks'] == 1
+    assert job['progress'] == 1.0
+
+def test_batch_score_file(tmp_path):
+    """Test offline batch scoring writes one result per input row in order"""
+    import csv
+    from batch_score import score_file
+
+    input_path = tmp_path / 'labs.csv'
+    with open(input_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['patient', 'Gender', 'Hemoglobin', 'MCH', 'MCHC', 'MCV'])
+        for i in range(25):
+            writer.writerow([f'p{i}', i % 2, 8.0 + i * 0.3, 27.0, 33.0, 85.0])
+        writer.writerow(['bad', 1, 99.0, 27.0, 33.0, 85.0])
+
+    output_path = tmp_path / 'scores.csv'
+    summary = score_file(str(input_path), str(output_path), chunk_size=10, workers=2,
+                         id_column='patient')
+
+    assert summary['rows'] == 26
+    assert summary['errors'] == 1
+    with open(output_path) as f:
+        results = list(csv.DictReader(f))
+    assert [r['row'] for r in results] == [str(i) for i in range(26)]
+    assert results[0]['id'] == 'p0' and results[0]['predicted_label'] == '1'
+    assert results[-1]['error']
+
+def test_bulk_patient_registration(client, auth_headers, monkeypatch):
+    """Test bulk onboarding validates all rows and reports per-row results"""
+    import io
+    monkeypatch.setattr(Config, 'BULK_ONBOARDING_POOL_THRESHOLD', 1)
+
+    csv_data = (b'patient_name,patient_email,dob,gender\n'
+                b'Alice,alice@test.com,1990-05-01,0\n'
+                b'Bob,testpatient@test.com,,1\n'
+                b'Alice Again,ALICE@test.com,,0\n'
+                b'Carol,carol@test.com,05/01/1990,0\n')
+    response = client.post('/api/doctor/register-patients/bulk',
+                          data={'file': (io.BytesIO(csv_data), 'patients.csv')},
+                          content_type='multipart/form-data',
+                          headers=auth_headers['doctor'])
+
+    assert response.status_code == 201
+    assert response.json['created'] == 1
+    results = response.json['results']
+    assert results[0]['status'] == 'created' and results[0]['temporary_password']
+    assert results[1]['errors'] == ['Email already registered']
+    assert results[2]['errors'] == ['Duplicate email in file']
+    assert results[3]['status'] == 'error'
+
+    login = client.post('/api/auth/login',
+                       data=json.dumps({'email': 'alice@test.com',
+                                        'password': results[0]['temporary_password']}),
+                       content_type='application/json')
+    assert login.status_code == 200
+
+    response = client.post('/api/doctor/register-patients/bulk',
+                          data={'file': (io.BytesIO(csv_data), 'patients.csv')},
+                          content_type='multipart/form-data',
+                          headers=auth_headers['patient'])
+    assert response.status_code == 403
+
+def test_identity_cache_and_role_claim(client, auth_headers):
+    """Test cached identity is invalidated on update and roles come from the JWT"""
+    response = client.get('/api/auth/profile', headers=auth_headers['patient'])
+    assert response.json['user']['name'] == 'Test Patient'
+
+    patient = User.query.filter_by(email='testpatient@test.com').first()
+    patient.name = 'Renamed Patient'
+    db.session.commit()
+
+    response = client.get('/api/auth/profile', headers=auth_headers['patient'])
+    assert response.json['user']['name'] == 'Renamed Patient'
+
+    doctor = User.query.filter_by(role='doctor').first()
+    response = client.get(f'/api/patients/{doctor.id}/prescriptions',
+                          headers=auth_headers['patient'])
+    assert response.status_code == 403
+    response = client.get(f'/api/patients/{patient.id}/prescriptions',
+                          headers=auth_headers['doctor'])
+    assert response.status_code == 200
+
+def test_dashboard_cache_invalidation(client, auth_headers):
+    """Test the cached dashboard is refreshed by new predictions and prescriptions"""
+    response = client.get('/api/patients/dashboard', headers=auth_headers['patient'])
+    assert response.status_code == 200
+    assert response.json['total_predictions'] == 0
+    assert response.json['doctor']['name'] == 'Test Doctor'
+
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    for _ in range(6):
+        client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                    content_type='application/json', headers=auth_headers['patient'])
+
+    patient_id = User.query.filter_by(email='testpatient@test.com').first().id
+    client.post(f'/api/doctor/patients/{patient_id}/prescriptions',
+                data=json.dumps({'title': 'Iron supplement'}),
+                content_type='application/json', headers=auth_headers['doctor'])
+
+    hits = dashboard_cache.hits
+    response = client.get('/api/patients/dashboard', headers=auth_headers['patient'])
+    assert response.json['total_predictions'] == 6
+    assert len(response.json['recent_predictions']) == 5
+    assert response.json['active_prescriptions'][0]['title'] == 'Iron supplement'
+
+    response = client.get('/api/patients/dashboard', headers=auth_headers['patient'])
+    assert response.json['total_predictions'] == 6
+    assert dashboard_cache.hits == hits + 1
+
+    # A write from another worker or a bulk job fires none of this worker's events
+    from sqlalchemy import insert
+    prediction = Prediction.query.filter_by(user_id=patient_id).first()
+    db.session.execute(insert(Prediction.__table__).values(
+        user_id=patient_id, input_features=prediction.input_features,
+        predicted_label=0, predicted_proba=0.1))
+    db.session.commit()
+    response = client.get('/api/patients/dashboard', headers=auth_headers['patient'])
+    assert response.json['total_predictions'] == 7
+
+def test_conditional_get_and_compression(client, auth_headers):
+    """Test ETag revalidation returns 304 and large JSON responses are gzipped"""
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                content_type='application/json', headers=auth_headers['patient'])
+
+    for url in ['/api/patients/predictions', '/api/patients/dashboard']:
+        response = client.get(url, headers=auth_headers['patient'])
+        etag = response.headers['ETag']
+        headers = {**auth_headers['patient'], 'If-None-Match': etag}
+        response = client.get(url, headers=headers)
+        assert response.status_code == 304
+        assert response.data == b''
+
+    client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                content_type='application/json', headers=auth_headers['patient'])
+    response = client.get('/api/patients/predictions',
+                          headers={**auth_headers['patient'], 'If-None-Match': etag})
+    assert response.status_code == 200
+
+    response = client.get('/api/patients/predictions',
+                          headers={**auth_headers['patient'],
+                                   'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(json.loads(gzip.decompress(response.data))['predictions']) == 2
+
+def test_etag_changes_when_predictions_are_rewritten(client, auth_headers):
+    """Test compaction rewrites invalidate the history ETag"""
+    from datetime import datetime, timedelta
+    from services.compaction import compact_explanations
+
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                content_type='application/json', headers=auth_headers['patient'])
+    Prediction.query.update({'created_at': datetime.utcnow() - timedelta(days=120)})
+    db.session.commit()
+
+    response = client.get('/api/patients/predictions', headers=auth_headers['patient'])
+    etag = response.headers['ETag']
+    assert compact_explanations(older_than_days=90, pause=0)['compacted'] == 1
+
+    response = client.get('/api/patients/predictions',
+                          headers={**auth_headers['patient'], 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['predictions'][0]['explanation']['visualizations'] == {}
+
+def test_doctor_event_stream(client, auth_headers, monkeypatch):
+    """Test a doctor's SSE stream receives new patient predictions and prescriptions"""
+    from services.event_stream import event_broker
+
+    response = client.post('/api/doctor/events/token', headers=auth_headers['doctor'])
+    token = response.json['token']
+    response = client.get(f'/api/doctor/events?token={token}', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    assert next(stream).startswith(b'retry:')
+
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                content_type='application/json', headers=auth_headers['patient'])
+    patient_id = User.query.filter_by(email='testpatient@test.com').first().id
+    client.post(f'/api/doctor/patients/{patient_id}/prescriptions',
+                data=json.dumps({'title': 'Iron supplement'}),
+                content_type='application/json', headers=auth_headers['doctor'])
+
+    assert b'event: prediction' in next(stream)
+    message = next(stream).decode()
+    assert 'event: prescription' in message
+    assert json.loads(message.split('data: ')[1])['patient_id'] == patient_id
+
+    # Streams beyond the per-worker cap are refused while this one is open
+    monkeypatch.setattr(event_broker, 'max_streams', 1)
+    assert client.get(f'/api/doctor/events?token={token}').status_code == 503
+    response.close()
+
+    # Access tokens are not accepted in the URL, and patients cannot get stream tokens
+    doctor_jwt = auth_headers['doctor']['Authorization'].split()[1]
+    assert client.get(f'/api/doctor/events?jwt={doctor_jwt}').status_code == 401
+    assert client.get(f'/api/doctor/events?token={doctor_jwt}').status_code == 401
+    response = client.post('/api/doctor/events/token', headers=auth_headers['patient'])
+    assert response.status_code == 403
+
+    # With no open stream and the relay off, predictions publish nothing
+    monkeypatch.setattr(event_broker, 'relay', False)
+    assert event_broker.subscriber_count() == 0
+    published = event_broker.published
+    client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                content_type='application/json', headers=auth_headers['patient'])
+    assert event_broker.published == published
+
+def test_admission_sheds_rendering_under_load(client, auth_headers, monkeypatch):
+    """Test a saturated render stage degrades predictions instead of queueing them"""
+    from services.admission import admission, StageLimiter
+
+    limiter = StageLimiter('render', limit=1, queue_size=0, timeout=0.01)
+    monkeypatch.setitem(admission.stages, 'render', limiter)
+    monkeypatch.setattr(admission, 'enabled', True)
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+
+    response = client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                           content_type='application/json',
+                           headers=auth_headers['patient'])
+    assert 'degraded' not in response.json
+    assert response.json['explanations']['visualizations']
+
+    assert limiter.acquire()  # occupy the only render slot
+    response = client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                           content_type='application/json',
+                           headers=auth_headers['patient'])
+    limiter.release()
+    assert response.status_code == 200
+    assert response.json['degraded'] is True
+    assert response.json['explanations']['visualizations'] == {}
+    assert response.json['explanations']['shap']['feature_contributions']
+
+    stats = client.get('/api/monitoring/admission', headers=auth_headers['doctor']).json
+    assert stats['stages']['render']['shed'] == 1
+    assert stats['stages']['render']['admitted'] == 2
+    response = client.get('/api/monitoring/admission', headers=auth_headers['patient'])
+    assert response.status_code == 403
+
+def test_prometheus_stage_metrics(client, auth_headers):
+    """Test prediction stages are timed and exposed in Prometheus text format"""
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                content_type='application/json', headers=auth_headers['patient'])
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE taps_stage_duration_seconds histogram' in body
+    for stage in ['request', 'predict', 'validate', 'score', 'shap', 'render',
+                  'db_write', 'json_encode']:
+        assert f'taps_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert 'taps_stage_duration_seconds_bucket{le="+Inf",stage="predict"}' in body
+    assert 'taps_admission_shed_total{stage="render"}' in body
+
+def test_metrics_prune_stale_worker_snapshots(tmp_path):
+    """Test snapshots of long-gone workers drop out of the merged totals"""
+    from services.metrics import Metrics
+
+    stale = tmp_path / 'metrics.1-dead.json'
+    stale.write_text(json.dumps({'histograms': {}, 'gauges': {},
+                                 'counters': {'taps_predictions_total': 5}}))
+    recent = tmp_path / 'metrics.2-exited.json'
+    recent.write_text(json.dumps({'histograms': {}, 'gauges': {},
+                                  'counters': {'taps_predictions_total': 3}}))
+    os.utime(stale, (0, 0))
+
+    metrics = Metrics(state_dir=str(tmp_path), flush_interval=0, enabled=True,
+                      ttl=3600)
+    _, counters, _ = metrics.merged()
+    assert counters['taps_predictions_total'] == 3
+    assert not stale.exists()
+
+def test_request_trace_export(client, auth_headers, tmp_path, monkeypatch):
+    """Test a sampled request is exported as an OTLP span tree with SQL statements"""
+    from services.tracing import tracer
+
+    monkeypatch.setattr(tracer, 'trace_dir', str(tmp_path))
+    monkeypatch.setattr(tracer, 'sample_rate', 1.0)
+    monkeypatch.setattr(tracer, '_export_logger', None)
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    response = client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                           content_type='application/json',
+                           headers=auth_headers['patient'])
+    trace_id = response.headers['X-Trace-Id']
+    tracer.flush()
+
+    traces = [json.loads(line) for path in tmp_path.glob('traces.*.jsonl')
+              for line in open(path)]
+    span_lists = [t['resourceSpans'][0]['scopeSpans'][0]['spans'] for t in traces]
+    spans = next(spans for spans in span_lists if spans[0]['traceId'] == trace_id)
+    by_name = {span['name']: span for span in spans}
+    root = by_name['POST /api/patients/predict']
+    assert 'parentSpanId' not in root
+    assert by_name['auth']['parentSpanId'] == root['spanId']
+    assert by_name['predict']['parentSpanId'] == by_name['request']['spanId']
+    assert by_name['score']['parentSpanId'] == by_name['predict']['spanId']
+    statements = [a['value']['stringValue'] for span in spans
+                  if span['name'] == 'db.query'
+                  for a in span['attributes'] if a['key'] == 'db.statement']
+    assert any(statement.startswith('INSERT INTO predictions')
+               for statement in statements)
+
+def test_admin_request_profiling(client, auth_headers, tmp_path, monkeypatch):
+    """Test only profiling roles can profile a request, within the rate limit"""
+    from collections import deque
+    from services.profiling import request_profiler
+
+    monkeypatch.setattr(request_profiler, 'profile_dir', str(tmp_path))
+    monkeypatch.setattr(request_profiler, 'rate_limit', 1)
+    monkeypatch.setattr(request_profiler, '_recent', deque())
+    admin = User(name='Admin', email='admin@test.com', role='admin')
+    admin.set_password('adminpass123')
+    db.session.add(admin)
+    db.session.commit()
+    response = client.post('/api/auth/login',
+                           data=json.dumps({'email': 'admin@test.com',
+                                            'password': 'adminpass123'}),
+                           content_type='application/json')
+    admin_headers = {'Authorization': f"Bearer {response.json['access_token']}"}
+
+    response = client.get('/api/patients/predictions',
+                          headers=dict(auth_headers['patient'], **{'X-Profile': '1'}))
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
+    response = client.get('/api/monitoring/profiles', headers=auth_headers['doctor'])
+    assert response.status_code == 403
+
+    response = client.get('/api/monitoring/drift?profile=1', headers=admin_headers)
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+    report = client.get(f'/api/monitoring/profiles/{profile_id}',
+                        headers=admin_headers).json
+    assert report['path'] == '/api/monitoring/drift'
+    assert any('json' in edge['callee'] for edge in report['call_graph'])
+    assert (tmp_path / f"{report['id']}.prof").exists()
+
+    response = client.get('/api/monitoring/drift?profile=1', headers=admin_headers)
+    assert response.headers['X-Profile-Status'] == 'rate-limited'
+    response = client.get('/api/monitoring/profiles', headers=admin_headers)
+    assert len(response.json['profiles']) == 1
+
+    # Retention keeps the newest max_reports and drops reports older than max_age
+    stale = tmp_path / 'stale.json'
+    stale.write_text('{}')
+    os.utime(stale, (time.time() - 3600, time.time() - 3600))
+    monkeypatch.setattr(request_profiler, 'max_age', 600)
+    monkeypatch.setattr(request_profiler, 'max_reports', 3)
+    monkeypatch.setattr(request_profiler, '_recent', deque())
+    client.get('/api/monitoring/drift?profile=1', headers=admin_headers)
+    assert not stale.exists()
+    assert len(list(tmp_path.glob('*.json'))) == 2
+
+    monkeypatch.setattr(request_profiler, 'max_reports', 1)
+    monkeypatch.setattr(request_profiler, '_recent', deque())
+    response = client.get('/api/monitoring/drift?profile=1', headers=admin_headers)
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{response.headers['X-Profile-Id']}.{suffix}" for suffix in ('json', 'prof'))
+
+def test_create_admin_script(app):
+    """Test the admin provisioning script creates admins but never promotes users"""
+    from create_admin import provision_admin
+
+    user, created = provision_admin('Admin@Test.com', 'Admin', 'adminpass123')
+    assert created and user.role == 'admin' and user.email == 'admin@test.com'
+    user, created = provision_admin('admin@test.com', 'Admin', 'newpass12345')
+    assert not created and user.check_password('newpass12345')
+
+    patient = User(name='Patient', email='patient@test.com', role='user')
+    patient.set_password('patientpass1')
+    db.session.add(patient)
+    db.session.commit()
+    with pytest.raises(ValueError):
+        provision_admin('patient@test.com', 'Admin', 'adminpass123')
+    assert patient.role == 'user'
+
+def test_benchmark_compare_flags_regressions():
+    """Test benchmark timing summaries and the regression threshold"""
+    from benchmark import measure, compare
+
+    result = measure(lambda: sum(range(100)), iterations=20, warmup=2, items=100)
+    assert result['iterations'] == 20
+    assert result['min_ms'] <= result['p50_ms'] <= result['p95_ms']
+    assert result['items_per_s'] > 0
+
+    baseline = {'predict': {'p50_ms': 1.0}, 'score_batch': {'p50_ms': 2.0}}
+    current = {'predict': {'p50_ms': 1.1}, 'score_batch': {'p50_ms': 2.5},
+               'api.predict': {'p50_ms': 4.0}}
+    rows, regressions = compare(current, baseline, threshold=0.15)
+    assert [row[0] for row in rows] == ['predict', 'score_batch']
+    assert regressions == ['score_batch']
+
+def test_synthetic_population(app, client):
+    """Test the synthetic generator bulk-inserts a population that can log in"""
+    from services.synthetic_data import LabDistribution, generate_population
+
+    distribution = LabDistribution.from_csv(Config.WARMUP_SAMPLE_PATH)
+    summary = generate_population(2, 3, 4, 1, distribution, seed=7, tag='t',
+                                  batch_size=4)
+    assert summary['counts'] == {'doctors': 2, 'patients': 6, 'predictions': 24,
+                                 'prescriptions': 6}
+    assert User.query.filter_by(role='user').count() == 6
+    assert Prediction.query.count() == 24
+    assert User.query.filter_by(role='user', latest_risk_level=None).count() == 0
+    assert sum(trend.prediction_count for trend in LabTrend.query) == 24
+
+    prediction = Prediction.query.first()
+    features = prediction.get_input_features()
+    assert 5.0 <= features['Hemoglobin'] <= 20.0
+    # Ids returned by the bulk insert line up with the rows they were generated for
+    assert all(p.get_input_features()['Gender'] == p.user.gender
+               for p in Prediction.query)
+    assert prediction.get_explanation()['shap']['method'] == 'rule_based_shap'
+
+    response = client.post('/api/auth/login',
+                           data=json.dumps({'email': 'patient-t-5@synthetic.local',
+                                            'password': summary['password']}),
+                           content_type='application/json')
+    assert response.status_code == 200
+    doctor = User.query.filter_by(email='doctor-t-1@synthetic.local').one()
+    assert response.json['user']['doctor_id'] == doctor.id
+
+def test_structured_logging(client, auth_headers, caplog):
+    """Test capped JSON records, per-logger sampling, the non-blocking queue and no
+    payload dumps"""
+    import logging
+    import queue
+    from services.structured_logging import (JsonFormatter, SamplingFilter,
+                                             NonBlockingQueueHandler)
+
+    record = logging.LogRecord('routes.patient', logging.INFO, __file__, 1, 'saved %s',
+                               ('x' * 100,), None)
+    record.prediction_id = 7
+    entry = json.loads(JsonFormatter(max_length=20).format(record))
+    assert entry['message'].startswith('saved xxxxxxxxxxxxxx...[')
+    assert entry['prediction_id'] == 7 and entry['logger'] == 'routes.patient'
+
+    sampler = SamplingFilter({'routes': 0.0, 'routes.auth': 1.0})
+    assert not sampler.filter(record)
+    assert sampler.filter(logging.LogRecord('routes.auth', logging.INFO, __file__, 1,
+                                            'login', None, None))
+    record.levelno = logging.WARNING
+    assert sampler.filter(record)
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(record)
+    handler.handle(record)
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().args == ('x' * 100,)
+
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    with caplog.at_level(logging.DEBUG):
+        response = client.post('/api/patients/predict',
+                               data=json.dumps(prediction_data),
+                               content_type='application/json',
+                               headers=auth_headers['patient'])
+    assert response.status_code == 200
+    messages = [r.getMessage() for r in caplog.records]
+    assert not any('Hemoglobin' in m or 'feature_importance' in m for m in messages)
+
+def test_prediction_input_parsing(client, auth_headers):
+    """Test JSON and CSV prediction input is coerced to the feature schema with clear
+    errors"""
+    import io
+    from services.feature_input import coerce_features, iter_csv_rows
+
+    expected = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0, 'MCV': 75.0}
+    features, error = coerce_features({'Gender': '1', 'Hemoglobin': '10.5', 'MCH': 25,
+                                       'MCHC': 30.0, 'MCV': ' 75 ', 'Note': 'ignored'})
+    assert error is None
+    assert features == expected
+    assert type(features['Gender']) is int
+    assert coerce_features(dict(expected, Gender=2))[1] == \
+        'Gender must be 0 (female) or 1 (male)'
+    assert coerce_features(dict(expected, Hemoglobin='NaN'))[1] == \
+        'Hemoglobin must be a finite number'
+
+    body = (b'\xef\xbb\xbfGender,Hemoglobin,MCH,MCHC,MCV\n'
+            b'1,10.5,25,30,75\n0,abc,25,30,75\n0,12,,30,75\n')
+    rows = list(iter_csv_rows(io.BytesIO(body)))
+    assert rows[0] == {'row': 0, 'features': expected}
+    assert rows[1] == {'row': 1, 'error': 'Hemoglobin must be a number'}
+    assert rows[2] == {'row': 2, 'error': 'Missing required feature: MCH'}
+
+    upload = lambda body: client.post('/api/patients/predict',
+                                      headers=auth_headers['patient'],
+                                      data={'file': (io.BytesIO(body), 'labs.csv')},
+                                      content_type='multipart/form-data')
+    response = upload(b'Gender,Hemoglobin,MCH,MCHC,MCV\n1,10.5,25.0,30.0,75.0\n')
+    assert response.status_code == 200
+    saved = db.session.get(Prediction, response.json['saved_prediction_id'])
+    assert saved.get_input_features()['Gender'] == 1
+    response = upload(b'Gender,Hemoglobin,MCH,MCHC,MCV\n'
+                      b'1,10.5,25,30,75\n1,10.5,25,30,75\n')
+    assert response.status_code == 400
+    response = upload(b'Gender,Hemoglobin,MCH,MCHC\n1,10.5,25,30\n')
+    assert 'missing required columns: MCV' in response.json['error']
+
+    response = client.post('/api/patients/predict',
+                           data=json.dumps({'Gender': 1, 'Hemoglobin': 'low'}),
+                           content_type='application/json',
+                           headers=auth_headers['patient'])
+    assert response.status_code == 400
+    assert response.json['error'] == 'Hemoglobin must be a number'
+
+def test_compact_old_explanations(client, auth_headers):
+    """Test old predictions lose their rendered charts but keep the numeric
+    explanation"""
+    from datetime import datetime, timedelta
+    from services.compaction import compact_explanations, reclaim_space
+
+    prediction_data = {'Gender': 1, 'Hemoglobin': 10.5, 'MCH': 25.0, 'MCHC': 30.0,
+                       'MCV': 75.0}
+    ids = [client.post('/api/patients/predict', data=json.dumps(prediction_data),
+                       content_type='application/json',
+                       headers=auth_headers['patient']).json['saved_prediction_id']
+           for _ in range(3)]
+    for prediction_id in ids[:2]:
+        prediction = db.session.get(Prediction, prediction_id)
+        prediction.created_at = datetime.utcnow() - timedelta(days=120)
+    db.session.commit()
+    before = db.session.get(Prediction, ids[0]).get_explanation()
+    assert before['visualizations']
+
+    summary = compact_explanations(older_than_days=90, batch_size=1, pause=0)
+    assert summary['compacted'] == 2
+    assert summary['bytes_freed'] > 0
+    db.session.expire_all()
+    old = db.session.get(Prediction, ids[0]).get_explanation()
+    assert old['visualizations'] == {} and 'compacted_at' in old
+    assert old['shap'] == before['shap']
+    assert old['clinical_interpretation'] == before['clinical_interpretation']
+    assert db.session.get(Prediction, ids[2]).get_explanation()['visualizations']
+
+    assert compact_explanations(older_than_days=90, pause=0)['scanned'] == 0
+    assert 'analyze' in reclaim_space()['actions']
+
+def test_patient_search(client, auth_headers):
+    """Test patient search matches name/email substrings and filters by gender, age
+    and latest risk"""
+    from datetime import date
+    from services.prediction_service import risk_level
+
+    patients = [('Amara Okafor', 'amara@clinic.test', '1950-03-02', 0),
+                ('Marek Okon', 'marek@clinic.test', '2001-07-15', 1),
+                ('Li Wei', 'li.wei@clinic.test', '1988-11-30', 1)]
+    for name, email, dob, gender in patients:
+        response = client.post('/api/doctor/register-patient',
+                               headers=auth_headers['doctor'],
+                               data=json.dumps({'patient_name': name,
+                                                'patient_email': email,
+                                                'dob': dob, 'gender': gender}),
+                               content_type='application/json')
+        assert response.status_code == 201
+
+    prediction_data = {'Gender': 1, 'Hemoglobin': 9.0, 'MCH': 22.0, 'MCHC': 29.0,
+                       'MCV': 70.0}
+    response = client.post('/api/patients/predict', headers=auth_headers['patient'],
+                           content_type='application/json',
+                           data=json.dumps(prediction_data))
+    patient = User.query.filter_by(email='testpatient@test.com').one()
+    expected_risk = risk_level(response.json['predicted_proba'])
+    assert patient.latest_prediction_id == response.json['saved_prediction_id']
+    assert patient.latest_risk_level == expected_risk
+
+    def search(**params):
+        response = client.get('/api/doctor/patients/search', query_string=params,
+                              headers=auth_headers['doctor'])
+        assert response.status_code == 200
+        return response.json
+
+    def names(**params):
+        return [p['name'] for p in search(**params)['patients']]
+
+    assert names(q='oka') == ['Amara Okafor']
+    assert names(q='ma') == ['Marek Okon', 'Amara Okafor']
+    assert names(q='CLINIC.TEST', gender=1) == ['Li Wei', 'Marek Okon']
+    age = date.today().year - 1988 - (date.today() < date(date.today().year, 11, 30))
+    assert names(age_min=age, age_max=age) == ['Li Wei']
+    found = search(risk=expected_risk)['patients']
+    assert [p['email'] for p in found] == ['testpatient@test.com']
+    assert found[0]['prediction_count'] == 1
+
+    page = search(q='clinic', per_page=2, page=2)
+    assert page['total'] == 3 and page['pages'] == 2 and len(page['patients']) == 1
+
+    db.session.get(User, patient.id).name = 'Renamed Person'
+    db.session.commit()
+    assert search(q='renamed')['total'] == 1
+
+    response = client.get('/api/doctor/patients/search?risk=extreme',
+                          headers=auth_headers['doctor'])
+    assert response.status_code == 400
+    response = client.get('/api/doctor/patients/search',
+                          headers=auth_headers['patient'])
+    assert response.status_code == 403
+
+def test_lab_trends(client, auth_headers):
+    """Test lab trends are folded in on each prediction, stay bounded in size and
+    match a rebuild"""
+    from services.lab_trends import empty_stats, fold, rebuild_lab_trends
+
+    stats = empty_stats()
+    for day in range(100):
+        fold(stats, {'Hemoglobin': 10.0 + 0.1 * day, 'MCV': 80.0}, day * 86400.0,
+             window=5, capacity=8)
+    hemoglobin = stats['Hemoglobin']
+    assert hemoglobin['count'] == 100 and hemoglobin['min'] == 10.0
+    assert abs(hemoglobin['max'] - 19.9) < 1e-9
+    assert abs(hemoglobin['slope_per_day'] - 0.1) < 1e-9
+    assert len(hemoglobin['buckets']) <= 8
+    assert sum(b[2] for b in hemoglobin['buckets']) == 100
+    assert stats['MCV']['slope_per_day'] == 0.0
+
+    for hb in (12.0, 9.5, 8.0):
+        prediction_data = {'Gender': 1, 'Hemoglobin': hb, 'MCH': 24.0, 'MCHC': 30.0,
+                           'MCV': 76.0}
+        response = client.post('/api/patients/predict', headers=auth_headers['patient'],
+                               content_type='application/json',
+                               data=json.dumps(prediction_data))
+        assert response.status_code == 200
+    patient = User.query.filter_by(email='testpatient@test.com').one()
+    high_risk = Prediction.query.filter(Prediction.user_id == patient.id,
+                                        Prediction.predicted_proba > 0.7).count()
+
+    trends = client.get('/api/patients/trends', headers=auth_headers['patient']).json
+    assert trends['prediction_count'] == 3 and trends['high_risk_count'] == high_risk
+    hemoglobin = trends['features']['Hemoglobin']
+    assert (hemoglobin['last'], hemoglobin['min'], hemoglobin['max'],
+            hemoglobin['count']) == (8.0, 8.0, 12.0, 3)
+    assert hemoglobin['slope_per_day'] < 0
+    assert sum(point['n'] for point in hemoglobin['series']) == 3
+    response = client.get('/api/patients/trends?points=1',
+                          headers=auth_headers['patient'])
+    assert len(response.json['features']['MCV']['series']) == 1
+
+    incremental = db.session.get(LabTrend, patient.id).get_stats()
+    assert rebuild_lab_trends([patient.id]) == {'patients': 1}
+    db.session.expire_all()
+    rebuilt = db.session.get(LabTrend, patient.id).get_stats()
+    assert rebuilt['Hemoglobin']['buckets'] == incremental['Hemoglobin']['buckets']
+
+    url = f'/api/doctor/patients/{patient.id}/trends'
+    response = client.get(url, headers=auth_headers['doctor'])
+    assert response.json['features']['Hemoglobin']['last'] == 8.0
+    assert client.get(url, headers=auth_headers['patient']).status_code == 403
+    response = client.get('/api/doctor/patients/9999/trends',
+                          headers=auth_headers['doctor'])
+    assert response.status_code == 404
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -82,6 +82,13 @@ const PatientList = () => {
 
   useEffect(()=>{ user?.role==='doctor' ? init() : setLoading(false); },[user]);
 
+  // Refresh counts when one of our patients gets a new prediction (instead of polling)
+  useEffect(() => {
+    if (user?.role !== 'doctor') return undefined;
+    const source = api.subscribeDoctorEvents((type) => { if (type === 'prediction') loadPatients(); });
+    return () => source.close();
+  }, [user]);
+
   const init = async () => {
     const qp = new URLSearchParams(window.location.search);
     if (qp.get('action')==='register') setShowForm(true);
@@ -186,6 +193,14 @@ const PatientPredictions = () => {
 
   useEffect(() => { if (user?.role === 'doctor') { loadPredictions(); } else { setLoading(false); } }, [user, patientId]);
 
+  useEffect(() => {
+    if (user?.role !== 'doctor') return undefined;
+    const source = api.subscribeDoctorEvents((type, event) => {
+      if (type === 'prediction' && String(event.patient_id) === String(patientId)) loadPredictions();
+    });
+    return () => source.close();
+  }, [user, patientId]);
+
   const loadPredictions = async () => {
     setLoading(true); setError('');
     try {
@@ -5,6 +5,11 @@ const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api';
 class ApiService {
   constructor() {
     this.token = null;
+    // One event stream per tab, shared by every component that subscribes
+    this.eventListeners = new Set();
+    this.eventSource = null;
+    this.eventOpening = false;
+    this.eventRetry = null;
     this.axios = axios.create({
       baseURL: API_URL,
       headers: {
@@ -88,6 +93,59 @@ class ApiService {
     return this.post(`/doctor/patients/${patientId}/prescriptions`, data);
   }
 
+  // Live prediction/prescription events for the doctor's patients; call close() on the result
+  subscribeDoctorEvents(onEvent) {
+    this.eventListeners.add(onEvent);
+    this.openEventStream();
+    return {
+      close: () => {
+        this.eventListeners.delete(onEvent);
+        if (!this.eventListeners.size) this.closeEventStream();
+      },
+    };
+  }
+
+  async openEventStream() {
+    if (this.eventSource || this.eventOpening || !this.eventListeners.size) return;
+    this.eventOpening = true;
+    try {
+      // EventSource cannot send an Authorization header, so the URL carries a
+      // short-lived stream token instead of the access token
+      const { data } = await this.axios.post('/doctor/events/token');
+      if (!this.eventListeners.size) return;
+      const source = new EventSource(`${API_URL}/doctor/events?token=${encodeURIComponent(data.token)}`);
+      ['prediction', 'prescription'].forEach((type) =>
+        source.addEventListener(type, (event) => {
+          const payload = JSON.parse(event.data);
+          this.eventListeners.forEach((listener) => listener(type, payload));
+        }));
+      // Streams are recycled by the server and the token expires, so reconnect with a fresh one
+      source.onerror = () => {
+        source.close();
+        if (this.eventSource === source) {
+          this.eventSource = null;
+          this.scheduleEventStream(3000);
+        }
+      };
+      this.eventSource = source;
+    } catch (e) {
+      this.scheduleEventStream(30000);
+    } finally {
+      this.eventOpening = false;
+    }
+  }
+
+  scheduleEventStream(delay) {
+    clearTimeout(this.eventRetry);
+    this.eventRetry = setTimeout(() => this.openEventStream(), delay);
+  }
+
+  closeEventStream() {
+    clearTimeout(this.eventRetry);
+    if (this.eventSource) this.eventSource.close();
+    this.eventSource = null;
+  }
+
   // Patient specific methods
   async makePrediction(predictionData) {
     return this.post('/patients/predict', predictionData);